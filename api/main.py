@@ -1,8 +1,18 @@
 from fastapi import FastAPI
 from api.routers import okoshi
 from api.routers import ui
+from api.routers import jobs
+from api.routers import batches
+from api.routers import results
+from api.routers import uploads
+from api.routers import metrics
 
 app = FastAPI()
 
 app.include_router(okoshi.router)
-app.include_router(ui.router)
\ No newline at end of file
+app.include_router(ui.router)
+app.include_router(jobs.router)
+app.include_router(batches.router)
+app.include_router(results.router)
+app.include_router(uploads.router)
+app.include_router(metrics.router)
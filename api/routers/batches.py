@@ -0,0 +1,105 @@
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException
+from fastapi.responses import JSONResponse, Response
+from typing import Annotated, List
+from pathlib import Path
+import asyncio
+import io
+import zipfile
+import api.schemas.params as params
+
+from api.routers import okoshi
+from api.utils.job_manager import Batch
+
+router = APIRouter()
+
+
+def batch_status(batch: Batch) -> dict:
+    status = batch.to_dict()
+    status["jobs"] = [{**job, "result_url": f"/result/{job['job_id']}"} for job in status["jobs"]]
+    return {
+        **status,
+        "status_url": f"/batches/{batch.id}",
+        "download_url": f"/batches/{batch.id}/download",
+    }
+
+
+@router.post("/batches", response_model=params.BatchStatusResponse, status_code=202)
+async def submit_transcription_batch(
+    user: Annotated[str, Form(description="部署名・氏名")] = "",
+    audio_files: Annotated[List[UploadFile], File(description="テキスト化する音声ファイル（複数可、ZIPアーカイブも可）")] = None
+):
+    """
+    複数の音声ファイル（またはそれらをまとめたZIPアーカイブ）をアップロードし、1ファイル1ジョブとして登録します。
+    処理の完了を待たずにバッチIDとファイルごとのジョブIDを返します。
+    """
+    batch = await okoshi.submit_batch(user, audio_files)
+    return batch_status(batch)
+
+
+@router.get("/batches/{batch_id}", response_model=params.BatchStatusResponse)
+async def get_batch_status(batch_id: str):
+    """
+    バッチ全体の状態・進捗と、ファイルごとのジョブの状態を返します。
+    """
+    batch = okoshi.job_manager.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="バッチが見つかりません")
+    return batch_status(batch)
+
+
+def build_batch_archive(batch: Batch) -> bytes:
+    """
+    バッチの結果をZIPにまとめます。
+    - {番号}_{元ファイル名}.txt: ファイルごとの文字起こし結果（完了したファイルのみ）
+    - all_transcriptions.txt: 全ファイルの書き起こし本文を投入順に連結したもの
+    - batch_summary.txt: ファイルごとの状態・音声長・エラー
+    """
+    status = batch.to_dict()
+    summary = [
+        "バッチ文字起こし結果",
+        "=" * 50,
+        f"バッチID: {batch.id}",
+        f"登録者: {batch.user}",
+        f"ファイル数: {status['total']}（完了 {status['done']} / 失敗 {status['failed']}）",
+        "",
+    ]
+    combined = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for number, job in enumerate(batch.jobs, start=1):
+            label = f"{number:03d}_{Path(job.filename).stem or 'audio'}"
+            if job.status != "done":
+                summary.append(f"{label}: 失敗 - {job.error}")
+                continue
+            info = job.result.get("processing_info") or {}
+            summary.append(f"{label}: 完了（音声長 {info.get('duration_minutes', 0)}分）")
+            text = job.result.get("transcription_text") or ""
+            combined.extend([f"### {job.filename}", text, ""])
+            # 保存済みの結果ファイル（タイムスタンプ付き）があればそれを、保持期間切れで削除されていれば本文を入れる
+            result_file = Path(info.get("file_path") or "")
+            if result_file.is_file():
+                archive.write(result_file, f"{label}.txt")
+            else:
+                archive.writestr(f"{label}.txt", text)
+        archive.writestr("all_transcriptions.txt", "\n".join(combined))
+        archive.writestr("batch_summary.txt", "\n".join(summary) + "\n")
+    return buffer.getvalue()
+
+
+@router.get("/batches/{batch_id}/download")
+async def download_batch_results(batch_id: str):
+    """
+    バッチ内の全ファイルの文字起こし結果をZIPにまとめてダウンロードします。
+    処理中のファイルがある場合は202とバッチの状態を返します。
+    """
+    batch = okoshi.job_manager.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="バッチが見つかりません")
+    if not batch.finished:
+        return JSONResponse(status_code=202, content=batch_status(batch))
+    content = await asyncio.to_thread(build_batch_archive, batch)
+    return Response(
+        content=content,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch_{batch.id}.zip"'}
+    )
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Annotated, Optional
+import json
+import api.schemas.params as params
+
+from api.routers import okoshi
+
+router = APIRouter()
+
+
+@router.post("/jobs", response_model=params.JobSubmitResponse, status_code=202)
+async def submit_transcription_job(
+    user: Annotated[str, Form(description="部署名・氏名")] = "",
+    audio_file: Annotated[UploadFile, File(description="テキスト化する音声ファイル")] = None
+):
+    """
+    音声ファイルをアップロードし、文字起こしジョブを登録します。
+    処理の完了を待たずに、ジョブIDと予測される完了までの時間を返します。
+    """
+    job = await okoshi.submit_job(user, audio_file)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/result/{job.id}",
+        "audio_seconds": job.audio_seconds,
+        "predicted_seconds": job.predicted_seconds,
+        "estimated_start_at": job.estimated_start_at,
+        "estimated_finish_at": job.estimated_finish_at,
+        "eta_seconds": job.eta_seconds,
+    }
+
+
+@router.get("/jobs/{job_id}", response_model=params.JobStatusResponse)
+async def get_job_status(job_id: str):
+    """
+    ジョブの処理段階と進捗を返します。
+    """
+    job = okoshi.job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    return {**job.to_dict(), "result_url": f"/result/{job.id}"}
+
+
+# 新しいイベントがない間に送るコメント行の間隔（秒）。プロキシによる切断を防ぐ
+EVENT_STREAM_HEARTBEAT_SECONDS = 15.0
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    after: int = 0,
+    last_event_id: Annotated[Optional[str], Header()] = None
+):
+    """
+    ジョブの処理段階の変化と、チャンクごとの文字起こし結果をServer-Sent Eventsで配信します。
+    再接続時は Last-Event-ID ヘッダ（またはafterパラメータ）以降のイベントから再開します。
+    ジョブが完了（done）または失敗（failed）すると配信を終了します。
+    """
+    job = okoshi.job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def event_stream():
+        async for event in job.stream_events(after=after, heartbeat=EVENT_STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/result/{job_id}", response_model=params.ResponseParams)
+async def get_job_result(job_id: str):
+    """
+    完了したジョブの文字起こし結果を返します。
+    処理中の場合は202とジョブの状態を返します。
+    """
+    job = okoshi.job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="ジョブが見つかりません")
+    if job.status == "failed":
+        raise HTTPException(status_code=job.status_code or 500, detail=job.error)
+    if job.status != "done":
+        return JSONResponse(status_code=202, content={**job.to_dict(), "result_url": f"/result/{job.id}"})
+    return job.result
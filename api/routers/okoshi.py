@@ -1,202 +1,524 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from typing import Annotated
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Query
+from typing import Annotated, Any, Dict, Optional
 import api.schemas.params as params
 import asyncio
+import functools
+import json
 import os
-import tempfile
 from pathlib import Path
 from datetime import datetime
-import uuid
-from starlette.responses import FileResponse
-import glob
-import shutil
+import time
+import math
+from starlette.responses import FileResponse, Response
 
 # 必要なユーティリティをインポート
-from api.utils.audio_utils import AudioProcessor
-from api.utils.wisper_service import WhisperService
+from api.utils.audio_utils import AudioProcessor, AudioChunk, AudioValidationError, FileTooLargeError
+from api.utils.audio_pool import AudioWorkPool
+from api.utils.wisper_service import TranscriptionCombiner, WhisperService
+from api.utils.pipeline import run_split_transcribe_pipeline
+from api.utils.job_manager import Batch, Job, JobManager, JobQueueFullError
+from api.utils.archive import ArchiveError, is_archive, open_archive_members
+from api.utils.transcription_cache import TranscriptionCache
+from api.utils.result_index import ResultIndex
+from api.utils.workspace import WorkspaceManager
+from api.utils.storage import RESULTS_DIR, WORK_ROOT, to_shared
+from api.utils.task_queue import PREPARE_TASK, TRANSCRIBE_TASK, create_task_queue
+from api.utils.transcript import FORMATS, Transcript, structured_path
+from api.utils.uploads import UploadAbortedError, UploadManager, UploadOffsetError, UploadSession
+from api.utils.scheduler import estimate_audio_seconds
+from api.utils.silence import TimeRemap
+from api.utils.log import get_logger
+from api.utils.metrics import SILENCE_SECONDS_REMOVED, record_stage, time_stage
 
 router = APIRouter()
+logger = get_logger(__name__)
 
 openai_api_key = os.getenv('OPENAI_API_KEY')
-print("KEY",openai_api_key)
+
+# standalone（既定）: このプロセスでジョブを処理する
+# api: ジョブは共有のタスクキューに登録し、ワーカー（python -m api.worker）が処理する
+ROLE = os.getenv("OKOSHI_ROLE", "standalone").lower()
+if ROLE not in ("standalone", "api"):
+    raise ValueError(f"OKOSHI_ROLE の値が不正です: {ROLE}（standalone / api）")
+DISTRIBUTED = ROLE == "api"
+
 # 初期化
-audio_processor = AudioProcessor(output_dir="processed_audio")
-whisper_service = WhisperService(openai_api_key)  # OPENAI_API_KEY環境変数が必要
+audio_processor = AudioProcessor(output_dir=str(WORK_ROOT))
+# 音声ハッシュをキーにした文字起こし結果のキャッシュ（ファイル単位・チャンク単位）
+transcription_cache = TranscriptionCache()
+# 保存した結果の一覧・全文検索用の索引
+result_index = ResultIndex()
+# 文字起こしのバックエンドは OKOSHI_TRANSCRIPTION_BACKEND（openai / local / hybrid）で選ぶ
+whisper_service = WhisperService(openai_api_key, cache=transcription_cache, result_index=result_index)
+
+# バックグラウンドで文字起こしジョブを実行するワーカープール
+# api ロールではジョブの処理はワーカーが行い、ここでは完了を待つだけのため、同時に扱うジョブ数の既定値を大きくする
+job_manager = JobManager(max_workers=int(os.getenv("OKOSHI_MAX_WORKERS", "32")) if DISTRIBUTED else None)
+# APIノードとワーカーをつなぐタスクキュー（api ロールのみ）
+task_queue = create_task_queue() if DISTRIBUTED else None
+TASK_POLL_SECONDS = float(os.getenv("OKOSHI_QUEUE_POLL_SECONDS", "0.5"))
+# ジョブのタスクもキュー全体もこの秒数進まなければ（ワーカーが起動していない・すべて止まっているなど）ジョブを失敗にする
+TASK_STALL_TIMEOUT_SECONDS = float(os.getenv("OKOSHI_TASK_STALL_TIMEOUT_SECONDS", "900"))
+# デコード・変換・分割を実行するプロセスプール
+audio_pool = AudioWorkPool()
+# ジョブごとの作業ディレクトリと、結果ファイルの保持期間の管理（保持期間を過ぎた結果は索引からも取り除く）
+workspaces = WorkspaceManager(
+    root=str(WORK_ROOT),
+    results_dir=str(RESULTS_DIR),
+    on_results_expired=lambda paths: result_index.remove(path.stem for path in paths if path.suffix == ".txt"),
+)
+
+# 再開可能なアップロード（POST /uploads）。受信中のアップロードの状態はこのプロセスのメモリに保持する
+uploads = UploadManager(max_bytes=audio_processor.max_file_size_mb * 1024 * 1024)
+
+# 1回のバッチ投入で受け付けるファイル数の上限（アーカイブ内のファイルを含む）
+MAX_BATCH_FILES = int(os.getenv("OKOSHI_MAX_BATCH_FILES", "50"))
+
+# 長時間音声の分割と文字起こしをパイプラインで並行実行するか（OKOSHI_PIPELINED=false で逐次実行）
+PIPELINED_EXECUTION = os.getenv("OKOSHI_PIPELINED", "true").lower() not in ("0", "false", "no")
+
+@router.on_event("startup")
+def start_workspace_janitor():
+    workspaces.start()
 
-def clean_directories_on_startup():
+
+@router.on_event("startup")
+async def index_stored_results():
+    # 索引にない保存済みの結果（索引を作る前の結果など）を登録する
+    await asyncio.to_thread(result_index.backfill, str(RESULTS_DIR))
+
+
+@router.on_event("shutdown")
+async def shutdown_background_workers():
+    audio_pool.shutdown()
+    await workspaces.stop()
+
+
+async def receive_upload(job: Job, user: str, audio_file: UploadFile, work_dir: Path) -> tuple[Path, str]:
     """
-    アプリケーション起動時に指定されたディレクトリ内のファイルを削除します。
+    入力を検証し、アップロードされた音声ファイルをジョブの作業ディレクトリ（work_dir）に保存します。
+    戻り値は (保存先のパス, ファイル内容のSHA-256) です。
     """
-    directories_to_clean = [
-        "processed_audio",
-        "transcription_results"
-    ]
+    # 入力検証
+    if not user or not user.strip():
+        raise HTTPException(status_code=400, detail="登録者名が入力されていません")
+    
+    if not audio_file:
+        raise HTTPException(status_code=400, detail="音声ファイルがアップロードされていません")
+    
+    if audio_file.size == 0:
+        raise HTTPException(status_code=400, detail="空のファイルです")
+    
+    # アップロード時点でサイズが分かっている場合は、書き込む前に上限を確認する
+    if audio_file.size is not None and audio_file.size > audio_processor.max_file_size_mb * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"ファイルサイズが上限（{audio_processor.max_file_size_mb}MB）を超えています。")
+    
+    # ステップ1: ファイル内容をチャンクごとにディスクへ書き込み、保存
+    job.update("アップロードの受信", 0.0)
+    with time_stage("receive", job, content_type=audio_file.content_type) as fields:
+        try:
+            original_file_path, file_hash = await audio_processor.save_upload_stream(audio_file, user=user, work_dir=work_dir)
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        fields["bytes"] = original_file_path.stat().st_size
+    job.publish("uploaded", bytes=fields["bytes"])
+    
+    return original_file_path, file_hash
 
-    print("=== アプリケーション起動時のクリーンアップ開始 (from okoshi.py) ===")
-    for directory in directories_to_clean:
-        dir_path = Path(directory)
-        if dir_path.exists() and dir_path.is_dir():
-            print(f"🗑️ {directory}/ 配下のファイルを削除中...")
-            try:
-                for item in dir_path.iterdir():
-                    if item.is_file():
-                        os.remove(item)
-                        print(f"  - 削除: {item}")
-                    elif item.is_dir():
-                        shutil.rmtree(item)
-                        print(f"  - ディレクトリ削除: {item}")
-                print(f"✓ {directory}/ のクリーンアップ完了。")
-            except Exception as e:
-                print(f"❌ {directory}/ のクリーンアップ中にエラーが発生しました: {e}")
-        else:
-            print(f"ℹ️ ディレクトリが存在しないか、ディレクトリではありません: {directory}/")
-            if not dir_path.exists():
-                dir_path.mkdir(parents=True, exist_ok=True) # ディレクトリがない場合は作成
-                print(f"✓ ディレクトリを作成しました: {directory}/")
-    print("=== アプリケーション起動時のクリーンアップ完了 (from okoshi.py) ===")
 
+async def predict_job_time(job: Job, file_path: Path):
+    """
+    保存した音声ファイルのヘッダから長さを読み、ジョブの処理時間を予測します（デコードは行いません）。
+    長さを読めないファイルは長さが分からないものとして予測し、検証は処理の中で行います。
+    """
+    try:
+        audio_seconds = await asyncio.to_thread(audio_processor.probe_duration, file_path)
+    except ValueError:
+        audio_seconds = None
+    job_manager.predict(job, audio_seconds)
 
-@router.post("/okoshi", response_model=params.ResponseParams)
-async def okoshi_process(
-    user: Annotated[str, Form(description="部署名・氏名")] = "",
-    audio_file: Annotated[UploadFile, File(description="テキスト化する音声ファイル")] = None
-):
+
+def queue_full_error(job: Job, error: JobQueueFullError) -> HTTPException:
     """
-    音声ファイルのアップロードと文字起こし処理
+    待ち行列に入れられなかったジョブのエラーを返します。再投入までの目安が分かる場合は Retry-After ヘッダを付けます。
     """
-    # 処理ID生成
-    process_id = str(uuid.uuid4())[:8]
-    
-    # 変換後のファイルパスを保持するための変数
-    converted_file_path = None # ここで初期化
+    headers = {"Retry-After": str(math.ceil(error.retry_after))} if error.retry_after else None
+    return HTTPException(status_code=job.status_code, detail=job.error, headers=headers)
+
+
+def chunk_span(chunk: AudioChunk, remap: Optional[TimeRemap] = None) -> tuple[float, float]:
+    """
+    チャンクの元音声上の区間 (開始秒, 終了秒) を返します。無音を取り除いた音声のチャンクは remap で元の時刻に戻します。
+    """
+    if remap is None:
+        return chunk.start, chunk.end
+    return remap.to_original(chunk.start), remap.to_original(chunk.end, end=True)
+
+
+def publish_chunk_encoded(job: Job, chunk: AudioChunk, total: int, remap: Optional[TimeRemap] = None):
+    """
+    チャンクのエンコード完了をジョブのイベントとして通知します。
+    """
+    start, end = chunk_span(chunk, remap)
+    job.publish("chunk_encoded", index=chunk.index, total=max(total, chunk.index + 1), start=start, end=end)
 
+
+def publish_chunk_transcribed(job: Job, chunk: AudioChunk, result: Dict, total: int, remap: Optional[TimeRemap] = None):
+    """
+    チャンクの文字起こし結果（テキストと元音声上の区間）をジョブのイベントとして通知します。
+    """
+    start, end = chunk_span(chunk, remap)
+    job.publish(
+        "chunk_transcribed",
+        index=chunk.index,
+        total=max(total, chunk.index + 1),
+        start=start,
+        end=end,
+        success=bool(result.get("success")),
+        text=result.get("text", "") if result.get("success") else "",
+    )
+
+
+async def transcribe_audio_file(job: Job, original_file_path: Path, user: str) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    保存済みの音声ファイルを検証・分割・文字起こしし、(結合結果, ステージごとの所要時間) を返します。
+    変換後のファイルと分割チャンクは、元のファイルと同じジョブの作業ディレクトリに作られます。
+    """
+    work_dir = original_file_path.parent
+    # ステップ2: 音声ファイルの検証・無音の除去・長さ取得・エンコード計画（・MP3変換と分割）
+    # デコードを伴う処理はプロセスプールで実行し、イベントループを止めない
+    # 分割（チャンクのエンコード）はここでは行わず、チャンクごとにプロセスプールへ投入する
+    job.update("音声ファイルの検証", 0.05)
+    stage_start = time.perf_counter()
     try:
-        print(f"=== 音声処理開始 ===")
-        print(f"処理ID: {process_id}")
-        print(f"User: {user}")
-        print(f"Audio file: {audio_file.filename if audio_file else 'None'}")
-        
-        # 入力検証
-        if not user or not user.strip():
-            raise HTTPException(status_code=400, detail="登録者名が入力されていません")
-        
-        if not audio_file:
-            raise HTTPException(status_code=400, detail="音声ファイルがアップロードされていません")
-        
-        if audio_file.size == 0:
-            raise HTTPException(status_code=400, detail="空のファイルです")
-        
-        print(f"File size from UploadFile object: {audio_file.size / (1024*1024):.2f} MB")
-        print(f"Content type: {audio_file.content_type}")
-        
-        # ステップ1: ファイル内容を読み取り、保存
-        file_content = await audio_file.read()
-
-        # DEBUGログ追加
-        print(f"DEBUG: Read file_content length: {len(file_content)} bytes")
-        if len(file_content) == 0:
-            print("DEBUG: CRITICAL! file_content is empty after read().")
-            raise HTTPException(status_code=400, detail="アップロードされたファイルの内容が空です。")
-        
-        original_file_path = audio_processor.save_original_file(
-            file_content=file_content, 
-            original_filename=audio_file.filename, 
-            user=user
+        prepared = await audio_pool.run(
+            audio_processor.prepare_audio, original_file_path, user, stream_split=True, work_dir=work_dir
         )
-        print(f"✓ 元ファイル保存完了: {original_file_path}")
+    except AudioValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for stage, seconds in prepared.stage_seconds.items():
+        record_stage(stage, seconds, job)
+    duration, plan, remap = prepared.duration, prepared.plan, prepared.remap
 
-        # DEBUGログ追加
-        try:
-            saved_file_size = original_file_path.stat().st_size
-            print(f"DEBUG: 保存されたファイルのサイズ: {saved_file_size} bytes")
-            if saved_file_size == 0:
-                print("DEBUG: WARNING! ファイルサイズが0です。書き込みに失敗している可能性があります。")
-            
-            with open(original_file_path, "rb") as f:
-                header_bytes = f.read(64)
-                print(f"DEBUG: ファイルの先頭バイト (hex): {header_bytes.hex()}")
-                if header_bytes[:4].decode('ascii', errors='ignore') == "RIFF":
-                    print("DEBUG: WAVファイルヘッダ 'RIFF' を確認しました。")
-                else:
-                    print("DEBUG: WARNING! WAVファイルヘッダ 'RIFF' を確認できませんでした。")
-
-        except Exception as e:
-            print(f"DEBUG: ファイル内容確認中にエラー: {e}")
-        
-        # ステップ2: 音声ファイルの検証と必要に応じたMP3変換
-        is_valid, validation_message = audio_processor.validate_audio_file(original_file_path)
-        print(f"✓ ファイル検証: {validation_message}")
-        
-        if not is_valid:
-            # 検証失敗時はファイルを削除
-            try:
-                # os.remove(original_file_path) # デバッグのためコメントアウトを継続
-                pass
-            except:
-                pass
-            raise HTTPException(status_code=400, detail=validation_message)
-        
-        # ここでMP3への変換を試みる
-        # convert_to_mp3_if_neededは、変換成功すると元のファイルを削除し、新しいMP3ファイルのパスを返す
-        converted_file_path = audio_processor.convert_to_mp3_if_needed(original_file_path)
-        print(f"✓ MP3変換/確認完了: {converted_file_path}")
+    # Whisperの25MB上限に収まる最少のチャンク数と、チャンクのエンコード設定
+    logger.info("encoding planned", extra={"event": "encoding_plan", "job_id": job.id, "audio_seconds": round(duration, 3), **plan.to_dict()})
 
-        # 今後の処理はconverted_file_pathを使用するように変更する！！！
-        process_target_file = converted_file_path # ここで正しいファイルパスを設定
-        
-        # ステップ3: 音声の長さをチェックし、必要に応じて分割
-        # duration = audio_processor.get_audio_duration(original_file_path) # 古いパスを参照しているためNG
-        duration = audio_processor.get_audio_duration(process_target_file) # ★★★ ここを修正 ★★★
-        print(f"✓ 音声長: {duration/60:.1f}分")
-        
-        # 10分（600秒）を超える場合は分割
-        if duration > 600:
-            print("⚡ 音声が10分を超えています。分割処理を開始...")
-            # 分割はMP3ファイルとして出力される
-            split_files = audio_processor.split_audio(process_target_file, user=user, segment_length=600)
-            print(f"✓ 分割完了: {len(split_files)}ファイル")
-            # 分割された場合は、元の変換済みファイルはもう不要なので削除対象に含める
-            files_to_clean_up_after_transcription = split_files + [process_target_file] # process_target_fileがconverted_file_pathなので追加
-        else:
-            split_files = [process_target_file]
-            print("✓ 分割不要（10分以下）")
-            files_to_clean_up_after_transcription = [process_target_file] # process_target_fileがconverted_file_pathなので追加
+    if prepared.chunks is None and not PIPELINED_EXECUTION:
+        # 逐次実行では、すべてのチャンクをエンコードし終えてから文字起こしする
+        job.update("音声ファイルの分割", 0.1)
+        with time_stage("split", job) as fields:
+            prepared.chunks = await asyncio.to_thread(
+                list, audio_processor.split_audio_streaming(
+                    prepared.source, user=user, plan=plan, duration=duration, work_dir=work_dir,
+                    max_workers=audio_pool.max_workers,
+                    submit=functools.partial(audio_pool.submit_threadsafe, asyncio.get_running_loop()),
+                )
+            )
+            fields["chunks"] = len(prepared.chunks)
+    encode_seconds = time.perf_counter() - stage_start
+
+    if prepared.chunks is None:
+        # 1チャンクに収まらない場合は、分割と文字起こしをパイプラインで実行
+        # チャンクは元ファイルからffmpegで直接切り出すため、全体のMP3変換は不要
+        job.update("分割・文字起こし", 0.1)
+        expected_chunks = plan.chunk_count
+        completed_chunks = []
 
+        def on_chunk_done(chunk: AudioChunk, result: Dict):
+            completed_chunks.append(chunk.index)
+            job.update("分割・文字起こし", 0.1 + 0.8 * min(1.0, len(completed_chunks) / expected_chunks))
+            publish_chunk_transcribed(job, chunk, result, expected_chunks, remap)
+
+        with time_stage("split_transcribe", job) as fields:
+            combined_result, split_files, stage_timings = await run_split_transcribe_pipeline(
+                audio_processor,
+                whisper_service,
+                prepared.source,
+                user=user,
+                segment_length=plan.chunk_length,
+                language="ja",
+                on_chunk_done=on_chunk_done,
+                plan=plan,
+                on_chunk_encoded=lambda chunk: publish_chunk_encoded(job, chunk, expected_chunks, remap),
+                work_dir=work_dir,
+                remap=remap,
+                audio_pool=audio_pool,
+            )
+            fields["chunks"] = len(split_files)
+    else:
+        # MP3への変換と分割は完了している
+        split_files = prepared.chunks
+        for chunk in split_files:
+            publish_chunk_encoded(job, chunk, len(split_files), remap)
 
         # ステップ4: OpenAI Whisperで文字起こし
-        print("🎤 OpenAI Whisperで文字起こし開始...")
-        transcription_results = await whisper_service.transcribe_multiple_files(
-            split_files, 
-            language="ja"
-        )
+        job.update("文字起こし", 0.3)
+        stage_start = time.perf_counter()
+        transcribed_chunks = []
+
+        def on_chunk_done(chunk: AudioChunk, result: Dict):
+            transcribed_chunks.append(chunk.index)
+            job.update("文字起こし", 0.3 + 0.6 * len(transcribed_chunks) / len(split_files))
+            publish_chunk_transcribed(job, chunk, result, len(split_files), remap)
+
+        with time_stage("transcribe", job, chunks=len(split_files)):
+            transcription_results = await whisper_service.transcribe_multiple_files(
+                split_files, 
+                language="ja",
+                on_chunk_done=on_chunk_done
+            )
+        transcribe_seconds = time.perf_counter() - stage_start
         
         # ステップ5: 結果をまとめる
-        combined_result = whisper_service.combine_transcriptions(transcription_results)
-        
+        with time_stage("combine", job):
+            combined_result = whisper_service.combine_transcriptions(transcription_results, remap=remap)
+        stage_timings = {
+            "encode_seconds": round(encode_seconds, 2),
+            "transcribe_seconds": round(transcribe_seconds, 2),
+            "wall_seconds": round(encode_seconds + transcribe_seconds, 2),
+        }
+
+    stage_timings["encoding_plan"] = plan.to_dict()
+    return combined_result, stage_timings
+
+
+async def transcribe_growing_upload(job: Job, upload: UploadSession, user: str) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    受信中のアップロードを届いた分から分割・文字起こしし、(結合結果, ステージごとの所要時間) を返します。
+    チャンクは plan_progressive_encoding の長さがたまるごとに切り出されるため、最初の書き起こしは
+    アップロードの完了を待たずに届きます。アップロードが完了し、最後のチャンクを文字起こしし終えると戻ります。
+    """
+    work_dir = upload.path.parent
+    plan = audio_processor.plan_progressive_encoding()
+    reader = upload.open_reader()
+    job.update("受信しながら分割・文字起こし", 0.1)
+    expected = {"chunks": 1}
+    completed_chunks = []
+    timings = {}
+
+    def on_chunk_encoded(chunk: AudioChunk):
+        # 全体のチャンク数は、ここまでに読み出したバイト数あたりのデコードできた音声の長さから見積もる
+        seconds_per_byte = plan.duration / max(reader.position, 1)
+        expected["chunks"] = max(chunk.index + 1, math.ceil(upload.size * seconds_per_byte / plan.chunk_length))
+        publish_chunk_encoded(job, chunk, expected["chunks"])
+
+    def on_chunk_done(chunk: AudioChunk, result: Dict):
+        if not completed_chunks:
+            timings["first_transcript_seconds"] = round(time.time() - upload.created_at, 2)
+        completed_chunks.append(chunk.index)
+        job.update("受信しながら分割・文字起こし", 0.1 + 0.8 * min(1.0, len(completed_chunks) / expected["chunks"]))
+        publish_chunk_transcribed(job, chunk, result, expected["chunks"])
+
+    try:
+        with time_stage("split_transcribe", job) as fields:
+            combined_result, split_files, stage_timings = await run_split_transcribe_pipeline(
+                audio_processor,
+                whisper_service,
+                upload.path,
+                user=user,
+                segment_length=plan.chunk_length,
+                language="ja",
+                on_chunk_done=on_chunk_done,
+                plan=plan,
+                on_chunk_encoded=on_chunk_encoded,
+                work_dir=work_dir,
+                chunks=audio_processor.split_audio_progressive(
+                    reader, user, plan, Path(upload.filename).stem, work_dir=work_dir,
+                    submit=functools.partial(audio_pool.submit_threadsafe, asyncio.get_running_loop()),
+                ),
+            )
+            fields["chunks"] = len(split_files)
+    except (AudioValidationError, UploadAbortedError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        reader.close()
+
+    stage_timings.update(timings)
+    stage_timings["upload_seconds"] = round(upload.completed_at - upload.created_at, 2)
+    stage_timings["encoding_plan"] = plan.to_dict()
+    return combined_result, stage_timings
+
+
+async def check_task_progress(tasks: list):
+    """
+    ジョブのタスクとキュー全体のどちらも TASK_STALL_TIMEOUT_SECONDS のあいだ進んでいなければ、HTTPException(504) を送出します。
+    他のジョブの処理でワーカーが埋まっていてタスクが待たされているだけの場合は、失敗にしません。
+    """
+    now = time.time()
+    if not tasks or now - max(task.updated_at for task in tasks) <= TASK_STALL_TIMEOUT_SECONDS:
+        return
+    last_activity = await asyncio.to_thread(task_queue.last_worker_activity)
+    if last_activity is not None and now - last_activity <= TASK_STALL_TIMEOUT_SECONDS:
+        return
+    if all(task.attempts == 0 for task in tasks):
+        detail = (f"ワーカーが{TASK_STALL_TIMEOUT_SECONDS:.0f}秒以上タスクを取り出していません"
+                  "（ワーカー python -m api.worker が起動しているか確認してください）")
+    else:
+        detail = f"ワーカーが応答しなくなり、処理が{TASK_STALL_TIMEOUT_SECONDS:.0f}秒以上進んでいません"
+    raise HTTPException(status_code=504, detail=detail)
+
+
+async def dispatch_audio_file(job: Job, original_file_path: Path, user: str) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    保存済みの音声ファイルの処理をタスクキューに登録し、ワーカーが処理し終えるまで待って (結合結果, ステージごとの所要時間) を返します（api ロール）。
+    ワーカーは分割したチャンクをそれぞれ transcribe タスクとして登録するため、1つの録音のチャンクも複数のワーカーで分担されます。
+    ジョブの進捗とイベントは、タスクの状態から transcribe_audio_file と同じ形で記録します。
+    ワーカーの処理が OKOSHI_TASK_STALL_TIMEOUT_SECONDS のあいだ進まない場合は、ジョブを失敗にします（check_task_progress）。
+    """
+    work_dir = original_file_path.parent
+    job.update("ワーカーの空き待ち", 0.05)
+    dispatch_start = time.perf_counter()
+    await asyncio.to_thread(task_queue.put, job.id, PREPARE_TASK, {
+        "file": to_shared(original_file_path),
+        "work_dir": to_shared(work_dir),
+        "user": user,
+        "language": "ja",
+    })
+
+    combiner = TranscriptionCombiner()
+    encoded, transcribed, workers = set(), set(), set()
+    remap = None
+    prepared = None
+    try:
+        while True:
+            tasks = await asyncio.to_thread(task_queue.tasks, job.id)
+            await check_task_progress(tasks)
+            prepare = next((task for task in tasks if task.kind == PREPARE_TASK), None)
+            if prepare is None:
+                raise HTTPException(status_code=500, detail="ジョブのタスクが見つかりません（タスクキューから削除されました）")
+            if prepare.status == "failed":
+                raise HTTPException(status_code=500, detail=f"音声ファイルの準備に失敗しました: {prepare.error}")
+            if prepare.status == "running" and not encoded:
+                job.update("音声ファイルの検証", 0.05)
+            if prepare.status == "done" and prepared is None:
+                prepared = (await asyncio.to_thread(task_queue.results, [prepare.id]))[prepare.id]
+                if prepared.get("status_code"):
+                    raise HTTPException(status_code=prepared["status_code"], detail=prepared["error"])
+                for stage, seconds in prepared["stage_seconds"].items():
+                    record_stage(stage, seconds, job)
+
+            chunk_tasks = [task for task in tasks if task.kind == TRANSCRIBE_TASK]
+            for task in chunk_tasks:
+                payload = task.payload
+                # 無音を取り除いた場合、チャンクのタスクには元の音声の時刻に戻す対応表が含まれる
+                if remap is None and payload.get("remap"):
+                    remap = combiner.remap = TimeRemap.from_dict(payload["remap"])
+                total = prepared["chunk_count"] if prepared else payload["total"]
+                if payload["index"] not in encoded:
+                    encoded.add(payload["index"])
+                    publish_chunk_encoded(job, AudioChunk(payload["path"], payload["index"], payload["start"], payload["end"]), total, remap)
+
+            # 準備のやり直しで同じチャンクのタスクが複数ある場合は、成功したものを優先する
+            # （失敗したものは、同じチャンクの他のタスクがすべて終わってから使う）
+            duplicates: Dict[int, list] = {}
+            for task in chunk_tasks:
+                if task.payload["index"] not in transcribed:
+                    duplicates.setdefault(task.payload["index"], []).append(task)
+            finished = []
+            for candidates in duplicates.values():
+                done = next((task for task in candidates if task.status == "done"), None)
+                if done is not None:
+                    finished.append(done)
+                elif all(task.finished for task in candidates):
+                    finished.append(candidates[0])
+            results = await asyncio.to_thread(task_queue.results, [task.id for task in finished if task.status == "done"])
+            for task in finished:
+                payload = task.payload
+                transcribed.add(payload["index"])
+                result = results.get(task.id) or {
+                    "file_path": payload["path"], "text": "", "success": False, "error": task.error, "processing_time": 0,
+                }
+                result.update({"chunk_index": payload["index"], "start_offset": payload["start"], "chunk_duration": payload["end"] - payload["start"]})
+                if result.get("worker"):
+                    workers.add(result["worker"])
+                combiner.add(payload["index"], result)
+                chunk = AudioChunk(payload["path"], payload["index"], payload["start"], payload["end"])
+                total = prepared["chunk_count"] if prepared else payload["total"]
+                publish_chunk_transcribed(job, chunk, result, total, remap)
+                job.update("分割・文字起こし", 0.1 + 0.8 * min(1.0, len(transcribed) / max(total, 1)))
+
+            if prepared is not None and len(transcribed) >= prepared["chunk_count"]:
+                break
+            await asyncio.sleep(TASK_POLL_SECONDS)
+    finally:
+        # 完了・失敗・中断のいずれでも、残っているタスク（実行待ちのチャンクなど）を取り消す
+        await asyncio.to_thread(task_queue.purge, job.id)
+
+    wall_seconds = time.perf_counter() - dispatch_start
+    record_stage("split_transcribe", wall_seconds, job)
+    stage_timings = {
+        "encode_seconds": round(prepared["encode_seconds"], 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "workers": len(workers),
+        "encoding_plan": prepared["encoding_plan"],
+    }
+    return combiner.finalize(), stage_timings
+
+
+async def process_audio_job(job: Job, original_file_path: Path, user: str, original_filename: str, file_hash: str = None,
+                            upload: Optional[UploadSession] = None) -> Dict[str, Any]:
+    """
+    保存済みの音声ファイルを文字起こしし、結果をレスポンス形式で返します。
+    ジョブのワーカーから呼び出され、処理段階と進捗をjobに記録します。
+    file_hashが渡された場合は、同じ音声の結果がキャッシュにあれば文字起こしを省略します。
+    upload が渡された場合は、受信中のアップロードを届いた分から処理します（失敗時はアップロードを中止します）。
+    終了時（失敗時も）にジョブの作業ディレクトリへの参照を解放し、一時ファイルを削除します。
+    """
+    process_id = job.id
+
+    try:
+        # アップロード全体のハッシュで、同じ音声の文字起こし結果がキャッシュにあればそれを使う
+        cache_key = transcription_cache.make_key(file_hash, "ja", whisper_service.model) if file_hash else None
+        combined_result = transcription_cache.get("file", cache_key) if cache_key else None
+        # セグメントの構造化データを持たない古い形式のエントリは使わない
+        if combined_result is not None and "transcript" not in combined_result:
+            combined_result = None
+        if combined_result is not None:
+            combined_result["transcript"] = Transcript.from_dict(combined_result["transcript"])
+            stage_timings = {}
+            cache_status = "hit"
+        elif upload is not None:
+            combined_result, stage_timings = await transcribe_growing_upload(job, upload, user)
+            # アップロード全体のハッシュは受信し終えてから分かるため、結果のキャッシュへの記録にだけ使う
+            cache_key = transcription_cache.make_key(upload.sha256, "ja", whisper_service.model)
+            cache_status = "miss"
+        else:
+            transcribe = dispatch_audio_file if DISTRIBUTED else transcribe_audio_file
+            combined_result, stage_timings = await transcribe(job, original_file_path, user)
+            cache_status = "miss"
+
         if not combined_result["success"]:
             raise HTTPException(
                 status_code=500, 
                 detail=f"文字起こしに失敗しました: {combined_result.get('error', '不明なエラー')}"
             )
         
-        print(f"✓ 文字起こし完了: {combined_result['segment_count']}セグメント")
-        print(f"  - 総処理時間: {combined_result['total_processing_time']:.1f}秒")
-        print(f"  - 総音声長: {combined_result['total_duration']:.1f}秒")
-        
+        compaction = combined_result.get("compaction")
+        if compaction and cache_status == "miss":
+            SILENCE_SECONDS_REMOVED.inc(compaction["saved_seconds"])
+
+        # すべてのチャンクが成功した結果のみファイル単位でキャッシュする
+        if cache_key and cache_status == "miss" and not combined_result.get("failed_count"):
+            transcription_cache.put("file", cache_key, {**combined_result, "transcript": combined_result["transcript"].to_dict()})
+
         # ステップ6: 結果をファイルに保存
-        result_file_path = await whisper_service.save_transcription_result(
-            combined_result,
-            output_dir="transcription_results",
-            user=user,
-            original_filename=audio_file.filename # 元のファイル名を使用
-        )
-        print(f"✓ 結果ファイル保存完了: {result_file_path}")
-        
-        # ステップ7: 一時ファイルのクリーンアップ
-        # ここで、分割ファイルと変換した一時ファイルを削除する
-        # デバッグのためコメントアウトしている場合は、処理が成功したら忘れずに戻してください
-        # audio_processor.cleanup_temp_files(files_to_clean_up_after_transcription, keep_original=False) # デバッグのためコメントアウトを継続
-        # print("✓ 一時ファイルクリーンアップ完了")
+        job.update("結果の保存", 0.95)
+        with time_stage("save", job):
+            result_file_path = await whisper_service.save_transcription_result(
+                combined_result,
+                output_dir=str(RESULTS_DIR),
+                user=user,
+                original_filename=original_filename, # 元のファイル名を使用
+                job_id=process_id
+            )
+
+
+        # 実際に文字起こししたジョブの所要時間を、以降の処理時間の予測に使う
+        # （予測と同じくヘッダから読んだ長さを使う。受信しながら処理したジョブはアップロードの速さに左右されるため記録しない）
+        if cache_status == "miss" and upload is None:
+            await asyncio.to_thread(job_manager.record_timings, job, job.audio_seconds or combined_result["total_duration"])
 
         # レスポンス準備
         response = {
@@ -208,69 +530,368 @@ async def okoshi_process(
                 "duration_minutes": round(combined_result["total_duration"] / 60, 2),
                 "processing_time_seconds": round(combined_result["total_processing_time"], 2),
                 "segment_count": combined_result["segment_count"],
-                "file_path": str(result_file_path) # Pathオブジェクトを文字列に変換
+                "stage_timings": stage_timings,
+                "stage_seconds": job.stage_timings,
+                "eta": job.schedule_info(),
+                "silence_compaction": compaction,
+                "cache": cache_status,
+                "file_path": str(result_file_path), # Pathオブジェクトを文字列に変換
+                "downloads": {
+                    format_name: f"/download/transcription/{Path(result_file_path).name}?format={format_name}"
+                    for format_name in FORMATS
+                } if result_file_path else {}
             }
         }
         
-        print(f"=== 音声処理完了 (ID: {process_id}) ===")
+        logger.info(
+            "transcription completed",
+            extra={
+                "event": "transcribed",
+                "job_id": process_id,
+                "cache": cache_status,
+                "segment_count": combined_result["segment_count"],
+                "audio_seconds": round(combined_result["total_duration"], 3),
+                "failed_chunks": combined_result.get("failed_count", 0),
+            },
+        )
         return response
-        
+
     except HTTPException:
         # HTTPExceptionはそのまま再発生
         raise
-    except Exception as e:
-        print(f"❌ 予期せぬエラー: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        
-        # エラー時のクリーンアップ
-        try:
-            # デバッグのためコメントアウトしている場合は、処理が成功したら忘れずに戻してください
-            # if 'original_file_path' in locals() and original_file_path.is_file():
-            #     os.remove(original_file_path)
-            # if converted_file_path and converted_file_path.is_file() and converted_file_path != original_file_path:
-            #     os.remove(converted_file_path)
-            # if 'split_files' in locals():
-            #     audio_processor.cleanup_temp_files(split_files, keep_original=False)
-            pass # コメントアウトした場合はpassを置く
-        except Exception as cleanup_e:
-            print(f"❌ エラー時のクリーンアップ失敗: {cleanup_e}")
-            pass
-        
+    except Exception:
+        logger.exception("unexpected error while processing job", extra={"event": "job_error", "job_id": process_id})
         raise HTTPException(
             status_code=500, 
             detail=f"サーバー内部エラーが発生しました。ITサポートに連絡してください。(ID: {process_id})"
         )
+    finally:
+        if upload is not None and not upload.completed:
+            # 受信の途中で失敗した場合は、以降のPUTを受け付けない
+            upload.abort()
+        # ステップ7: 一時ファイル（元の音声・変換後のMP3・分割チャンク）を作業ディレクトリごと削除する
+        workspaces.release(job.id)
+
+
+async def submit_job(user: str, audio_file: UploadFile, batch: Optional[Batch] = None) -> Job:
+    """
+    アップロードを保存し、文字起こしジョブを実行待ち行列に入れます。
+    batch が渡された場合はそのバッチのジョブとして登録します（待ち行列の空きはバッチ単位で確認済みとみなします）。
+    """
+    # 待ち行列が満杯の場合は、アップロードを保存する前に断る
+    if batch is None and not job_manager.has_capacity():
+        raise HTTPException(status_code=503, detail="現在混み合っています。しばらくしてから再度お試しください。")
+
+    job = job_manager.create(user=user, filename=audio_file.filename if audio_file else "", batch=batch)
+    logger.info("job received", extra={"event": "job_received", "job_id": job.id, "user": user, "audio_filename": job.filename})
+    # 作業ディレクトリへの参照はジョブの処理（process_audio_job）が終わるまで保持する
+    # 待ち行列に入る前に失敗・中断した場合は、ここで解放する
+    workspace = workspaces.acquire(job.id)
+    submitted = False
+    try:
+        try:
+            original_file_path, file_hash = await receive_upload(job, user, audio_file, workspace.path)
+        except HTTPException as e:
+            job_manager.fail(job, e.status_code, e.detail)
+            raise
+        except Exception:
+            logger.exception("unexpected error while receiving upload", extra={"event": "job_error", "job_id": job.id})
+            job_manager.fail(job, 500, f"サーバー内部エラーが発生しました。ITサポートに連絡してください。(ID: {job.id})")
+            raise HTTPException(status_code=500, detail=job.error)
+
+        original_filename = original_file_path.name
+        await predict_job_time(job, original_file_path)
+        try:
+            job_manager.submit(
+                job,
+                lambda job: process_audio_job(job, original_file_path, user, original_filename, file_hash=file_hash)
+            )
+        except JobQueueFullError as e:
+            raise queue_full_error(job, e)
+        submitted = True
+    finally:
+        if not submitted:
+            workspaces.release(job.id)
+    return job
+
+
+async def submit_batch(user: str, audio_files: list[UploadFile]) -> Batch:
+    """
+    複数の音声ファイル（ZIPアーカイブは中の音声ファイルに展開）を1ファイル1ジョブとして実行待ち行列に入れます。
+    ジョブは利用者ごとに公平に実行されるため、大量のファイルを投入しても他の利用者のジョブは待たされません。
+    個々のファイルの受信・検証に失敗しても、そのファイルのジョブが失敗になるだけでバッチ全体は続行します。
+    """
+    if not user or not user.strip():
+        raise HTTPException(status_code=400, detail="登録者名が入力されていません")
+    audio_files = [upload for upload in audio_files or [] if upload is not None and upload.filename]
+    if not audio_files:
+        raise HTTPException(status_code=400, detail="音声ファイルがアップロードされていません")
+
+    # アーカイブはファイル一覧だけを読み、中の音声ファイルを個別のアップロードとして扱う
+    uploads = []
+    for upload in audio_files:
+        if not is_archive(upload.filename):
+            uploads.append(upload)
+            continue
+        try:
+            members = open_archive_members(upload.file, audio_processor.allowed_extensions, MAX_BATCH_FILES)
+        except ArchiveError as e:
+            raise HTTPException(status_code=400, detail=f"{upload.filename}: {e}")
+        uploads.extend(members)
+
+    if not uploads:
+        raise HTTPException(status_code=400, detail="音声ファイルが含まれていません")
+    if len(uploads) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"ファイルが多すぎます（{len(uploads)}件、上限{MAX_BATCH_FILES}件）。")
+    # すべてのファイルを待ち行列に入れられない場合は、保存を始める前に断る
+    if not job_manager.has_capacity(len(uploads)):
+        raise HTTPException(status_code=503, detail="現在混み合っています。ファイル数を減らすか、しばらくしてから再度お試しください。")
+
+    batch = job_manager.create_batch(user)
+    logger.info("batch received", extra={"event": "batch_received", "batch_id": batch.id, "user": user, "files": len(uploads)})
+    try:
+        # 受信したファイルから順に待ち行列に入れるため、後のファイルの保存中に先のファイルの処理が始まる
+        for upload in uploads:
+            try:
+                await submit_job(user, upload, batch=batch)
+            except HTTPException:
+                # 失敗はそのファイルのジョブに記録されている
+                pass
+    finally:
+        batch.receiving = False
+    return batch
+
+
+def create_upload(user: str, filename: str, size: int) -> tuple[UploadSession, Job]:
+    """
+    再開可能なアップロードと、その文字起こしジョブを作成します。アップロードIDはジョブIDと同じです。
+    受信したデータはジョブの作業ディレクトリに書き込まれます。
+    """
+    if not user or not user.strip():
+        raise HTTPException(status_code=400, detail="登録者名が入力されていません")
+    filename = Path(filename or "").name
+    if Path(filename).suffix.lower() not in audio_processor.allowed_extensions:
+        raise HTTPException(status_code=400, detail=f"許可されていないファイル形式です: {Path(filename).suffix.lower()}")
+    if not job_manager.has_capacity():
+        raise HTTPException(status_code=503, detail="現在混み合っています。しばらくしてから再度お試しください。")
+
+    job = job_manager.create(user=user, filename=filename)
+    # 作業ディレクトリへの参照は、ジョブを待ち行列に入れるまではアップロードが、入れた後はジョブの処理が持つ
+    workspace = workspaces.acquire(job.id)
+    try:
+        upload = uploads.create(user, filename, size, workspace.path, upload_id=job.id)
+    except FileTooLargeError as e:
+        job_manager.fail(job, 413, str(e))
+        workspaces.release(job.id)
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        job_manager.fail(job, 400, str(e))
+        workspaces.release(job.id)
+        raise HTTPException(status_code=400, detail=str(e))
+    job.update("アップロードの受信", 0.0)
+    return upload, job
+
+
+def get_upload(upload_id: str) -> tuple[UploadSession, Job]:
+    upload = uploads.get(upload_id)
+    job = job_manager.get(upload_id)
+    if upload is None or job is None:
+        raise HTTPException(status_code=404, detail="アップロードが見つかりません")
+    return upload, job
+
+
+async def start_upload_job(upload: UploadSession, job: Job):
+    """
+    アップロードのジョブを実行待ち行列に入れます。受信中に入れた場合は、届いた分から処理が始まります。
+    処理時間は、受信済みのファイルはヘッダの長さから、受信中のファイルは宣言されたサイズと形式から見積もった長さから予測します。
+    """
+    if upload.completed:
+        runner = lambda job: process_audio_job(job, upload.path, upload.user, upload.filename, file_hash=upload.sha256)
+        await predict_job_time(job, upload.path)
+        if job.status != "pending":
+            # 長さの読み取り中に中止された
+            return
+    else:
+        runner = lambda job: process_audio_job(job, upload.path, upload.user, upload.filename, upload=upload)
+        job_manager.predict(job, estimate_audio_seconds(upload.size, upload.format))
+    try:
+        job_manager.submit(job, runner)
+    except JobQueueFullError as e:
+        upload.abort()
+        workspaces.release(job.id)
+        raise queue_full_error(job, e)
+    upload.started = not upload.completed
+
+
+async def receive_upload_range(upload_id: str, start: int, chunks) -> tuple[UploadSession, Job]:
+    """
+    アップロードの続き（start からのバイト列）を受信します。
+    先頭から順に読める形式（WAV・MP3・WebM・MPEG）は、最初のデータが届いた時点でジョブを待ち行列に入れ、
+    アップロードの完了を待たずに分割と文字起こしを始めます（api ロールでは完了後にワーカーへ渡します）。
+    """
+    upload, job = get_upload(upload_id)
+    try:
+        await upload.append(start, chunks)
+    except UploadOffsetError as e:
+        # 受信済みのバイト数をヘッダでも返し、クライアントがその位置から送り直せるようにする
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        job.publish("upload_progress", offset=upload.offset, size=upload.size)
+    if not upload.started and upload.streamable and not DISTRIBUTED and job.status == "pending":
+        await start_upload_job(upload, job)
+    return upload, job
+
+
+async def complete_upload(upload_id: str) -> tuple[UploadSession, Job]:
+    """
+    すべて受信したアップロードを確定します。まだ処理を始めていない場合は、ここでジョブを待ち行列に入れます。
+    """
+    upload, job = get_upload(upload_id)
+    if upload.aborted:
+        raise HTTPException(status_code=410, detail="このアップロードは中止されました")
+    first = not upload.completed
+    try:
+        upload.complete()
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Upload-Offset": str(e.offset)})
+    if first:
+        record_stage("receive", upload.completed_at - upload.created_at, job, bytes=upload.size)
+        job.publish("uploaded", bytes=upload.size)
+        if job.status == "pending":
+            await start_upload_job(upload, job)
+    return upload, job
+
+
+def abort_upload(upload: UploadSession, job: Job, reason: str):
+    """
+    アップロードを中止します。ジョブが処理を始めていない場合はここで失敗にし、作業ディレクトリを解放します
+    （処理中のジョブは、アップロードの読み出しが中断されて失敗します）。
+    """
+    upload.abort()
+    uploads.remove(upload.id)
+    if job.status == "pending":
+        job_manager.fail(job, 400, reason)
+        workspaces.release(job.id)
+
+
+async def expire_idle_uploads():
+    """
+    データが届かなくなった未完了のアップロードを、掃除係と同じ間隔で中止します。
+    """
+    while True:
+        await asyncio.sleep(workspaces.interval)
+        try:
+            for upload in uploads.expire_idle():
+                job = job_manager.get(upload.id)
+                if job is not None:
+                    abort_upload(upload, job, "一定時間データが届かなかったため、アップロードを中止しました")
+        except Exception:
+            logger.exception("upload expiry failed", extra={"event": "upload_expiry_error"})
+
+
+@router.on_event("startup")
+async def start_upload_expiry():
+    asyncio.create_task(expire_idle_uploads())
+
+
+@router.post("/okoshi", response_model=params.ResponseParams)
+async def okoshi_process(
+    user: Annotated[str, Form(description="部署名・氏名")] = "",
+    audio_file: Annotated[UploadFile, File(description="テキスト化する音声ファイル")] = None
+):
+    """
+    音声ファイルのアップロードと文字起こし処理
+    ジョブとして実行し、完了まで待ってから結果を返します。
+    完了を待たずにジョブIDを受け取る場合は POST /jobs を使用してください。
+    """
+    job = await submit_job(user, audio_file)
+    await job.wait()
+    if job.status == "failed":
+        raise HTTPException(status_code=job.status_code or 500, detail=job.error)
+    return job.result
 
 @router.get("/download/transcription/{filename}")
-async def download_transcription_file(filename: str):
+async def download_transcription_file(
+    filename: str,
+    format: Annotated[str, Query(description="出力形式 (txt / srt / vtt / json)")] = "txt"
+):
     """
     指定された文字起こしファイルをダウンロード
+    txt 以外の形式は、保存済みのセグメントの構造化データからその場で生成します（文字起こしの再実行は行いません）。
     """
-    # FastAPIがデコードしたファイル名をログに出力
-    print(f"DEBUG: Download request received for filename (decoded): {filename}")
+    format = format.lower()
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"対応していない形式です（{' / '.join(FORMATS)}）")
 
     # base_dirを先に絶対パスで定義
-    base_dir_path_obj = Path("transcription_results").resolve()
-    print(f"DEBUG: Base directory (resolved): {base_dir_path_obj}")
+    base_dir_path_obj = RESULTS_DIR.resolve()
 
     file_path = base_dir_path_obj / filename
-    print(f"DEBUG: Attempting to access full file_path: {file_path}")
     
     if not file_path.is_file():
-        print(f"DEBUG: File NOT found at: {file_path}")
-        # Dockerコンテナ内で実際にファイルが存在するか ls -l で確認するよう促す
-        print(f"DEBUG: Please check inside Docker container: ls -l {base_dir_path_obj}/")
+        logger.info("download file not found", extra={"event": "download_not_found", "file": str(file_path)})
         raise HTTPException(status_code=404, detail="ファイルが見つかりません")
     
     # Ensure the file is within the intended directory to prevent path traversal
     abs_file_path = file_path.resolve()
-    print(f"DEBUG: Resolved file_path for security check: {abs_file_path}")
     
     # 絶対パスでのディレクトリトラバーサルチェック
     if not str(abs_file_path).startswith(str(base_dir_path_obj)):
-        print(f"DEBUG: Security check failed: {abs_file_path} is not within {base_dir_path_obj}")
+        logger.warning("download path rejected", extra={"event": "download_rejected", "file": str(abs_file_path)})
         raise HTTPException(status_code=400, detail="無効なファイルパスです")
 
-    print(f"DEBUG: File found and path is valid. Serving file: {abs_file_path}")
-    return FileResponse(path=abs_file_path, filename=filename, media_type="text/plain")
\ No newline at end of file
+    if format == "txt":
+        return FileResponse(path=abs_file_path, filename=filename, media_type="text/plain")
+
+    source = structured_path(abs_file_path)
+    if not source.is_file():
+        raise HTTPException(status_code=404, detail=f"この結果は {format} 形式では出力できません（セグメントの情報がありません）")
+    content = await asyncio.to_thread(render_transcription, source, format)
+    extension, media_type = FORMATS[format]
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{abs_file_path.stem}{extension}"'}
+    )
+
+
+def render_transcription(source: Path, format_name: str) -> str:
+    """
+    保存済みのセグメントの構造化データを読み込み、指定の形式で出力します。
+    """
+    data = json.loads(source.read_text(encoding="utf-8"))
+    transcript = Transcript.from_dict(data.get("transcript") or {})
+    metadata = {key: data.get(key) for key in ("user", "original_filename", "created_at")}
+    return transcript.export(format_name, metadata)
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    文字起こしキャッシュのヒット/ミス回数と使用量を返します。
+    """
+    return transcription_cache.stats()
+
+
+@router.get("/storage/stats")
+async def get_storage_stats():
+    """
+    使用中の作業ディレクトリ数と、作業ディレクトリ・結果ファイルのディスク使用量を返します。
+    使用量は掃除係が定期的に計測した値です。
+    """
+    return workspaces.stats()
+
+
+@router.get("/queue/stats")
+async def get_queue_stats():
+    """
+    動作モード（standalone / api）、実行待ち・実行中のジョブ数と予測される残り処理時間の合計、
+    api ロールではタスクキューの種類・状態ごとのタスク数を返します。
+    """
+    if not DISTRIBUTED:
+        return {"role": ROLE, "jobs": job_manager.schedule_stats()}
+    return {"role": ROLE, "jobs": job_manager.schedule_stats(), "tasks": await asyncio.to_thread(task_queue.stats)}
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Annotated, Optional
+import asyncio
+import api.schemas.params as params
+
+from api.routers import okoshi
+from api.utils.transcript import FORMATS, format_clock
+
+router = APIRouter()
+
+
+def result_links(result: dict) -> dict:
+    return {
+        **result,
+        "result_url": f"/results/{result['result_id']}",
+        "downloads": {
+            format_name: f"/download/transcription/{result['result_file']}?format={format_name}"
+            for format_name in FORMATS
+        },
+    }
+
+
+@router.get("/results", response_model=params.ResultListResponse)
+async def list_results(
+    user: Annotated[Optional[str], Query(description="部署名・氏名（指定した場合はその登録者の結果のみ）")] = None,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+    offset: Annotated[int, Query(ge=0)] = 0
+):
+    """
+    保存済みの文字起こし結果を新しい順に返します。
+    """
+    total, results = await asyncio.to_thread(okoshi.result_index.list, user, limit, offset)
+    return {"total": total, "results": [result_links(result) for result in results]}
+
+
+@router.get("/results/search", response_model=params.SearchResponse)
+async def search_results(
+    q: Annotated[str, Query(min_length=1, description="検索語（空白区切りで複数指定すると、すべてを含むセグメントを返します）")],
+    user: Annotated[Optional[str], Query(description="部署名・氏名（指定した場合はその登録者の結果のみ）")] = None,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50
+):
+    """
+    保存済みの文字起こし結果を全文検索し、検索語を含むセグメントとその時刻を返します。
+    """
+    hits = await asyncio.to_thread(okoshi.result_index.search, q, user, limit)
+    return {
+        "query": q,
+        "hits": [
+            {
+                **hit,
+                "timestamp": format_clock(hit["start"]),
+                # メディアフラグメント（#t=秒）でセグメントの開始時刻を指す
+                "segment_url": f"/results/{hit['result_id']}#t={hit['start']:.3f}",
+            }
+            for hit in hits
+        ],
+    }
+
+
+@router.get("/results/{result_id}", response_model=params.ResultDetailResponse)
+async def get_result(result_id: str):
+    """
+    保存済みの文字起こし結果の情報と、時刻付きのセグメントを返します。
+    """
+    result = await asyncio.to_thread(okoshi.result_index.get, result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="結果が見つかりません")
+    return result_links(result)
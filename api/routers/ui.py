@@ -1,11 +1,12 @@
-from fastapi import FastAPI, APIRouter, Request
+from fastapi import APIRouter
 from fastapi.responses import HTMLResponse
 from fastapi.responses import FileResponse
 from pathlib import Path
 from starlette.staticfiles import StaticFiles
-from api.routers import okoshi
+from api.utils.log import get_logger
 
 router = APIRouter()
+logger = get_logger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 static_dir = BASE_DIR / "static"
@@ -16,6 +17,6 @@ HTMLを返す
 """
 @router.get("/ui", response_class=HTMLResponse)
 def index():
-    print("'/ui' endpoint accessed. Initiating directory cleanup.")
-    okoshi.clean_directories_on_startup() # Call the synchronous cleanup function
+    # 一時ファイルの削除はジョブごとの作業ディレクトリと掃除係（api/utils/workspace.py）が行う
+    logger.info("'/ui' endpoint accessed.", extra={"event": "ui_accessed"})
     return FileResponse(static_dir / "index.html")
\ No newline at end of file
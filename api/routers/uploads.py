@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Form, Header, HTTPException, Request
+from typing import Annotated, Optional
+import api.schemas.params as params
+
+from api.routers import okoshi
+from api.utils.job_manager import Job
+from api.utils.uploads import UploadSession, parse_content_range
+
+router = APIRouter()
+
+
+def upload_status(upload: UploadSession, job: Job) -> dict:
+    return {
+        **upload.to_dict(),
+        "job_id": job.id,
+        "status": job.status,
+        "eta_seconds": job.eta_seconds,
+        "upload_url": f"/uploads/{upload.id}",
+        "complete_url": f"/uploads/{upload.id}/complete",
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/result/{job.id}",
+    }
+
+
+@router.post("/uploads", response_model=params.UploadStatusResponse, status_code=201)
+async def create_upload(
+    user: Annotated[str, Form(description="部署名・氏名")] = "",
+    filename: Annotated[str, Form(description="元ファイル名")] = "",
+    size: Annotated[int, Form(description="ファイル全体のサイズ（バイト）")] = 0
+):
+    """
+    再開可能なアップロードを作成します。続けて PUT /uploads/{upload_id} でファイルの内容を先頭から送信し、
+    すべて送信したら POST /uploads/{upload_id}/complete で確定します。
+    """
+    upload, job = okoshi.create_upload(user, filename, size)
+    return upload_status(upload, job)
+
+
+@router.put("/uploads/{upload_id}", response_model=params.UploadStatusResponse)
+async def upload_range(
+    upload_id: str,
+    request: Request,
+    content_range: Annotated[Optional[str], Header(description="送信する範囲（例: bytes 0-1048575/5000000）")] = None
+):
+    """
+    ファイルの内容を Content-Range で示した位置から受信します。開始位置は受信済みのバイト数（offset）と
+    一致している必要があり、一致しない場合は409と受信済みのバイト数（Upload-Offset ヘッダ）を返します。
+    接続が途中で切れた場合も、それまでに届いた分は受信済みになります。
+    """
+    try:
+        start, _, total = parse_content_range(content_range)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upload = okoshi.uploads.get(upload_id)
+    if upload is not None and total is not None and total != upload.size:
+        raise HTTPException(status_code=400, detail=f"Content-Range の全体のサイズが作成時のサイズ（{upload.size}バイト）と異なります")
+    upload, job = await okoshi.receive_upload_range(upload_id, start, request.stream())
+    return upload_status(upload, job)
+
+
+@router.get("/uploads/{upload_id}", response_model=params.UploadStatusResponse)
+async def get_upload_status(upload_id: str):
+    """
+    アップロードの受信済みのバイト数（offset）と状態を返します。接続が切れた後は、この offset から送り直します。
+    """
+    upload, job = okoshi.get_upload(upload_id)
+    return upload_status(upload, job)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=params.UploadStatusResponse, status_code=202)
+async def complete_upload(upload_id: str):
+    """
+    すべて受信したアップロードを確定し、文字起こしジョブの状態を返します。
+    受信中に処理を始めていない形式（M4A・MP4・WMA）は、ここで文字起こしジョブを待ち行列に入れます。
+    """
+    upload, job = await okoshi.complete_upload(upload_id)
+    return upload_status(upload, job)
+
+
+@router.delete("/uploads/{upload_id}", response_model=params.UploadStatusResponse)
+async def abort_upload(upload_id: str):
+    """
+    アップロードを中止します。受信済みのデータは削除され、ジョブは失敗になります。
+    """
+    upload, job = okoshi.get_upload(upload_id)
+    if upload.completed:
+        raise HTTPException(status_code=409, detail="確定済みのアップロードは中止できません")
+    okoshi.abort_upload(upload, job, "アップロードが中止されました")
+    return upload_status(upload, job)
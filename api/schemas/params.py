@@ -1,6 +1,6 @@
 from fastapi import File, UploadFile, Form
 from pydantic import BaseModel, Field
-from typing import Annotated, Dict, Any, Optional
+from typing import Annotated, Dict, Any, List, Optional
 
 class ResponseParams(BaseModel):
     message: str = Field("", description="処理結果メッセージ")
@@ -9,6 +9,107 @@ class ResponseParams(BaseModel):
     transcription_text: Optional[str] = Field("", description="文字起こし結果テキスト")
     processing_info: Optional[Dict[str, Any]] = Field(None, description="処理詳細情報")
 
+class JobSubmitResponse(BaseModel):
+    job_id: str = Field(..., description="ジョブID")
+    status: str = Field(..., description="ジョブの状態")
+    status_url: str = Field(..., description="進捗確認用URL")
+    result_url: str = Field(..., description="結果取得用URL")
+    audio_seconds: Optional[float] = Field(None, description="ヘッダから読んだ音声長（秒）")
+    predicted_seconds: Optional[float] = Field(None, description="予測処理時間（秒、待ち時間を含まない）")
+    estimated_start_at: Optional[float] = Field(None, description="予測処理開始日時 (UNIX時間)")
+    estimated_finish_at: Optional[float] = Field(None, description="予測完了日時 (UNIX時間)")
+    eta_seconds: Optional[float] = Field(None, description="予測される完了までの残り時間（秒）")
+
+class JobStatusResponse(BaseModel):
+    job_id: str = Field(..., description="ジョブID")
+    batch_id: Optional[str] = Field(None, description="バッチID（バッチで投入された場合）")
+    user: str = Field("", description="部署名・氏名")
+    filename: str = Field("", description="元ファイル名")
+    status: str = Field(..., description="ジョブの状態 (pending / queued / running / done / failed)")
+    stage: str = Field("", description="現在の処理段階")
+    progress: float = Field(0.0, description="進捗 (0.0〜1.0)")
+    error: Optional[str] = Field(None, description="エラーメッセージ")
+    created_at: float = Field(..., description="受付日時 (UNIX時間)")
+    started_at: Optional[float] = Field(None, description="処理開始日時 (UNIX時間)")
+    finished_at: Optional[float] = Field(None, description="処理完了日時 (UNIX時間)")
+    audio_seconds: Optional[float] = Field(None, description="ヘッダから読んだ音声長（秒）")
+    predicted_seconds: Optional[float] = Field(None, description="予測処理時間（秒、待ち時間を含まない）")
+    estimated_start_at: Optional[float] = Field(None, description="予測処理開始日時 (UNIX時間)")
+    estimated_finish_at: Optional[float] = Field(None, description="予測完了日時 (UNIX時間)")
+    eta_seconds: Optional[float] = Field(None, description="予測される完了までの残り時間（秒）")
+    result_url: str = Field("", description="結果取得用URL")
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str = Field(..., description="バッチID")
+    user: str = Field("", description="部署名・氏名")
+    status: str = Field(..., description="バッチの状態 (pending / queued / running / done / partial / failed)")
+    progress: float = Field(0.0, description="全ファイルの平均進捗 (0.0〜1.0)")
+    total: int = Field(0, description="ファイル数")
+    done: int = Field(0, description="文字起こしが完了したファイル数")
+    failed: int = Field(0, description="失敗したファイル数")
+    created_at: float = Field(..., description="受付日時 (UNIX時間)")
+    finished_at: Optional[float] = Field(None, description="全ファイルの処理完了日時 (UNIX時間)")
+    jobs: List[JobStatusResponse] = Field(default_factory=list, description="ファイルごとのジョブの状態")
+    status_url: str = Field("", description="進捗確認用URL")
+    download_url: str = Field("", description="全ファイルの結果をまとめたZIPのダウンロードURL")
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str = Field(..., description="アップロードID（ジョブIDと同じ）")
+    job_id: str = Field(..., description="ジョブID")
+    filename: str = Field("", description="元ファイル名")
+    size: int = Field(..., description="ファイル全体のサイズ（バイト）")
+    offset: int = Field(0, description="受信済みのバイト数。続きはこの位置から送信します")
+    format: Optional[str] = Field(None, description="先頭バイトから判定した形式")
+    completed: bool = Field(False, description="すべて受信して確定したか")
+    started: bool = Field(False, description="受信の完了を待たずに文字起こしを始めたか")
+    status: str = Field(..., description="ジョブの状態 (pending / queued / running / done / failed)")
+    eta_seconds: Optional[float] = Field(None, description="予測される完了までの残り時間（秒）")
+    upload_url: str = Field("", description="続きを送信するURL（PUT）")
+    complete_url: str = Field("", description="アップロードを確定するURL（POST）")
+    status_url: str = Field("", description="進捗確認用URL")
+    result_url: str = Field("", description="結果取得用URL")
+
+class ResultSummary(BaseModel):
+    result_id: str = Field(..., description="結果ID（結果ファイル名から拡張子を除いたもの）")
+    user: str = Field("", description="部署名・氏名")
+    original_filename: str = Field("", description="元ファイル名")
+    job_id: Optional[str] = Field(None, description="文字起こししたジョブのID")
+    language: Optional[str] = Field(None, description="言語")
+    duration: float = Field(0.0, description="音声長（秒）")
+    segment_count: int = Field(0, description="セグメント数")
+    created_at: float = Field(..., description="保存日時 (UNIX時間)")
+    result_url: str = Field("", description="結果の詳細（セグメント一覧）のURL")
+    downloads: Dict[str, str] = Field(default_factory=dict, description="形式ごとのダウンロードURL")
+
+class ResultListResponse(BaseModel):
+    total: int = Field(0, description="条件に合う結果の総数")
+    results: List[ResultSummary] = Field(default_factory=list, description="結果（新しい順）")
+
+class ResultSegment(BaseModel):
+    position: int = Field(..., description="結果内でのセグメント番号")
+    start: float = Field(..., description="開始（秒）")
+    end: float = Field(..., description="終了（秒）")
+    text: str = Field("", description="テキスト")
+
+class ResultDetailResponse(ResultSummary):
+    segments: List[ResultSegment] = Field(default_factory=list, description="セグメント（時刻順）")
+
+class SearchHit(BaseModel):
+    result_id: str = Field(..., description="結果ID")
+    user: str = Field("", description="部署名・氏名")
+    original_filename: str = Field("", description="元ファイル名")
+    created_at: float = Field(..., description="保存日時 (UNIX時間)")
+    position: int = Field(..., description="結果内でのセグメント番号")
+    start: float = Field(..., description="セグメントの開始（秒）")
+    end: float = Field(..., description="セグメントの終了（秒）")
+    timestamp: str = Field("", description="セグメントの開始時刻（表示用）")
+    text: str = Field("", description="セグメントのテキスト")
+    segment_url: str = Field("", description="該当セグメントを指す結果の詳細URL")
+
+class SearchResponse(BaseModel):
+    query: str = Field("", description="検索語")
+    hits: List[SearchHit] = Field(default_factory=list, description="検索語を含むセグメント（新しい結果の順、結果内は時刻順）")
+
 # フォームデータを受け取るための関数パラメータ定義
 # Pydanticモデルではなく、関数の引数として定義する
 def get_form_params(
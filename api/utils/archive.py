@@ -0,0 +1,74 @@
+import asyncio
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import IO
+
+# バッチで受け付けるアーカイブの拡張子
+ARCHIVE_EXTENSIONS = {".zip"}
+
+
+class ArchiveError(ValueError):
+    """
+    アーカイブを展開できない、または中身が条件を満たさない場合に送出されます。
+    """
+    pass
+
+
+class ArchiveMemberUpload:
+    """
+    アーカイブ内の1ファイルを、UploadFile と同じように（filename・size・read()）扱えるようにしたものです。
+    中身は read() のたびに必要な分だけ展開するため、アーカイブ全体を展開した一時ファイルは作りません。
+    """
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo):
+        self.filename = PurePosixPath(info.filename).name
+        self.size = info.file_size
+        self.content_type = None
+        self._archive = archive
+        self._info = info
+        self._stream = None
+        self._exhausted = False
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._exhausted:
+            return b""
+        if self._stream is None:
+            self._stream = self._archive.open(self._info)
+        # 展開はCPUを使うため、イベントループを止めないようスレッドで行う
+        data = await asyncio.to_thread(self._stream.read, size)
+        if not data:
+            self._exhausted = True
+            await self.close()
+        return data
+
+    async def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+def is_archive(filename: str) -> bool:
+    return Path(filename or "").suffix.lower() in ARCHIVE_EXTENSIONS
+
+
+def open_archive_members(file: IO[bytes], allowed_extensions: set[str], max_files: int) -> list[ArchiveMemberUpload]:
+    """
+    ZIPアーカイブに含まれる音声ファイル（allowed_extensions の拡張子）を返します。
+    ディレクトリ・隠しファイル・macOSのメタデータ（__MACOSX）は読み飛ばします。
+    読むのはアーカイブ末尾のファイル一覧だけで、中身の展開は各ファイルの read() で行います。
+    音声ファイルが max_files 件を超える場合や、ZIPとして読めない場合は ArchiveError を送出します。
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"アーカイブを読み取れませんでした: {e}")
+
+    members = []
+    for info in archive.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or "__MACOSX" in path.parts or path.name.startswith("."):
+            continue
+        if path.suffix.lower() in allowed_extensions:
+            members.append(ArchiveMemberUpload(archive, info))
+    if len(members) > max_files:
+        raise ArchiveError(f"アーカイブ内の音声ファイルが多すぎます（{len(members)}件、上限{max_files}件）。")
+    return members
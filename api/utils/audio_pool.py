@@ -0,0 +1,124 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from api.utils.log import get_logger
+from api.utils.metrics import AUDIO_POOL_ACTIVE, AUDIO_POOL_WAITING, collect_stages, replay_stages
+
+logger = get_logger(__name__)
+
+
+def _run_collecting_stages(fn: Callable[..., Any], args: tuple, kwargs: dict) -> tuple[Any, list]:
+    # 子プロセスで記録した処理段階（encode_chunk など）は、結果と一緒に親プロセスへ返す
+    with collect_stages() as records:
+        result = fn(*args, **kwargs)
+    return result, records
+
+
+class AudioWorkPool:
+    """
+    デコード・変換・分割などのCPU負荷の高い音声処理を実行するプロセスプールです。
+    処理は別プロセスで行われるため、イベントループ（他のリクエストや /ui の応答）は止まりません。
+
+    - 同時に実行する処理数は max_workers（OKOSHI_AUDIO_WORKERS、既定: CPUコア数）
+    - 投入済みの処理（実行中 + 待機中）が max_workers + max_pending（OKOSHI_AUDIO_QUEUE）に
+      達している間は、run() は空きができるまで待ちます（バックプレッシャー）
+    - run() を待っているタスクがキャンセルされた場合、まだ開始していない処理は取り消されます。
+      実行中の処理は完了まで動きますが、結果は破棄され、枠は処理の完了時に解放されます
+    - 子プロセスで記録された処理段階の所要時間は親プロセスのメトリクスとログに記録されます
+    """
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        self.max_workers = max_workers or int(os.getenv("OKOSHI_AUDIO_WORKERS", "0")) or os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = int(os.getenv("OKOSHI_AUDIO_QUEUE", str(self.max_workers * 2)))
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._active = 0
+        self._waiting = 0
+
+    def _ensure_started(self):
+        # プールとセマフォは実行中のイベントループ上で、最初の投入時に作る
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_pending)
+        if self._executor is None:
+            # fork はイベントループやスレッドの状態を引き継いでしまうため spawn で起動する
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    @property
+    def saturated(self) -> bool:
+        """
+        新しい処理を投入すると待たされる状態かどうかを返します。
+        """
+        return self._active >= self.max_workers + self.max_pending
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "active": self._active,
+            "waiting": self._waiting,
+        }
+
+    def _release(self, future):
+        self._active -= 1
+        AUDIO_POOL_ACTIVE.set(self._active)
+        self._slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        fn(*args, **kwargs) をワーカープロセスで実行し、結果を返します。
+        fn と引数・戻り値はプロセス間で受け渡すため、pickle できる必要があります。
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        self._waiting += 1
+        AUDIO_POOL_WAITING.set(self._waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+            AUDIO_POOL_WAITING.set(self._waiting)
+
+        try:
+            future = self._executor.submit(_run_collecting_stages, fn, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._active += 1
+        AUDIO_POOL_ACTIVE.set(self._active)
+        # 枠は（キャンセル時も）処理が本当に終わってから解放する
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+
+        try:
+            result, records = await asyncio.wrap_future(future)
+            replay_stages(records)
+            return result
+        except asyncio.CancelledError:
+            if not future.cancel():
+                logger.info("cancelled audio task is still running; its result will be discarded", extra={"event": "audio_pool_cancel"})
+            raise
+        except BrokenProcessPool:
+            # ワーカーが異常終了した（メモリ不足で強制終了された等）。次回の投入でプールを作り直す
+            logger.error("audio worker process died; restarting the pool", extra={"event": "audio_pool_broken"})
+            self._executor = None
+            raise
+
+    def submit_threadsafe(self, loop: asyncio.AbstractEventLoop, fn: Callable[..., Any], *args) -> concurrent.futures.Future:
+        """
+        イベントループ loop の外（別スレッド）から fn(*args) をプールに投入し、結果の Future を返します。
+        split_audio_streaming の submit に渡すと、チャンクのエンコードがプールの上限とバックプレッシャーに従います。
+        Future を取り消すと、まだ開始していない処理は取り消されます。
+        """
+        return asyncio.run_coroutine_threadsafe(self.run(fn, *args), loop)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
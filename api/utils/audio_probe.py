@@ -0,0 +1,203 @@
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+from pydub import AudioSegment
+
+from api.utils.pcm_wav import read_wav_format
+
+# ヘッダの読み取りにかける時間の上限（秒）。壊れたファイルで ffprobe / ffmpeg が止まらないようにする
+PROBE_TIMEOUT_SECONDS = 30
+
+# ヘッダの長さ × ビットレートに対して、実際のファイルサイズがこの割合を下回る場合は途中で切れているとみなす
+MIN_SIZE_RATIO = 0.5
+
+# 長さをビットレートから推定した（ヘッダに長さの情報がない）ことを示すffmpegの警告
+ESTIMATED_DURATION_WARNING = "Estimating duration from bitrate"
+
+_CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "4.0": 4, "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+
+
+class ProbeError(ValueError):
+    """
+    ヘッダから音声のメタ情報を読み取れなかった（音声ファイルではない・壊れている）場合に送出されます。
+    """
+    pass
+
+
+class AudioProbe:
+    """
+    コンテナ・音声ストリームのヘッダから読み取ったメタ情報です（デコードは行いません）。
+    trusted が偽の場合、ヘッダの値（特に長さ）は信用できないため、全体をデコードして確認する必要があります。
+    """
+    def __init__(self, file_path: Path, format_name: Optional[str], codec: Optional[str], duration: Optional[float],
+                 sample_rate: Optional[int], channels: Optional[int], bit_rate: Optional[int],
+                 size_bytes: int, warnings: list[str] = None):
+        self.file_path = file_path
+        self.format_name = format_name
+        self.codec = codec
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.bit_rate = bit_rate
+        self.size_bytes = size_bytes
+        self.warnings = warnings or []
+
+    @property
+    def untrusted_reason(self) -> Optional[str]:
+        """
+        ヘッダを信用できない理由を返します。信用できる場合はNoneを返します。
+        """
+        if not self.duration or self.duration <= 0:
+            return "ヘッダに長さの情報がありません"
+        if any(ESTIMATED_DURATION_WARNING in warning for warning in self.warnings):
+            return "長さがビットレートからの推定値です"
+        if self.bit_rate:
+            expected_bytes = self.duration * self.bit_rate / 8
+            if self.size_bytes < expected_bytes * MIN_SIZE_RATIO:
+                return "ファイルサイズがヘッダの長さに対して小さすぎます（途中で切れている可能性があります）"
+        return None
+
+    @property
+    def trusted(self) -> bool:
+        return self.untrusted_reason is None
+
+    def to_dict(self) -> dict:
+        return {
+            "format_name": self.format_name,
+            "codec": self.codec,
+            "duration": self.duration,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "bit_rate": self.bit_rate,
+            "size_bytes": self.size_bytes,
+            "trusted": self.trusted,
+            "untrusted_reason": self.untrusted_reason,
+        }
+
+    def __repr__(self) -> str:
+        return (f"AudioProbe({self.file_path.name}, format={self.format_name}, codec={self.codec}, "
+                f"duration={self.duration}, trusted={self.trusted})")
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _probe_with_ffprobe(prober: str, file_path: Path) -> AudioProbe:
+    command = [
+        prober, "-v", "warning", "-of", "json", "-show_format", "-show_streams",
+        "-select_streams", "a:0", str(file_path),
+    ]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT_SECONDS)
+    stderr = completed.stderr.decode(errors="ignore")
+    try:
+        info = json.loads(completed.stdout.decode(errors="ignore") or "{}")
+    except json.JSONDecodeError:
+        info = {}
+    streams = info.get("streams") or []
+    if completed.returncode != 0 or not streams:
+        raise ProbeError(stderr.strip() or "音声ストリームが見つかりません")
+
+    stream, container = streams[0], info.get("format") or {}
+    return AudioProbe(
+        file_path,
+        format_name=container.get("format_name"),
+        codec=stream.get("codec_name"),
+        duration=_to_float(stream.get("duration")) or _to_float(container.get("duration")),
+        sample_rate=_to_int(stream.get("sample_rate")),
+        channels=_to_int(stream.get("channels")),
+        bit_rate=_to_int(stream.get("bit_rate")),
+        size_bytes=file_path.stat().st_size,
+        warnings=[line for line in stderr.splitlines() if line.strip()],
+    )
+
+
+def _probe_with_ffmpeg(file_path: Path) -> AudioProbe:
+    """
+    ffprobe がない環境では、ffmpeg が入力を開いたときに表示するヘッダ情報を読み取ります。
+    出力先を指定しないため、ffmpeg はヘッダを読んだところで終了します（デコードは行いません）。
+    """
+    command = [AudioSegment.converter, "-nostdin", "-hide_banner", "-i", str(file_path)]
+    completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT_SECONDS)
+    stderr = completed.stderr.decode(errors="ignore")
+
+    container = re.search(r"^Input #0, (.+?), from ", stderr, re.MULTILINE)
+    stream = re.search(r"Stream #0:\d+.*?: Audio: (.+)$", stderr, re.MULTILINE)
+    if container is None or stream is None:
+        raise ProbeError(stderr.strip().splitlines()[-1] if stderr.strip() else "音声ストリームが見つかりません")
+
+    duration = None
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    # 例: "pcm_s16le ([1][0][0][0] / 0x0001), 44100 Hz, stereo, s16, 1411 kb/s"
+    fields = [field.strip() for field in re.sub(r"\([^)]*\)", "", stream.group(1)).split(",")]
+    codec = fields[0].split()[0] if fields and fields[0] else None
+    sample_rate = channels = bit_rate = None
+    for field in fields[1:]:
+        if field.endswith(" Hz"):
+            sample_rate = _to_int(field[:-3])
+        elif field.endswith(" kb/s"):
+            kbps = _to_int(field[:-5])
+            bit_rate = kbps * 1000 if kbps else None
+        elif field in _CHANNEL_LAYOUTS:
+            channels = _CHANNEL_LAYOUTS[field]
+        elif field.endswith(" channels"):
+            channels = _to_int(field.split()[0])
+
+    return AudioProbe(
+        file_path,
+        format_name=container.group(1),
+        codec=codec,
+        duration=duration,
+        sample_rate=sample_rate,
+        channels=channels,
+        bit_rate=bit_rate,
+        size_bytes=file_path.stat().st_size,
+        warnings=[line for line in stderr.splitlines() if ESTIMATED_DURATION_WARNING in line],
+    )
+
+
+def probe_audio(file_path: Path) -> AudioProbe:
+    """
+    音声ファイルのヘッダだけを読み、形式・コーデック・長さ・サンプルレート・チャンネル数・ビットレートを返します。
+    ファイルサイズに関係なく数十ミリ秒で終わります。ffprobe があれば ffprobe を、なければ ffmpeg を使います。
+    非圧縮のWAVはRIFFヘッダを直接読みます（長さは実際にファイルにあるサンプル数から求めます）。
+    音声として読み取れない場合は ProbeError を送出します。
+    """
+    file_path = Path(file_path)
+    wav_format = read_wav_format(file_path)
+    if wav_format is not None:
+        return AudioProbe(
+            file_path,
+            format_name="wav",
+            codec=wav_format.codec,
+            duration=wav_format.duration,
+            sample_rate=wav_format.sample_rate,
+            channels=wav_format.channels,
+            bit_rate=wav_format.sample_rate * wav_format.block_align * 8,
+            size_bytes=file_path.stat().st_size,
+        )
+    prober = shutil.which("ffprobe") or shutil.which("avprobe")
+    try:
+        if prober:
+            return _probe_with_ffprobe(prober, file_path)
+        return _probe_with_ffmpeg(file_path)
+    except subprocess.TimeoutExpired:
+        raise ProbeError(f"ヘッダの読み取りが{PROBE_TIMEOUT_SECONDS}秒以内に終わりませんでした")
@@ -1,9 +1,137 @@
 import os
+import hashlib
 import subprocess
+import tempfile
+import threading
+import time
+import wave
+import aiofiles
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from pydub import AudioSegment
-from pydub.utils import mediainfo
 from pydub.exceptions import CouldntDecodeError
+from typing import Callable, Iterator, Optional
+import numpy as np
+
+from api.utils.audio_probe import AudioProbe, ProbeError, probe_audio
+from api.utils.pcm_wav import PcmWav, open_pcm_wav, read_wav_format, write_pcm_wav
+from api.utils.silence import FRAME_MS, TimeRemap, frame_energies, iter_split_points, quietest_offset_ms, speech_regions
+from api.utils.encoding_planner import EncodingPlan, plan_chunk_encoding
+from api.utils.log import get_logger
+from api.utils.metrics import BYTES_PROCESSED, time_stage
+
+logger = get_logger(__name__)
+
+
+class FileTooLargeError(ValueError):
+    """
+    アップロードされたファイルがサイズ上限を超えた場合に送出されます。
+    """
+    pass
+
+
+class AudioValidationError(ValueError):
+    """
+    音声ファイルとして検証できなかった場合に送出されます（メッセージは利用者向け）。
+    """
+    pass
+
+
+# ASFコンテナ（WMA）のヘッダGUID
+ASF_HEADER_GUID = bytes.fromhex("3026b2758e66cf11a6d900aa0062ce6c")
+# MPEG-TSのパケット長と同期バイト（M2TSは各パケットの前に4バイトのタイムスタンプが付く）
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+# sniff_audio_format に渡す先頭のバイト数（MPEG-TSの2つ目のパケットの同期バイトまで含む）
+SNIFF_HEADER_BYTES = 4 + TS_PACKET_SIZE * 2
+
+
+def _is_mpeg_ts(header: bytes, offset: int, packet_size: int) -> bool:
+    # 1バイトだけでは偶然一致しやすいため、次のパケットの同期バイトが届いていればそれも確かめる
+    if len(header) <= offset or header[offset] != TS_SYNC_BYTE:
+        return False
+    return len(header) <= offset + packet_size or header[offset + packet_size] == TS_SYNC_BYTE
+
+
+def sniff_audio_format(header: bytes) -> Optional[str]:
+    """
+    ファイル先頭のバイト列からコンテナ形式を判定します（デコードは行いません）。
+    SNIFF_HEADER_BYTES バイト（ファイルがそれより短い場合はファイル全体）を渡してください。
+    判定できない場合はNoneを返します。
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:3] == b"ID3":
+        return "mp3"
+    if header[4:8] == b"ftyp":
+        return "mp4"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if header[:16] == ASF_HEADER_GUID:
+        return "wma"
+    if header[:4] == b"\x00\x00\x01\xba":
+        return "mpeg"
+    if _is_mpeg_ts(header, 0, TS_PACKET_SIZE) or _is_mpeg_ts(header, 4, TS_PACKET_SIZE + 4):
+        return "mpegts"
+    # ID3タグのないMPEGオーディオ（フレーム同期ワード）
+    if len(header) >= 2 and header[0] == 0xFF and (header[1] & 0xE0) == 0xE0:
+        return "mp3"
+    return None
+
+
+class AudioChunk:
+    """
+    分割されたチャンクのファイルパスと、元音声における位置（チャンク番号・開始/終了秒）を保持します。
+    パスとして open() などにそのまま渡せます。
+    """
+    def __init__(self, path: Path, index: int, start: float, end: float):
+        self.path = Path(path)
+        self.index = index
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def __fspath__(self) -> str:
+        return str(self.path)
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+    def __repr__(self) -> str:
+        return f"AudioChunk({self.path.name}, index={self.index}, {self.start:.3f}-{self.end:.3f})"
+
+
+class LoadedAudio:
+    """
+    一度だけデコードした音声データとメタ情報（長さ・形式）を保持するハンドル。
+    検証・変換・長さ取得・分割はこのハンドルを共有し、再デコードを行いません。
+    """
+    def __init__(self, file_path: Path, audio: AudioSegment, format: str):
+        self.file_path = file_path
+        self.audio = audio
+        self.format = format
+        self.duration = len(audio) / 1000.0
+
+
+class PreparedAudio:
+    """
+    prepare_audio の結果です。プロセス間で受け渡すため、デコード済みの音声は含みません。
+    chunks が None の場合、分割は呼び出し側がストリーミングで行います（source から切り出します）。
+    無音を取り除いた場合、source は詰めた音声のファイル、duration はその長さで、
+    チャンクの位置も詰めた音声での秒数です。元の音声の時刻には remap で戻します。
+    """
+    def __init__(self, duration: float, plan: EncodingPlan, chunks: Optional[list[AudioChunk]], stage_seconds: dict,
+                 source: Optional[Path] = None, remap: Optional[TimeRemap] = None):
+        self.duration = duration
+        self.plan = plan
+        self.chunks = chunks
+        self.stage_seconds = stage_seconds
+        self.source = source
+        self.remap = remap
+
 
 class AudioProcessor:
     def __init__(self, output_dir: str = "processed_audio"):
@@ -11,6 +139,32 @@ class AudioProcessor:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.allowed_extensions = {".m4a", ".mp3", ".webm", ".mp4", ".mpga", ".wav", ".mpeg", ".wma"}
         self.max_file_size_mb = 500
+        # アップロードをディスクへ書き込む際のチャンクサイズ（バイト）
+        self.upload_chunk_size = 1024 * 1024
+        # Whisperへ送るチャンクのエンコード設定（音声認識に十分な16kHzモノラル・低ビットレート）
+        self.chunk_bitrate_kbps = int(os.getenv("OKOSHI_CHUNK_BITRATE_KBPS", "32"))
+        self.chunk_sample_rate = int(os.getenv("OKOSHI_CHUNK_SAMPLE_RATE", "16000"))
+        self.max_chunk_length = int(os.getenv("OKOSHI_MAX_CHUNK_SECONDS", "0")) or None
+        # 分割境界を探す範囲（秒）。目標の分割位置の手前この範囲で最も静かな位置で区切る
+        self.split_search_window = 30
+        # 受信しながら分割する場合のチャンクの長さ（秒）。最初の書き起こしが届くまでの時間の目安になる
+        self.progressive_chunk_length = int(os.getenv("OKOSHI_PROGRESSIVE_CHUNK_SECONDS", "300"))
+        # 文字起こしの前に長い無音（会見の待ち時間など）を取り除くか（OKOSHI_SILENCE_COMPACTION=true で有効）
+        # 非圧縮のWAV以外では、無音を探すために音声全体を1回デコードし、PCMの一時ファイルを書くため既定では無効にする
+        self.silence_compaction = os.getenv("OKOSHI_SILENCE_COMPACTION", "false").lower() not in ("0", "false", "no")
+        # この音量（dBFS、20msごとのRMS）未満がこの秒数以上続く区間を無音とみなし、前後に余白を残して取り除く
+        self.silence_threshold_db = float(os.getenv("OKOSHI_SILENCE_THRESHOLD_DB", "-45"))
+        self.min_silence_seconds = float(os.getenv("OKOSHI_SILENCE_MIN_SECONDS", "3"))
+        self.silence_padding_seconds = float(os.getenv("OKOSHI_SILENCE_PADDING_SECONDS", "0.5"))
+
+    def _work_dir(self, user: str, work_dir: Optional[Path] = None) -> Path:
+        """
+        ファイルの保存先を返します。ジョブの作業ディレクトリ（work_dir）が渡された場合はそこを、
+        そうでなければユーザーのサブディレクトリ（{output_dir}/{user}）を使います。
+        """
+        path = Path(work_dir) if work_dir is not None else self.output_dir / user
+        path.mkdir(parents=True, exist_ok=True)
+        return path
 
     # Ensure this method signature is exactly as follows:
     def save_original_file(self, file_content: bytes, original_filename: str, user: str) -> Path:
@@ -29,84 +183,755 @@ class AudioProcessor:
             f.write(file_content)
         return save_path
 
-    def validate_audio_file(self, file_path: Path) -> tuple[bool, str]:
+    async def save_upload_stream(self, upload, user: str, work_dir: Optional[Path] = None) -> tuple[Path, str]:
         """
-        音声ファイルの形式とサイズを検証します。
+        アップロードされたファイルを固定サイズのチャンクごとにユーザーのサブディレクトリへ書き込みます。
+        ファイル全体をメモリに読み込まないため、1アップロードあたりのメモリ使用量はチャンクサイズ程度に収まります。
+        サイズ上限は書き込みながら検査し、超えた時点で中断します。形式は先頭バイトから判定します。
+        work_dir が渡された場合は、ユーザーのサブディレクトリではなくそこへ保存します。
+        戻り値は (保存先のパス, ファイル内容のSHA-256) です。
+        """
+        user_dir = self._work_dir(user, work_dir)
+
+        original_filename = Path(upload.filename).name
+        file_extension = Path(original_filename).suffix.lower()
+        if file_extension not in self.allowed_extensions:
+            raise ValueError(f"許可されていないファイル形式です: {file_extension}")
+
+        max_bytes = self.max_file_size_mb * 1024 * 1024
+        save_path = user_dir / original_filename
+        # 書き込み途中のファイルを他の処理が拾わないよう、一時名で書いてから置き換える
+        partial_path = save_path.with_name(save_path.name + ".part")
+        written = 0
+        hasher = hashlib.sha256()
+        # 最初の読み出しが短くても形式を判定できるよう、先頭の SNIFF_HEADER_BYTES バイトがそろうまでためる
+        header = b""
+        try:
+            async with aiofiles.open(partial_path, "wb") as f:
+                while True:
+                    chunk = await upload.read(self.upload_chunk_size)
+                    if header is not None:
+                        header += chunk
+                        if chunk and len(header) < SNIFF_HEADER_BYTES:
+                            continue
+                        if header and sniff_audio_format(header[:SNIFF_HEADER_BYTES]) is None:
+                            raise ValueError("音声ファイルとして認識できない形式です。")
+                        chunk, header = header, None
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise FileTooLargeError(f"ファイルサイズが上限（{self.max_file_size_mb}MB）を超えています。")
+                    hasher.update(chunk)
+                    await f.write(chunk)
+            if written == 0:
+                raise ValueError("アップロードされたファイルの内容が空です。")
+            os.replace(partial_path, save_path)
+            BYTES_PROCESSED.inc(written, kind="upload")
+        finally:
+            if partial_path.exists():
+                os.remove(partial_path)
+        return save_path, hasher.hexdigest()
+
+    def inspect_audio(self, file_path: Path) -> tuple[Optional[AudioProbe], str]:
+        """
+        音声ファイルのサイズとヘッダ（形式・長さなど）を検証します。デコードは行わないため、
+        壊れたファイルや音声でないファイルはサイズに関係なく数十ミリ秒で弾かれます。
+        検証に失敗した場合は (None, エラーメッセージ) を返します。
         """
         if not file_path.is_file():
-            return False, "ファイルが見つかりません。"
+            return None, "ファイルが見つかりません。"
         
         file_size_mb = file_path.stat().st_size / (1024 * 1024)
         if file_size_mb > self.max_file_size_mb:
-            return False, f"ファイルサイズが上限（{self.max_file_size_mb}MB）を超えています。"
-        
+            return None, f"ファイルサイズが上限（{self.max_file_size_mb}MB）を超えています。"
+
+        try:
+            probe = probe_audio(file_path)
+        except ProbeError as e:
+            return None, f"オーディオファイルを読み取れませんでした。ファイル形式が不正であるか、破損している可能性があります。エラー: {e}"
+        except Exception as e:
+            return None, f"不明なエラーによりファイルの検証に失敗しました: {e}"
+        if not probe.trusted:
+            logger.info(
+                "audio header is not trusted; full decode required",
+                extra={"event": "probe_untrusted", "source": str(file_path), "reason": probe.untrusted_reason},
+            )
+        return probe, "ファイルは有効です。"
+
+    def load_audio(self, file_path: Path, probe: Optional[AudioProbe] = None) -> tuple[Optional[LoadedAudio], str]:
+        """
+        音声ファイルを検証し、一度だけデコードしてハンドルを返します。
+        ヘッダの検証（inspect_audio）を先に行い、通過したファイルだけをデコードします。
+        検証済みの probe が渡された場合はヘッダの検証を省略します。
+        検証に失敗した場合は (None, エラーメッセージ) を返します。
+        """
+        if probe is None:
+            probe, message = self.inspect_audio(file_path)
+            if probe is None:
+                return None, message
+
         try:
             audio = AudioSegment.from_file(file_path)
-            return True, "ファイルは有効です。"
         except CouldntDecodeError as e:
             # Specific error for pydub's inability to decode (often due to ffmpeg errors)
-            return False, f"オーディオファイルをデコードできませんでした。ファイル形式が不正であるか、破損している可能性があります。FFmpegのエラー: {e}"
+            return None, f"オーディオファイルをデコードできませんでした。ファイル形式が不正であるか、破損している可能性があります。FFmpegのエラー: {e}"
         except Exception as e:
-            return False, f"不明なエラーによりファイルの検証に失敗しました: {e}"
+            return None, f"不明なエラーによりファイルの検証に失敗しました: {e}"
+
+        # コンテナ形式はヘッダの情報から取得（デコードは行わない）
+        audio_format = probe.format_name or file_path.suffix.lower().lstrip(".")
+
+        return LoadedAudio(file_path, audio, audio_format), "ファイルは有効です。"
+
+    def prepare_audio(self, file_path: Path, user: str, stream_split: bool = False, work_dir: Optional[Path] = None) -> PreparedAudio:
+        """
+        検証・長さ取得・エンコード計画・MP3変換・分割をまとめて行います。
+        検証と長さの取得はヘッダだけで行い、ヘッダを信用できない場合に限って全体をデコードします。
+        デコード済みの音声はこの中だけで使うため、プロセスプールのワーカーで実行できます。
+        ヘッダを信用できて分割が必要な場合、チャンクは元ファイルからffmpegで直接切り出します。
+        stream_split が真の場合はその切り出しも行わずに chunks=None を返します（呼び出し側が PreparedAudio.source を
+        split_audio_streaming で分割し、チャンクごとのエンコードをプロセスプールに投入します）。
+        silence_compaction が有効な場合は、最初に compact_silence で長い無音を取り除き、以降の処理は詰めた音声に対して行います。
+        分割したチャンクは work_dir（省略時はユーザーのサブディレクトリ）の split_files/ に保存されます。
+        検証に失敗した場合は AudioValidationError を送出します。
+        """
+        stage_seconds = {}
+        stage_start = time.perf_counter()
+        probe, message = self.inspect_audio(file_path)
+        if probe is None:
+            raise AudioValidationError(message)
+        stage_seconds["probe"] = time.perf_counter() - stage_start
+
+        remap = None
+        if self.silence_compaction:
+            stage_start = time.perf_counter()
+            compacted = self.compact_silence(file_path, work_dir=work_dir)
+            stage_seconds["compact"] = time.perf_counter() - stage_start
+            if compacted is not None:
+                # 詰めた音声はヘッダの長さがサンプル数と一致するPCMのWAVのため、デコードによる検証は不要
+                file_path, remap = compacted
+                probe = probe_audio(file_path)
+
+        loaded = None
+        if not probe.trusted:
+            stage_start = time.perf_counter()
+            loaded, message = self.load_audio(file_path, probe=probe)
+            stage_seconds["validate"] = time.perf_counter() - stage_start
+            if loaded is None:
+                raise AudioValidationError(message)
+
+        duration = loaded.duration if loaded is not None else probe.duration
+        plan = self.plan_encoding(duration)
+        # 非圧縮のWAVは1チャンクに収まる場合も split_audio_streaming でサンプルを直接エンコードし、ファイル全体のMP3変換を省く
+        if loaded is None and (plan.chunk_count > 1 or read_wav_format(file_path) is not None):
+            if stream_split:
+                return PreparedAudio(duration, plan, None, stage_seconds, source=file_path, remap=remap)
+            stage_start = time.perf_counter()
+            chunks = list(self.split_audio_streaming(file_path, user=user, plan=plan, duration=duration, work_dir=work_dir))
+            stage_seconds["split"] = time.perf_counter() - stage_start
+            return PreparedAudio(duration, plan, chunks, stage_seconds, source=file_path, remap=remap)
+
+        stage_start = time.perf_counter()
+        converted_path = self.convert_to_mp3_if_needed(file_path, loaded=loaded, plan=plan if plan.chunk_count == 1 else None)
+        stage_seconds["convert"] = time.perf_counter() - stage_start
+        if plan.chunk_count > 1:
+            stage_start = time.perf_counter()
+            chunks = self.split_audio(converted_path, user=user, loaded=loaded, plan=plan, work_dir=work_dir)
+            stage_seconds["split"] = time.perf_counter() - stage_start
+        else:
+            chunks = [AudioChunk(converted_path, 0, 0.0, duration)]
+        return PreparedAudio(duration, plan, chunks, stage_seconds, source=converted_path, remap=remap)
+
+    def compact_silence(self, file_path: Path, work_dir: Optional[Path] = None) -> Optional[tuple[Path, TimeRemap]]:
+        """
+        長い無音（OKOSHI_SILENCE_MIN_SECONDS 秒以上続く OKOSHI_SILENCE_THRESHOLD_DB 未満の区間）を取り除いた音声を
+        {元の名前}_compact.wav として保存し、(保存先のパス, 元の音声の時刻に戻す対応表) を返します。
+        取り除く区間がない場合は何も保存せずに None を返します。
+
+        非圧縮のWAVはメモリマップしてサンプルを直接解析し、残す区間を同じ形式のままつなぎます（デコードしません）。
+        それ以外は、ffmpegで1回だけチャンクと同じサンプルレートのモノラルPCMにデコードし、一時ファイルに書き出しながら
+        解析します。いずれも20msごとのエネルギーをNumPyでまとめて計算し、メモリ使用量は音声の長さに依存しません。
+        デコードできない場合は AudioValidationError を送出します。
+        """
+        output_dir = Path(work_dir) if work_dir is not None else file_path.parent
+        output_path = output_dir / f"{file_path.stem}_compact.wav"
+        wav = open_pcm_wav(file_path)
+        if wav is not None:
+            with wav:
+                return self._compact_pcm_wav(wav, output_path)
+
+        sample_rate = self.chunk_sample_rate
+        frame_len = sample_rate * FRAME_MS // 1000
+        # フレームの境界で区切って読むため、ブロックはフレーム長の倍数にする（約10秒）
+        block_bytes = frame_len * 500 * 2
+
+        with tempfile.TemporaryFile() as errors, tempfile.NamedTemporaryFile(dir=output_dir, suffix=".pcm") as raw:
+            decoder = subprocess.Popen(
+                [
+                    AudioSegment.converter, "-nostdin", "-v", "error", "-i", str(file_path),
+                    "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+                ],
+                stdout=subprocess.PIPE, stderr=errors,
+            )
+            energies = []
+            total_bytes = 0
+            try:
+                while True:
+                    data = decoder.stdout.read(block_bytes)
+                    if not data:
+                        break
+                    raw.write(data)
+                    total_bytes += len(data)
+                    energies.append(frame_energies(np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16), sample_rate))
+                returncode = decoder.wait()
+            finally:
+                if decoder.poll() is None:
+                    decoder.kill()
+                    decoder.wait()
+            if returncode != 0:
+                errors.seek(0)
+                message = errors.read().decode(errors="ignore").strip()
+                raise AudioValidationError(f"オーディオファイルを読み取れませんでした。ファイル形式が不正であるか、破損している可能性があります。エラー: {message}")
+            total_samples = total_bytes // 2
+            if total_samples == 0:
+                raise AudioValidationError("音声が含まれていません。")
+
+            regions = self._speech_regions(np.concatenate(energies), sample_rate, total_samples, full_scale=32768.0)
+            if regions is None:
+                return None
+
+            raw.flush()
+            samples = np.memmap(raw.name, dtype=np.int16, mode="r", shape=(total_samples,))
+            try:
+                with wave.open(str(output_path), "wb") as f:
+                    f.setnchannels(1)
+                    f.setsampwidth(2)
+                    f.setframerate(sample_rate)
+                    for start, end in regions:
+                        for position in range(start, end, block_bytes // 2):
+                            f.writeframes(samples[position:min(end, position + block_bytes // 2)].tobytes())
+            finally:
+                del samples
+
+        return output_path, self._compaction_remap(file_path, output_path, regions, sample_rate, total_samples)
+
+    def _compact_pcm_wav(self, wav: PcmWav, output_path: Path) -> Optional[tuple[Path, TimeRemap]]:
+        """
+        非圧縮のWAVの無音を取り除きます（compact_silence の高速経路）。エネルギーはチャンネルごとに求めて
+        最も大きい値を使うため、片方のチャンネルにだけ話し声がある録音でも話し声を取り除きません。
+        """
+        sample_rate = wav.sample_rate
+        frame_len = sample_rate * FRAME_MS // 1000
+        block_frames = frame_len * 500
+        energies = []
+        for start in range(0, wav.frame_count, block_frames):
+            end = min(wav.frame_count, start + block_frames)
+            block = wav.samples(start, end)
+            energies.append(np.max([frame_energies(block[:, channel], sample_rate) for channel in range(wav.channels)], axis=0))
+            del block
+            wav.release(start, end)
+
+        regions = self._speech_regions(np.concatenate(energies), sample_rate, wav.frame_count, full_scale=wav.format.full_scale)
+        if regions is None:
+            return None
+        write_pcm_wav(output_path, wav, regions)
+        return output_path, self._compaction_remap(wav.file_path, output_path, regions, sample_rate, wav.frame_count)
+
+    def _speech_regions(self, energies: np.ndarray, sample_rate: int, total_samples: int, full_scale: float) -> Optional[list[tuple[int, int]]]:
+        """
+        フレームごとのエネルギーから残す区間を求めます。取り除く区間がない場合（全体が無音の場合も）は None を返します。
+        """
+        frames_per_second = 1000 / FRAME_MS
+        regions = speech_regions(
+            energies,
+            sample_rate * FRAME_MS // 1000,
+            total_samples,
+            threshold=full_scale * 10 ** (self.silence_threshold_db / 20),
+            min_silence_frames=int(self.min_silence_seconds * frames_per_second),
+            padding_frames=int(self.silence_padding_seconds * frames_per_second),
+        )
+        # 全体が無音の場合も取り除かず、そのまま文字起こしする
+        if not regions or regions == [(0, total_samples)]:
+            return None
+        return regions
+
+    @staticmethod
+    def _compaction_remap(file_path: Path, output_path: Path, regions: list[tuple[int, int]], sample_rate: int, total_samples: int) -> TimeRemap:
+        remap = TimeRemap.from_regions(regions, sample_rate, total_samples)
+        logger.info(
+            "silence removed",
+            extra={"event": "silence_compacted", "source": str(file_path), "output": str(output_path), **remap.summary()},
+        )
+        return remap
+
+    def validate_audio_file(self, file_path: Path) -> tuple[bool, str]:
+        """
+        音声ファイルの形式とサイズを検証します。
+        ヘッダを信用できる場合はヘッダの検証だけで済ませ、信用できない場合に限って全体をデコードします。
+        後続の処理でも音声を使う場合は load_audio を使用してください。
+        """
+        probe, message = self.inspect_audio(file_path)
+        if probe is None or probe.trusted:
+            return probe is not None, message
+        loaded, message = self.load_audio(file_path, probe=probe)
+        return loaded is not None, message
 
-    def get_audio_duration(self, file_path: Path) -> float:
+    def get_audio_duration(self, file_path: Path, loaded: Optional[LoadedAudio] = None) -> float:
         """
         音声ファイルの長さを秒単位で取得します。
+        ハンドルが渡された場合はデコード済みの長さを、そうでなければ信用できるヘッダの長さを返します。
+        ヘッダを信用できない場合だけ全体をデコードします。
         """
+        if loaded is not None:
+            return loaded.duration
+        try:
+            probe = probe_audio(file_path)
+            if probe.trusted:
+                return probe.duration
+        except ProbeError as e:
+            raise ValueError(f"音声の長さを取得できませんでした: {e}")
         try:
             audio = AudioSegment.from_file(file_path)
             return len(audio) / 1000.0
         except Exception as e:
             raise ValueError(f"音声の長さを取得できませんでした: {e}")
 
-    def split_audio(self, file_path: Path, user: str, segment_length: int = 600) -> list[Path]:
+    def plan_encoding(self, duration: float) -> EncodingPlan:
         """
-        音声ファイルを指定された秒数で分割し、分割されたファイルのパスリストを返します。
-        分割されたファイルは /processed_audio/{user}/split_files/ に保存されます。
+        音声の長さから、Whisperのサイズ上限（25MB）に収まる最少のチャンク数とエンコード設定を計画します。
+        """
+        return plan_chunk_encoding(
+            duration,
+            bitrate_kbps=self.chunk_bitrate_kbps,
+            sample_rate=self.chunk_sample_rate,
+            search_window=self.split_search_window,
+            max_chunk_length=self.max_chunk_length,
+        )
+
+    def plan_progressive_encoding(self) -> EncodingPlan:
+        """
+        長さがまだ分からない（受信中の）音声の分割を計画します。チャンクの長さは progressive_chunk_length 秒
+        （OKOSHI_MAX_CHUNK_SECONDS とサイズ上限に収まる範囲）に固定し、チャンク数は分割しながら決まるため 0 とします。
+        """
+        chunk_length = min(self.progressive_chunk_length, self.max_chunk_length or self.progressive_chunk_length)
+        plan = plan_chunk_encoding(
+            chunk_length,
+            bitrate_kbps=self.chunk_bitrate_kbps,
+            sample_rate=self.chunk_sample_rate,
+            search_window=self.split_search_window,
+            max_chunk_length=chunk_length,
+        )
+        plan.chunk_count = 0
+        return plan
+
+    @staticmethod
+    def _check_chunk_size(output_path: Path, plan: Optional[EncodingPlan]):
+        if plan is not None and output_path.stat().st_size > plan.max_bytes:
+            raise Exception(
+                f"チャンクのサイズがWhisperの上限（{plan.max_bytes // (1024 * 1024)}MB）を超えました: {output_path.name}"
+            )
+
+    def split_audio(self, file_path: Path, user: str, segment_length: int = 600, loaded: Optional[LoadedAudio] = None, plan: Optional[EncodingPlan] = None, work_dir: Optional[Path] = None) -> list[AudioChunk]:
+        """
+        音声ファイルを指定された秒数以内で分割し、分割されたチャンクのリストを返します。
+        planが渡された場合は、その分割長とエンコード設定を使用します。
+        分割位置は各目標位置の手前で最も静かな箇所が選ばれ、各チャンクは元音声での開始/終了位置を保持します。
+        分割されたファイルは /processed_audio/{user}/split_files/（work_dir が渡された場合は {work_dir}/split_files/）に保存されます。
+        ハンドルが渡された場合はデコード済みの音声を再利用します。
         """
         try:
-            audio = AudioSegment.from_file(file_path)
-            total_length_ms = len(audio)
-            segment_length_ms = segment_length * 1000
+            audio = loaded.audio if loaded is not None else AudioSegment.from_file(file_path)
+            if plan is not None:
+                segment_length = plan.chunk_length
+            export_parameters = plan.export_parameters() if plan is not None else {"format": "mp3"}
             
             # ユーザー別のsplit_filesディレクトリを作成
-            user_split_dir = self.output_dir / user / "split_files"
+            user_split_dir = self._work_dir(user, work_dir) / "split_files"
             user_split_dir.mkdir(parents=True, exist_ok=True)
             
             split_files = []
             file_stem = file_path.stem
             file_extension = ".mp3"
 
-            for i, start_ms in enumerate(range(0, total_length_ms, segment_length_ms)):
-                end_ms = min(start_ms + segment_length_ms, total_length_ms)
+            split_points = iter_split_points(
+                len(audio), segment_length * 1000, self.split_search_window * 1000,
+                lambda start_ms, length_ms: self._segment_samples(audio[start_ms:start_ms + length_ms])
+            )
+            for i, (start_ms, end_ms) in enumerate(split_points):
                 segment = audio[start_ms:end_ms]
                 
                 output_segment_path = user_split_dir / f"{file_stem}_part_{i:03d}{file_extension}"
-                segment.export(output_segment_path, format="mp3")
-                split_files.append(output_segment_path)
+                segment.export(output_segment_path, **export_parameters)
+                self._check_chunk_size(output_segment_path, plan)
+                split_files.append(AudioChunk(output_segment_path, i, start_ms / 1000.0, end_ms / 1000.0))
             
             return split_files
         except Exception as e:
             raise Exception(f"音声ファイルの分割中にエラーが発生しました: {e}")
 
-    def convert_to_mp3_if_needed(self, file_path: Path) -> Path:
+    @staticmethod
+    def _segment_samples(segment: AudioSegment) -> tuple[np.ndarray, int]:
+        """
+        AudioSegmentの先頭チャンネルのサンプル列とサンプルレートを返します（境界探索用）。
+        """
+        dtype = {1: np.int8, 2: np.int16, 4: np.int32}[segment.sample_width]
+        samples = np.frombuffer(segment.raw_data, dtype=dtype)
+        return samples[::segment.channels], segment.frame_rate
+
+    def _read_pcm_window(self, file_path: Path, start_ms: int, length_ms: int, sample_rate: int = 8000) -> tuple[np.ndarray, int]:
+        """
+        ffmpegで指定区間だけをモノラル・低サンプルレートのPCMとして読み出します（境界探索用）。
+        """
+        command = [
+            AudioSegment.converter, "-nostdin", "-v", "error",
+            "-ss", f"{start_ms / 1000:.3f}", "-t", f"{length_ms / 1000:.3f}",
+            "-i", str(file_path),
+            "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+        ]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            return np.zeros(0, dtype=np.int16), sample_rate
+        return np.frombuffer(completed.stdout, dtype=np.int16), sample_rate
+
+    def probe_duration(self, file_path: Path) -> float:
+        """
+        ヘッダから音声の長さ（秒）を取得します。デコードは行いません。
+        """
+        try:
+            return probe_audio(file_path).duration
+        except Exception as e:
+            raise ValueError(f"音声の長さを取得できませんでした: {e}")
+
+    def _encode_segment(self, file_path: Path, start_sec: float, length_sec: float, output_path: Path, plan: Optional[EncodingPlan] = None) -> Path:
+        """
+        ffmpegで指定区間だけをシークして読み出し、MP3にエンコードします。
+        """
+        output_arguments = plan.ffmpeg_arguments() if plan is not None else ["-f", "mp3"]
+        command = [
+            AudioSegment.converter, "-nostdin", "-v", "error", "-y",
+            "-ss", f"{start_sec:.3f}", "-t", f"{length_sec:.3f}",
+            "-i", str(file_path),
+            "-vn", *output_arguments, str(output_path),
+        ]
+        with time_stage("encode_chunk", file=output_path.name, audio_seconds=round(length_sec, 3)) as fields:
+            completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if completed.returncode != 0:
+                raise Exception(f"FFmpegのエラー: {completed.stderr.decode(errors='ignore').strip()}")
+            fields["bytes"] = output_path.stat().st_size
+        self._check_chunk_size(output_path, plan)
+        return output_path
+
+    def _transcode(self, file_path: Path, output_path: Path, plan: Optional[EncodingPlan] = None) -> Path:
+        """
+        ffmpegでファイル全体をMP3にエンコードします（PCM全体をメモリに載せません）。
+        """
+        output_arguments = plan.ffmpeg_arguments() if plan is not None else ["-f", "mp3"]
+        command = [
+            AudioSegment.converter, "-nostdin", "-v", "error", "-y",
+            "-i", str(file_path), "-vn", *output_arguments, str(output_path),
+        ]
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if completed.returncode != 0:
+            raise Exception(f"FFmpegのエラー: {completed.stderr.decode(errors='ignore').strip()}")
+        return output_path
+
+    def split_audio_streaming(self, file_path: Path, user: str, segment_length: int = 600, max_workers: Optional[int] = None, plan: Optional[EncodingPlan] = None, duration: Optional[float] = None, work_dir: Optional[Path] = None,
+                              submit: Optional[Callable[..., Future]] = None) -> Iterator[AudioChunk]:
+        """
+        音声ファイルをPCM全体をメモリに載せずに分割し、完成したチャンクを先頭から順に返すジェネレータです。
+        各チャンクはffmpegが該当区間だけをシークしてエンコードするため、メモリ使用量は音声の長さに依存しません。
+        分割位置は split_audio と同様に、目標位置の手前の最も静かな箇所が選ばれます。
+        エンコードは submit(関数, *引数)（Future を返す）で投入します。省略時はこの中で最大max_workers個
+        （既定: CPUコア数）のffmpegプロセスで並列に行います。APIサーバ・ワーカーでは AudioWorkPool.submit_threadsafe を渡し、
+        すべてのジョブのエンコードをプロセスプールの上限に従わせます（max_workers にはプールのワーカー数を渡します）。
+        planが渡された場合は、その分割長とエンコード設定を使用します。
+        長さ（duration）が渡されなかった場合はヘッダから取得します。
+        チャンクは split_audio と同じディレクトリ（work_dir 省略時はユーザーのサブディレクトリ）に保存されます。
+        非圧縮のWAVは _split_pcm_wav でメモリマップしたサンプルを直接エンコードします。
+        """
+        if plan is not None:
+            segment_length = plan.chunk_length
+
+        user_split_dir = self._work_dir(user, work_dir) / "split_files"
+        user_split_dir.mkdir(parents=True, exist_ok=True)
+        max_workers = max_workers or os.cpu_count() or 1
+
+        wav = open_pcm_wav(file_path)
+        if wav is not None:
+            with wav:
+                yield from self._split_pcm_wav(wav, user_split_dir / file_path.stem, segment_length, plan, max_workers, submit)
+            return
+
+        if duration is None:
+            duration = self.probe_duration(file_path)
+
+        split_points = iter_split_points(
+            int(duration * 1000), segment_length * 1000, self.split_search_window * 1000,
+            lambda start_ms, length_ms: self._read_pcm_window(file_path, start_ms, length_ms)
+        )
+
+        def encode_tasks():
+            for index, (start_ms, end_ms) in enumerate(split_points):
+                output_segment_path = user_split_dir / f"{file_path.stem}_part_{index:03d}.mp3"
+                yield (
+                    AudioChunk(output_segment_path, index, start_ms / 1000.0, end_ms / 1000.0),
+                    self._encode_segment, (file_path, start_ms / 1000.0, (end_ms - start_ms) / 1000.0, output_segment_path, plan),
+                )
+
+        yield from self._run_encode_tasks(encode_tasks(), max_workers, submit)
+
+    def _run_encode_tasks(self, tasks, max_workers: int, submit: Optional[Callable[..., Future]] = None) -> Iterator[AudioChunk]:
+        """
+        (チャンク, エンコード関数, 引数) を順に投入し、エンコードし終えたチャンクを先頭から順に返します。
+        先読みは max_workers の2倍までに制限し、未消費のチャンクが溜まりすぎないようにします。
+        """
+        executor = None
+        if submit is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            submit = executor.submit
+        pending = []
+        try:
+            for chunk, encode, args in tasks:
+                pending.append((chunk, submit(encode, *args)))
+                while len(pending) >= max_workers * 2:
+                    yield self._wait_chunk(*pending.pop(0))
+            while pending:
+                yield self._wait_chunk(*pending.pop(0))
+        finally:
+            # 途中で中断された場合は未着手のエンコードを取り消す
+            for _, future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _split_pcm_wav(self, wav: PcmWav, output_stem: Path, segment_length: int, plan: Optional[EncodingPlan], max_workers: int,
+                       submit: Optional[Callable[..., Future]] = None) -> Iterator[AudioChunk]:
+        """
+        非圧縮のWAVを分割するジェネレータです（split_audio_streaming の高速経路）。
+        分割位置の探索はメモリマップしたサンプルを直接解析し（ffmpegを起動しません）、各チャンクは _encode_wav_frames で
+        フレームの範囲を複製せずにffmpegの標準入力へ渡してエンコードします。読み終えた範囲はプロセスのメモリから外すため、
+        メモリ使用量はファイルの大きさに依存しません。チャンクの開始/終了秒はフレーム番号から求めるため、元のファイルと正確に一致します。
+        """
+        sample_rate = wav.sample_rate
+        total_ms = wav.frame_count * 1000 // sample_rate
+
+        def read_window(start_ms: int, length_ms: int) -> tuple[np.ndarray, int]:
+            # 先頭チャンネルだけを複製し、読んだ範囲はすぐにプロセスのメモリから外す
+            # （外さないと、分割位置ごとに探索範囲のページが残り、メモリ使用量がチャンク数に比例して増える）
+            start = start_ms * sample_rate // 1000
+            end = start + length_ms * sample_rate // 1000
+            samples = wav.samples(start, end)[:, 0].copy()
+            wav.release(start, end)
+            return samples, sample_rate
+
+        def encode_tasks():
+            split_points = iter_split_points(total_ms, segment_length * 1000, self.split_search_window * 1000, read_window)
+            for index, (start_ms, end_ms) in enumerate(split_points):
+                start = start_ms * sample_rate // 1000
+                end = end_ms * sample_rate // 1000 if end_ms < total_ms else wav.frame_count
+                output_segment_path = output_stem.with_name(f"{output_stem.name}_part_{index:03d}.mp3")
+                yield (
+                    AudioChunk(output_segment_path, index, start / sample_rate, end / sample_rate),
+                    self._encode_wav_frames, (wav.file_path, start, end, output_segment_path, plan),
+                )
+
+        yield from self._run_encode_tasks(encode_tasks(), max_workers, submit)
+
+    def _encode_wav_frames(self, file_path: Path, start: int, end: int, output_path: Path, plan: Optional[EncodingPlan]) -> Path:
+        """
+        非圧縮のWAVのフレームの範囲を、メモリマップから少しずつffmpegへ渡してMP3にエンコードします。
+        渡し終えたブロックはすぐにプロセスのメモリから外すため、チャンクが長くてもメモリ使用量は増えません。
+        プロセスプールで実行できるよう、ファイルはパスで受け取ってこの中でメモリマップします。
+        """
+        wav = open_pcm_wav(file_path)
+        if wav is None:
+            raise Exception(f"非圧縮のWAVとして読み取れませんでした: {file_path.name}")
+        with wav:
+            return self._encode_pcm(
+                wav.iter_frames(start, end), wav.sample_rate, output_path, plan,
+                input_arguments=wav.format.ffmpeg_input_arguments(), audio_seconds=(end - start) / wav.sample_rate,
+            )
+
+    def split_audio_progressive(self, reader, user: str, plan: EncodingPlan, stem: str, work_dir: Optional[Path] = None,
+                                submit: Optional[Callable[..., Future]] = None) -> Iterator[AudioChunk]:
+        """
+        先頭から順に届く音声（受信中のアップロードなど）を、届いた分から分割して返すジェネレータです。
+        reader は read(n) が届くまで待ってからバイト列を返し、終端で b"" を返すファイル風のオブジェクトです。
+        ffmpegで1回だけモノラルのPCMにデコードし、plan.chunk_length 秒たまるごとに、その手前
+        split_search_window 秒の範囲で最も静かな位置で区切ってMP3にエンコードします。
+        メモリに保持するのは1チャンク分のPCMだけで、チャンクの開始/終了秒はサンプル数から求めます。
+        plan.duration はデコードできた長さに随時更新し（全体の長さの見積もりに使えます）、
+        最後まで読み終えると plan.chunk_count を実際のチャンク数に更新します。
+        デコードできない場合は AudioValidationError を送出します。
+        submit（AudioWorkPool.submit_threadsafe など）が渡された場合、チャンクのエンコードはそれで実行し、
+        同時に動くffmpegの数を他の分割と同じ上限に収めます（チャンクのPCMはプロセスへ渡されます）。
+        """
+        sample_rate = plan.sample_rate
+        bytes_per_second = sample_rate * 2
+        target_bytes = plan.chunk_length * bytes_per_second
+        window_bytes = min(self.split_search_window, plan.chunk_length // 2) * bytes_per_second
+        split_dir = self._work_dir(user, work_dir) / "split_files"
+        split_dir.mkdir(parents=True, exist_ok=True)
+
+        errors = tempfile.TemporaryFile()
+        decoder = subprocess.Popen(
+            [
+                AudioSegment.converter, "-v", "error", "-i", "pipe:0",
+                "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors,
+        )
+        feed_errors = []
+
+        def feed():
+            # 届いた分からffmpegに渡す。ffmpegが先に終了した（デコードできない）場合は書き込みをやめる
+            try:
+                while True:
+                    data = reader.read(self.upload_chunk_size)
+                    if not data:
+                        break
+                    decoder.stdin.write(data)
+            except BrokenPipeError:
+                pass
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                try:
+                    decoder.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        buffer = bytearray()
+        start_bytes = 0
+        index = 0
+
+        def emit(length: int) -> AudioChunk:
+            nonlocal start_bytes, index
+            output_path = split_dir / f"{stem}_part_{index:03d}.mp3"
+            chunk = AudioChunk(output_path, index, start_bytes / bytes_per_second, (start_bytes + length) / bytes_per_second)
+            if submit is None:
+                self._encode_pcm(bytes(buffer[:length]), sample_rate, output_path, plan)
+            else:
+                self._wait_chunk(chunk, submit(self._encode_pcm, bytes(buffer[:length]), sample_rate, output_path, plan))
+            del buffer[:length]
+            start_bytes += length
+            index += 1
+            return chunk
+
+        try:
+            while True:
+                data = decoder.stdout.read(self.upload_chunk_size)
+                if not data:
+                    break
+                buffer.extend(data)
+                plan.duration = (start_bytes + len(buffer)) / bytes_per_second
+                while len(buffer) >= target_bytes:
+                    window_start = target_bytes - window_bytes
+                    samples = np.frombuffer(bytes(buffer[window_start:target_bytes]), dtype=np.int16)
+                    cut = window_start + quietest_offset_ms(samples, sample_rate) * bytes_per_second // 1000
+                    yield emit(max(2, min(target_bytes, cut - cut % 2)))
+            returncode = decoder.wait()
+            feeder.join()
+            if feed_errors:
+                raise feed_errors[0]
+            if returncode != 0:
+                errors.seek(0)
+                message = errors.read().decode(errors="ignore").strip()
+                if index == 0:
+                    raise AudioValidationError(f"オーディオファイルを読み取れませんでした。ファイル形式が不正であるか、破損している可能性があります。エラー: {message}")
+                raise Exception(f"FFmpegのエラー: {message}")
+            if buffer:
+                yield emit(len(buffer) - len(buffer) % 2)
+            if index == 0:
+                raise AudioValidationError("音声が含まれていません。")
+            plan.duration = start_bytes / bytes_per_second
+            plan.chunk_count = index
+        finally:
+            if decoder.poll() is None:
+                decoder.kill()
+                decoder.wait()
+            errors.close()
+
+    def _encode_pcm(self, pcm, sample_rate: int, output_path: Path, plan: Optional[EncodingPlan],
+                    input_arguments: Optional[list[str]] = None, audio_seconds: Optional[float] = None) -> Path:
+        """
+        PCMをMP3にエンコードします。既定ではモノラル16bitとして扱い、input_arguments（ffmpegの入力オプション）を
+        渡した場合はその形式として扱います。pcm はバイト列（memoryview でもかまいません）か、
+        ffmpegへ順に書き込むバイト列のイテラブルです（イテラブルの場合は audio_seconds を指定してください）。
+        """
+        input_arguments = input_arguments or ["-f", "s16le", "-ar", str(sample_rate), "-ac", "1"]
+        output_arguments = plan.ffmpeg_arguments() if plan is not None else ["-f", "mp3"]
+        if isinstance(pcm, (bytes, bytearray, memoryview)):
+            if audio_seconds is None:
+                audio_seconds = len(pcm) / (sample_rate * 2)
+            pcm = [pcm]
+        command = [
+            AudioSegment.converter, "-v", "error", "-y",
+            *input_arguments, "-i", "pipe:0",
+            *output_arguments, str(output_path),
+        ]
+        with time_stage("encode_chunk", file=output_path.name, audio_seconds=round(audio_seconds, 3)) as fields, \
+                tempfile.TemporaryFile() as stderr:
+            # 標準エラーは一時ファイルに受け、書き込み中にパイプが詰まらないようにする
+            encoder = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            try:
+                for block in pcm:
+                    encoder.stdin.write(block)
+            except BrokenPipeError:
+                # ffmpegが途中で終了した場合は、終了コードと標準エラーで原因を報告する
+                pass
+            finally:
+                try:
+                    encoder.stdin.close()
+                except BrokenPipeError:
+                    pass
+                returncode = encoder.wait()
+            if returncode != 0:
+                stderr.seek(0)
+                raise Exception(f"FFmpegのエラー: {stderr.read().decode(errors='ignore').strip()}")
+            fields["bytes"] = output_path.stat().st_size
+        self._check_chunk_size(output_path, plan)
+        return output_path
+
+    @staticmethod
+    def _wait_chunk(chunk: AudioChunk, future) -> AudioChunk:
+        try:
+            future.result()
+            return chunk
+        except Exception as e:
+            raise Exception(f"音声ファイルの分割中にエラーが発生しました: {e}")
+
+    def convert_to_mp3_if_needed(self, file_path: Path, loaded: Optional[LoadedAudio] = None, plan: Optional[EncodingPlan] = None) -> Path:
         """
         指定されたファイルがMP3でない場合、MP3に変換します。
         変換されたファイルのパスを返します。
+        ハンドルが渡された場合はデコード済みの音声をエンコードし、ハンドルのパスと形式を更新します。
+        ハンドルがない場合は、音声全体をメモリに載せずにffmpegで直接変換します。
+        planが渡された場合はそのエンコード設定を使用し、MP3でもサイズ上限を超える場合は再エンコードします。
         """
-        print(f"ファイルをMP3に変換します convert_to_mp3_if_needed: {file_path}")
         file_extension = file_path.suffix.lower()
         if file_extension == ".mp3":
-            print(f"ファイルは既にMP3形式です: {file_path}")
-            return file_path
-        
-        output_mp3_path = file_path.with_suffix(".mp3")
+            if plan is None or file_path.stat().st_size <= plan.max_bytes:
+                return file_path
+            output_mp3_path = file_path.with_name(f"{file_path.stem}_speech.mp3")
+        else:
+            output_mp3_path = file_path.with_suffix(".mp3")
+
+        export_parameters = plan.export_parameters() if plan is not None else {"format": "mp3"}
         try:
-            print(f"MP3に変換中: {file_path} -> {output_mp3_path}")
-            audio = AudioSegment.from_file(file_path)
-            audio.export(output_mp3_path, format="mp3")
-            print("変換成功。元のファイルを削除します。")
+            if loaded is not None:
+                loaded.audio.export(output_mp3_path, **export_parameters)
+            else:
+                self._transcode(file_path, output_mp3_path, plan)
+            self._check_chunk_size(output_mp3_path, plan)
+            logger.info("converted to mp3", extra={"event": "converted", "source": str(file_path), "output": str(output_mp3_path)})
             os.remove(file_path)
+            if loaded is not None:
+                loaded.file_path = output_mp3_path
+                loaded.format = "mp3"
             return output_mp3_path
         except CouldntDecodeError as e:
             # Specific error for pydub's inability to decode during conversion
@@ -118,12 +943,11 @@ class AudioProcessor:
         """
         一時ファイルをクリーンアップします。
         """
-        for f_path in file_paths:
+        for f_path in map(Path, file_paths):
             if f_path.is_file():
                 try:
                     if keep_original and "processed_audio" in str(f_path) and not "_part_" in str(f_path):
                         continue
                     os.remove(f_path)
-                    print(f"クリーンアップ: {f_path}")
                 except Exception as e:
-                    print(f"クリーンアップ失敗: {f_path} - {e}")
\ No newline at end of file
+                    logger.warning("failed to remove temp file", extra={"event": "cleanup_failed", "file": str(f_path), "error": str(e)})
\ No newline at end of file
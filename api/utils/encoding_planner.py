@@ -0,0 +1,95 @@
+import math
+
+# Whisper APIが受け付けるファイルサイズの上限
+WHISPER_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+
+
+class EncodingPlan:
+    """
+    チャンクのエンコード設定（サンプルレート・チャンネル数・ビットレート）と、分割する長さ・数をまとめたものです。
+    """
+    def __init__(self, duration: float, chunk_length: int, chunk_count: int, bitrate_kbps: int,
+                 sample_rate: int, channels: int, max_bytes: int):
+        self.duration = duration
+        self.chunk_length = chunk_length
+        self.chunk_count = chunk_count
+        self.bitrate_kbps = bitrate_kbps
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.max_bytes = max_bytes
+
+    @property
+    def estimated_chunk_bytes(self) -> int:
+        return int(self.chunk_length * self.bitrate_kbps * 1000 / 8)
+
+    def export_parameters(self) -> dict:
+        """
+        pydubの AudioSegment.export に渡す引数を返します。
+        """
+        return {
+            "format": "mp3",
+            "bitrate": f"{self.bitrate_kbps}k",
+            "parameters": ["-ac", str(self.channels), "-ar", str(self.sample_rate)],
+        }
+
+    def ffmpeg_arguments(self) -> list[str]:
+        """
+        ffmpegの出力オプションを返します。
+        """
+        return [
+            "-ac", str(self.channels), "-ar", str(self.sample_rate),
+            "-codec:a", "libmp3lame", "-b:a", f"{self.bitrate_kbps}k", "-f", "mp3",
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "chunk_length_seconds": self.chunk_length,
+            "chunk_count": self.chunk_count,
+            "bitrate_kbps": self.bitrate_kbps,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "estimated_chunk_mb": round(self.estimated_chunk_bytes / (1024 * 1024), 2),
+        }
+
+
+def plan_chunk_encoding(
+    duration: float,
+    bitrate_kbps: int = 32,
+    sample_rate: int = 16000,
+    channels: int = 1,
+    max_bytes: int = WHISPER_MAX_UPLOAD_BYTES,
+    safety_margin: float = 0.9,
+    search_window: int = 0,
+    max_chunk_length: int = None,
+) -> EncodingPlan:
+    """
+    音声の長さから、サイズ上限内で1リクエストあたりの音声が最も長くなる（=チャンク数が最少になる）分割を計画します。
+
+    WhisperはAPI側で16kHzモノラルに変換して認識するため、チャンクは最初から16kHzモノラル・低ビットレートの
+    MP3にエンコードします。上限に収まる最長の長さ（safety_marginでコンテナ分の余裕を見込む）から必要な
+    チャンク数を求め、各チャンクがほぼ同じ長さになるように分割長を決めます。
+    search_window は無音位置を探す範囲（秒）で、境界が手前に寄ってもチャンク数が増えないよう考慮します。
+    """
+    bytes_per_second = bitrate_kbps * 1000 / 8
+    max_length = int(max_bytes * safety_margin / bytes_per_second)
+    if max_chunk_length:
+        max_length = min(max_length, max_chunk_length)
+
+    # 境界は分割長から最大 window 秒手前に寄るため、各チャンクが window 秒短くなっても収まる数にする
+    window = min(search_window, max_length // 2)
+    if duration <= max_length:
+        chunk_count = 1
+        chunk_length = max(1, math.ceil(duration))
+    else:
+        chunk_count = 1 + math.ceil((duration - max_length) / (max_length - window))
+        chunk_length = min(max_length, math.ceil(duration / chunk_count) + window)
+
+    return EncodingPlan(
+        duration=duration,
+        chunk_length=chunk_length,
+        chunk_count=chunk_count,
+        bitrate_kbps=bitrate_kbps,
+        sample_rate=sample_rate,
+        channels=channels,
+        max_bytes=max_bytes,
+    )
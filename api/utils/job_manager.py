@@ -0,0 +1,533 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from api.utils.log import get_logger
+from api.utils.metrics import JOB_DURATION, JOB_QUEUE_DEPTH, JOB_QUEUE_WAIT, JOBS_FINISHED, JOBS_IN_FLIGHT
+from api.utils.scheduler import JobTimePredictor
+
+logger = get_logger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """
+    待ち行列が上限に達しているか、予測される待ち時間が上限を超えており、新しいジョブを受け付けられない場合に送出されます。
+    retry_after は再投入までに待つとよい秒数です（分かる場合のみ）。
+    """
+    def __init__(self, job_id: str, retry_after: Optional[float] = None):
+        super().__init__(job_id)
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    1件の文字起こしジョブの状態（段階・進捗・結果）を保持します。
+
+    処理段階の変化やチャンクごとの文字起こし結果はイベントとして events に記録され、
+    stream_events() で購読できます。イベントはジョブ側で1回だけ保持し、購読者は
+    読み出し位置（イベントID）だけを持つため、購読者が増えてもメモリは増えません。
+    """
+    def __init__(self, user: str, filename: str, batch_id: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.user = user
+        self.filename = filename
+        self.batch_id = batch_id
+        self.status = "pending"  # pending / queued / running / done / failed
+        self.stage = "受付"
+        self.progress = 0.0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.created_at = time.time()
+        self.queued_at: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: list[Dict[str, Any]] = []
+        # 処理段階ごとの所要時間（秒）。metrics.time_stage が加算する
+        self.stage_timings: Dict[str, float] = {}
+        # ヘッダから読んだ音声長（秒）と、それから予測した処理時間（秒）・処理段階ごとの内訳
+        self.audio_seconds: Optional[float] = None
+        self.predicted_seconds: Optional[float] = None
+        self.predicted_stages: Dict[str, float] = {}
+        # 予測される処理開始・完了の日時（UNIX時間）。待ち行列が変化するたびに JobManager が更新する
+        self.estimated_start_at: Optional[float] = None
+        self.estimated_finish_at: Optional[float] = None
+        # 投入時点で予測した完了日時（結果の processing_info で実際の完了日時と比べられるよう残す）
+        self.submitted_estimate: Optional[float] = None
+        self._done = asyncio.Event()
+        # イベントが追加されるたびに set して差し替える（待っている購読者をまとめて起こす）
+        self._new_event = asyncio.Event()
+
+    def update(self, stage: str, progress: Optional[float] = None):
+        """
+        処理段階と進捗（0.0〜1.0）を更新します。
+        """
+        self.stage = stage
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        self.publish("stage")
+
+    def publish(self, event_type: str, **data: Any):
+        """
+        イベントを記録し、購読者に通知します。イベントIDは1からの連番です。
+        """
+        self.events.append({
+            "id": len(self.events) + 1,
+            "type": event_type,
+            "time": time.time(),
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "eta_seconds": self.eta_seconds,
+            **data,
+        })
+        signal, self._new_event = self._new_event, asyncio.Event()
+        signal.set()
+
+    async def stream_events(self, after: int = 0, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        イベントID after より後のイベントを順に返し、ジョブが終了したら止まります。
+        途中から再接続した場合も、記録済みのイベントから続きを受け取れます。
+        heartbeat 秒のあいだ新しいイベントがなければ None を返します（接続維持用）。
+        """
+        cursor = max(0, after)
+        while True:
+            signal = self._new_event
+            while cursor < len(self.events):
+                cursor += 1
+                yield self.events[cursor - 1]
+            if self.finished:
+                return
+            try:
+                await asyncio.wait_for(signal.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    async def wait(self):
+        """
+        ジョブが完了（成功または失敗）するまで待ちます。
+        """
+        await self._done.wait()
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """
+        予測される完了までの残り時間（秒）です。終了したジョブ・予測のないジョブは None です。
+        """
+        if self.finished or self.estimated_finish_at is None:
+            return None
+        return round(max(0.0, self.estimated_finish_at - time.time()), 1)
+
+    def schedule_info(self) -> Dict[str, Any]:
+        """
+        処理時間の予測と実績です（結果の processing_info に含めます）。
+        """
+        return {
+            "audio_seconds": self.audio_seconds,
+            "predicted_seconds": self.predicted_seconds,
+            "predicted_stages": self.predicted_stages,
+            "submitted_estimate_at": self.submitted_estimate,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "queue_wait_seconds": round(self.started_at - self.queued_at, 3) if self.started_at and self.queued_at else None,
+            "processing_seconds": round(time.time() - self.started_at, 3) if self.started_at else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "batch_id": self.batch_id,
+            "user": self.user,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "audio_seconds": self.audio_seconds,
+            "predicted_seconds": self.predicted_seconds,
+            "estimated_start_at": self.estimated_start_at,
+            "estimated_finish_at": self.estimated_finish_at,
+            "eta_seconds": self.eta_seconds,
+        }
+
+
+class Batch:
+    """
+    まとめて投入された複数のジョブ（1ファイル1ジョブ）の集まりです。状態と進捗は各ジョブから集計します。
+    """
+    def __init__(self, user: str):
+        self.id = str(uuid.uuid4())
+        self.user = user
+        self.jobs: list[Job] = []
+        self.created_at = time.time()
+        # ファイルの受信中は True。受信が終わるまでバッチは完了にならない
+        self.receiving = True
+
+    @property
+    def finished(self) -> bool:
+        return not self.receiving and all(job.finished for job in self.jobs)
+
+    @property
+    def status(self) -> str:
+        """
+        queued（どのジョブも未着手）/ running / done（すべて成功）/ partial（一部失敗）/ failed（すべて失敗）
+        """
+        if not self.jobs and self.receiving:
+            return "pending"
+        if not self.finished:
+            return "queued" if all(job.status in ("pending", "queued") for job in self.jobs) else "running"
+        failed = sum(1 for job in self.jobs if job.status == "failed")
+        if failed == 0 and self.jobs:
+            return "done"
+        return "failed" if failed == len(self.jobs) else "partial"
+
+    @property
+    def progress(self) -> float:
+        if not self.jobs:
+            return 0.0
+        return sum(1.0 if job.finished else job.progress for job in self.jobs) / len(self.jobs)
+
+    async def wait(self):
+        """
+        すべてのジョブが完了（成功または失敗）するまで待ちます。
+        """
+        for job in list(self.jobs):
+            await job.wait()
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished_at = [job.finished_at for job in self.jobs if job.finished_at]
+        return {
+            "batch_id": self.id,
+            "user": self.user,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "total": len(self.jobs),
+            "done": sum(1 for job in self.jobs if job.status == "done"),
+            "failed": sum(1 for job in self.jobs if job.status == "failed"),
+            "created_at": self.created_at,
+            "finished_at": max(finished_at) if self.finished and finished_at else None,
+            "jobs": [job.to_dict() for job in self.jobs],
+        }
+
+
+class FairJobQueue:
+    """
+    実行待ちのジョブを、予測処理時間の短いものから、利用者（user）ごとに公平に取り出す待ち行列です。
+
+    各ジョブには投入時に「仮想完了時刻」を割り当て、小さい順に取り出します。
+
+        仮想完了時刻 = aging × 投入時刻 + 予測処理時間
+                       + 同じ利用者の実行待ちのジョブのうち、予測処理時間がそれ以下のものの予測処理時間の合計
+
+    - 予測処理時間の短いジョブほど先に取り出されます（2時間の録音の後ろに5分の録音が並んでも、先に処理されます）
+    - 同じ利用者の実行待ちのジョブの分だけ後ろに回るため、ある利用者がまとめて大量のジョブを投入しても、
+      他の利用者のジョブはその後ろに並びません
+    - 後から投入されたジョブほど aging × 投入時刻 の分だけ後ろに回るため、長いジョブも待つほど先頭に近づき、
+      短いジョブが投入され続けても後回しにされ続けることはありません
+      （1秒待つごとに aging 秒分の予測処理時間が相殺されます）
+    """
+    def __init__(self, maxsize: int, aging: float = None):
+        self.maxsize = maxsize
+        self.aging = aging if aging is not None else float(os.getenv("OKOSHI_SCHEDULER_AGING", "1.0"))
+        self._heap: list[tuple[float, int, str, float, Any]] = []
+        self._sequence = itertools.count()
+        self._epoch = time.monotonic()
+        self._available = asyncio.Semaphore(0)
+
+    def qsize(self) -> int:
+        return len(self._heap)
+
+    def full(self) -> bool:
+        return len(self._heap) >= self.maxsize
+
+    def free_slots(self) -> int:
+        return max(0, self.maxsize - len(self._heap))
+
+    def finish_tag(self, key: str, cost: float) -> float:
+        """
+        利用者 key の予測処理時間 cost 秒のジョブを今投入した場合の仮想完了時刻を返します（待ち行列は変更しません）。
+        """
+        backlog = sum(queued_cost for _, _, queued_key, queued_cost, _ in self._heap if queued_key == key and queued_cost <= cost)
+        return self.aging * (time.monotonic() - self._epoch) + cost + backlog
+
+    def put_nowait(self, key: str, item: Any, cost: float = 0.0):
+        if self.full():
+            raise asyncio.QueueFull
+        heapq.heappush(self._heap, (self.finish_tag(key, cost), next(self._sequence), key, cost, item))
+        self._available.release()
+
+    async def get(self) -> Any:
+        await self._available.acquire()
+        return heapq.heappop(self._heap)[-1]
+
+    def ordered(self) -> list[tuple[float, Any]]:
+        """
+        待っているジョブを取り出される順に (仮想完了時刻, ジョブ) で返します。
+        """
+        return [(entry[0], entry[-1]) for entry in sorted(self._heap)]
+
+    def waiting_users(self) -> int:
+        return len({entry[2] for entry in self._heap})
+
+
+class JobManager:
+    """
+    文字起こしジョブをバックグラウンドで実行する、上限付きのワーカープールです。
+    同時に実行するジョブ数は max_workers（OKOSHI_MAX_WORKERS）、
+    実行待ちのジョブ数は max_queue（OKOSHI_MAX_QUEUE）で制限され、
+    上限を超えた投入は JobQueueFullError になります。
+
+    ジョブの処理時間は音声長と過去の処理段階ごとの所要時間から予測し（JobTimePredictor）、
+    実行待ちのジョブは予測処理時間の短いものから、利用者ごとに公平に取り出されます（FairJobQueue）。
+    予測では、実行中のジョブの残り時間と、先に取り出されるジョブを max_workers 件ずつ並行に処理した場合の
+    開始・完了日時を求めます。開始までの予測待ち時間が max_predicted_wait（OKOSHI_MAX_PREDICTED_WAIT_SECONDS）
+    を超える投入も JobQueueFullError になります。
+    """
+    def __init__(self, max_workers: int = None, max_queue: int = None, max_history: int = 1000,
+                 predictor: JobTimePredictor = None, max_predicted_wait: float = None):
+        self.max_workers = max_workers or int(os.getenv("OKOSHI_MAX_WORKERS", "2"))
+        self.max_queue = max_queue or int(os.getenv("OKOSHI_MAX_QUEUE", "20"))
+        self.predictor = predictor or JobTimePredictor()
+        # 0 の場合は予測待ち時間による制限をしない
+        self.max_predicted_wait = (
+            max_predicted_wait if max_predicted_wait is not None
+            else float(os.getenv("OKOSHI_MAX_PREDICTED_WAIT_SECONDS", "7200"))
+        )
+        # 完了済みジョブは新しい順に max_history 件まで保持する
+        self.max_history = max_history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.batches: "OrderedDict[str, Batch]" = OrderedDict()
+        self._queue: Optional[FairJobQueue] = None
+        self._workers: list[asyncio.Task] = []
+
+    def _ensure_started(self):
+        # ワーカーは実行中のイベントループ上で、最初の投入時に起動する
+        if self._queue is None:
+            self._queue = FairJobQueue(maxsize=self.max_queue)
+            self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+
+    def has_capacity(self, count: int = 1) -> bool:
+        """
+        count 件のジョブを実行待ち行列に入れられるかどうかを返します。
+        """
+        free_slots = self.max_queue if self._queue is None else self._queue.free_slots()
+        return free_slots >= count
+
+    def create(self, user: str, filename: str, batch: Optional[Batch] = None) -> Job:
+        """
+        ジョブを登録します（まだ実行待ち行列には入りません）。
+        batch が渡された場合は、そのバッチのジョブとして登録します。
+        """
+        job = Job(user=user, filename=filename, batch_id=batch.id if batch is not None else None)
+        self.jobs[job.id] = job
+        if batch is not None:
+            batch.jobs.append(job)
+        self._evict_finished()
+        return job
+
+    def create_batch(self, user: str) -> Batch:
+        """
+        バッチを登録します。ファイルごとのジョブは create(..., batch=batch) で追加します。
+        """
+        batch = Batch(user=user)
+        self.batches[batch.id] = batch
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        return self.batches.get(batch_id)
+
+    def predict(self, job: Job, audio_seconds: Optional[float]):
+        """
+        音声長 audio_seconds（秒、分からない場合は None）からジョブの処理時間を予測し、job に記録します。
+        """
+        job.audio_seconds = round(audio_seconds, 3) if audio_seconds else None
+        predicted_seconds, job.predicted_stages = self.predictor.predict(audio_seconds)
+        job.predicted_seconds = round(predicted_seconds, 1)
+
+    def submit(self, job: Job, runner: Callable[[Job], Awaitable[Dict[str, Any]]]) -> Job:
+        """
+        ジョブを実行待ち行列に入れます。runner(job) の戻り値がジョブの結果になります。
+        処理時間を予測していないジョブ（predict を呼んでいないジョブ）は、長さが分からないものとして予測します。
+        """
+        self._ensure_started()
+        if job.predicted_seconds is None:
+            self.predict(job, None)
+        if self._queue.full():
+            self.fail(job, 503, "現在混み合っています。しばらくしてから再度お試しください。")
+            raise JobQueueFullError(job.id)
+        if self.max_predicted_wait:
+            wait = self._predicted_start(self._queue.finish_tag(job.user, job.predicted_seconds)) - time.time()
+            if wait > self.max_predicted_wait:
+                self.fail(
+                    job, 503,
+                    f"現在混み合っています（処理開始まで約{math.ceil(wait / 60)}分の見込み）。しばらくしてから再度お試しください。",
+                )
+                logger.info(
+                    "job rejected by predicted wait",
+                    extra={"event": "job_rejected", "job_id": job.id, "predicted_wait_seconds": round(wait, 1)},
+                )
+                raise JobQueueFullError(job.id, retry_after=wait - self.max_predicted_wait)
+        self._queue.put_nowait(job.user, (job, runner), cost=job.predicted_seconds)
+        job.status = "queued"
+        job.queued_at = time.time()
+        self._refresh_estimates()
+        job.submitted_estimate = job.estimated_finish_at
+        job.update("順番待ち")
+        JOB_QUEUE_DEPTH.set(self.queue_depth())
+        logger.info(
+            "job scheduled",
+            extra={
+                "event": "job_scheduled", "job_id": job.id, "audio_seconds": job.audio_seconds,
+                "predicted_seconds": job.predicted_seconds, "eta_seconds": job.eta_seconds,
+            },
+        )
+        return job
+
+    def _worker_free_times(self, now: float) -> list[float]:
+        """
+        ワーカーごとに、実行中のジョブが終わって空く予測日時（空いているワーカーは now）を返します（ヒープ）。
+        実行中のジョブの予測完了日時もここで更新します。
+        """
+        free_at = []
+        for job in self.jobs.values():
+            if job.status != "running":
+                continue
+            elapsed = now - (job.started_at or now)
+            job.estimated_finish_at = now + max(0.0, (job.predicted_seconds or 0.0) - elapsed)
+            free_at.append(job.estimated_finish_at)
+        free_at += [now] * max(0, self.max_workers - len(free_at))
+        heapq.heapify(free_at)
+        return free_at
+
+    def _refresh_estimates(self):
+        """
+        実行中・実行待ちのジョブの予測開始・完了日時を、待ち行列から取り出される順に更新します。
+        """
+        if self._queue is None:
+            return
+        free_at = self._worker_free_times(time.time())
+        for _, (job, _) in self._queue.ordered():
+            job.estimated_start_at = heapq.heappop(free_at)
+            job.estimated_finish_at = job.estimated_start_at + job.predicted_seconds
+            heapq.heappush(free_at, job.estimated_finish_at)
+
+    def _predicted_start(self, finish_tag: float) -> float:
+        """
+        仮想完了時刻 finish_tag のジョブを待ち行列に入れた場合の、予測処理開始日時を返します。
+        """
+        free_at = self._worker_free_times(time.time())
+        for tag, (job, _) in self._queue.ordered():
+            if tag > finish_tag:
+                break
+            heapq.heappush(free_at, heapq.heappop(free_at) + job.predicted_seconds)
+        return free_at[0]
+
+    def schedule_stats(self) -> Dict[str, Any]:
+        """
+        実行待ち・実行中のジョブ数と、予測される残り処理時間の合計（秒）、処理時間の記録の件数を返します。
+        """
+        now = time.time()
+        pending = [job for job in self.jobs.values() if job.status in ("queued", "running")]
+        return {
+            "queued": self.queue_depth(),
+            "running": self.running_count(),
+            "waiting_users": self._queue.waiting_users() if self._queue is not None else 0,
+            "predicted_backlog_seconds": round(sum(
+                max(0.0, (job.estimated_finish_at or now) - max(now, job.estimated_start_at or now)) for job in pending
+            ), 1),
+            "max_predicted_wait_seconds": self.max_predicted_wait,
+            "history": self.predictor.stats(),
+        }
+
+    def record_timings(self, job: Job, audio_seconds: float):
+        """
+        完了したジョブの処理段階ごとの所要時間を、以降の予測に使う記録に加えます。
+        """
+        self.predictor.record(audio_seconds, job.stage_timings)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def running_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "running")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job, runner = await self._queue.get()
+            JOB_QUEUE_DEPTH.set(self.queue_depth())
+            JOBS_IN_FLIGHT.inc()
+            try:
+                job.status = "running"
+                job.started_at = time.time()
+                self._refresh_estimates()
+                queue_wait = job.started_at - (job.queued_at or job.started_at)
+                JOB_QUEUE_WAIT.observe(queue_wait)
+                logger.info("job started", extra={"event": "job_started", "job_id": job.id, "worker": worker_id, "queue_wait_seconds": round(queue_wait, 3)})
+                job.result = await runner(job)
+                job.status = "done"
+                job.update("完了", 1.0)
+                job.publish("done")
+            except HTTPException as e:
+                self.fail(job, e.status_code, e.detail)
+            except Exception:
+                logger.exception("job failed unexpectedly", extra={"event": "job_error", "job_id": job.id})
+                self.fail(job, 500, f"サーバー内部エラーが発生しました。ITサポートに連絡してください。(ID: {job.id})")
+            finally:
+                job.finished_at = time.time()
+                job._done.set()
+                self._refresh_estimates()
+                JOBS_IN_FLIGHT.dec()
+                JOB_DURATION.observe(job.finished_at - job.started_at, status=job.status)
+                JOBS_FINISHED.inc(status=job.status)
+                logger.info(
+                    "job finished",
+                    extra={
+                        "event": "job_finished",
+                        "job_id": job.id,
+                        "status": job.status,
+                        "status_code": job.status_code,
+                        "duration_seconds": round(job.finished_at - job.started_at, 3),
+                        "stage_timings": job.stage_timings,
+                    },
+                )
+
+    def fail(self, job: Job, status_code: int, error: str):
+        """
+        ジョブを失敗として終了させます。
+        """
+        job.status = "failed"
+        job.status_code = status_code
+        job.error = error
+        job.update("失敗")
+        job.finished_at = time.time()
+        job.publish("failed", error=error, status_code=status_code)
+        job._done.set()
+        if job.started_at is None:
+            # 実行前（受信中・待ち行列満杯）に失敗したジョブ。実行後の失敗はワーカー側で数える
+            JOBS_FINISHED.inc(status="failed")
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+        finished_batches = [batch_id for batch_id, batch in self.batches.items() if batch.finished]
+        for batch_id in finished_batches[: max(0, len(finished_batches) - self.max_history)]:
+            del self.batches[batch_id]
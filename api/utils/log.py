@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import sys
+import time
+
+# logging.LogRecord が標準で持つ属性。これ以外（extra で渡された項目）をJSONの項目として出力する
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    ログを1行1レコードのJSONとして出力します。
+    logger.info("...", extra={"job_id": ..., "stage": ...}) の extra はそのまま項目になります。
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """
+    アプリケーション（api.*）のロガーを設定します。
+    OKOSHI_LOG_LEVEL でレベル（既定: INFO）、OKOSHI_LOG_FORMAT で形式（json または text、既定: json）を指定します。
+    """
+    logger = logging.getLogger("api")
+    if getattr(logger, "_okoshi_configured", False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("OKOSHI_LOG_FORMAT", "json").lower() == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(os.getenv("OKOSHI_LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+    logger._okoshi_configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    モジュール用のロガーを返します（name には __name__ を渡してください）。
+    """
+    configure_logging()
+    return logging.getLogger(name)
@@ -0,0 +1,275 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from api.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 処理段階・API呼び出しの所要時間用のバケット（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    単調増加するカウンタです。
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    増減する値です。function を渡した場合は、出力のたびにその戻り値を使います。
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> list[str]:
+        if self.function is not None:
+            return [f"{self.name} {self.function()}"]
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """
+    観測値の分布（バケットごとの累積件数・合計・件数）を記録します。
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[tuple, list[int]] = {}
+        self._sums: Dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    メトリクスをまとめ、Prometheusのテキスト形式で出力します。
+    """
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "okoshi_stage_duration_seconds", "処理段階ごとの所要時間（秒）", ("stage",)
+))
+WHISPER_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "okoshi_whisper_request_duration_seconds", "文字起こし呼び出し1回あたりの所要時間（秒、backend: openai / local）", ("backend", "outcome")
+))
+WHISPER_REQUESTS = REGISTRY.register(Counter(
+    "okoshi_whisper_requests_total", "文字起こし呼び出し回数（backend: openai / local、outcome: success / retryable_error / error）", ("backend", "outcome")
+))
+BYTES_PROCESSED = REGISTRY.register(Counter(
+    "okoshi_bytes_processed_total", "処理したバイト数（kind: upload / openai_upload / local_upload）", ("kind",)
+))
+AUDIO_SECONDS_PROCESSED = REGISTRY.register(Counter(
+    "okoshi_audio_seconds_processed_total", "文字起こしした音声の長さの合計（秒）"
+))
+SILENCE_SECONDS_REMOVED = REGISTRY.register(Counter(
+    "okoshi_silence_removed_seconds_total", "文字起こしの前に取り除いた無音の長さの合計（秒）"
+))
+JOB_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "okoshi_job_queue_wait_seconds", "ジョブが実行待ち行列で待った時間（秒）"
+))
+JOB_DURATION = REGISTRY.register(Histogram(
+    "okoshi_job_duration_seconds", "ジョブの実行開始から終了までの時間（秒）", ("status",)
+))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "okoshi_jobs_finished_total", "終了したジョブ数（status: done / failed）", ("status",)
+))
+JOBS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "okoshi_jobs_in_flight", "実行中のジョブ数"
+))
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "okoshi_job_queue_depth", "実行待ち行列にあるジョブ数"
+))
+AUDIO_POOL_ACTIVE = REGISTRY.register(Gauge(
+    "okoshi_audio_pool_active", "音声処理プロセスプールに投入済み（実行中・待機中）のタスク数"
+))
+AUDIO_POOL_WAITING = REGISTRY.register(Gauge(
+    "okoshi_audio_pool_waiting", "音声処理プロセスプールの空きを待っているタスク数"
+))
+WORKSPACES_ACTIVE = REGISTRY.register(Gauge(
+    "okoshi_workspaces_active", "使用中のジョブ作業ディレクトリ数"
+))
+WORKSPACE_BYTES = REGISTRY.register(Gauge(
+    "okoshi_workspace_bytes", "作業ディレクトリ（processed_audio）の使用量（バイト、掃除のたびに計測）"
+))
+RESULT_FILES_BYTES = REGISTRY.register(Gauge(
+    "okoshi_result_files_bytes", "文字起こし結果ファイル（transcription_results）の使用量（バイト、掃除のたびに計測）"
+))
+
+
+# collect_stages の間、記録する代わりに処理段階を集めるリスト（プロセスプールの子プロセスで使う）
+_collected_stages: Optional[list] = None
+_collect_lock = threading.Lock()
+
+
+@contextmanager
+def collect_stages() -> Iterator[list]:
+    """
+    with ブロックの間に（どのスレッドからでも）記録された処理段階を、ヒストグラムやログに出さずに
+    (stage, seconds, outcome, fields) のリストへ集めます。子プロセスのメトリクスは /metrics に出ないため、
+    プロセスプールの子プロセスで計測した時間を親プロセスへ返し、replay_stages で記録するために使います。
+    """
+    global _collected_stages
+    records: list = []
+    with _collect_lock:
+        previous, _collected_stages = _collected_stages, records
+    try:
+        yield records
+    finally:
+        with _collect_lock:
+            _collected_stages = previous
+
+
+def replay_stages(records: list):
+    """
+    collect_stages で集めた処理段階を、このプロセスのメトリクスとログに記録します。
+    """
+    for stage, seconds, outcome, fields in records:
+        record_stage(stage, seconds, outcome=outcome, **fields)
+
+
+def record_stage(stage: str, seconds: float, job=None, outcome: str = "ok", **fields):
+    """
+    処理段階 stage の所要時間を記録します。ヒストグラムへの記録と構造化ログの出力を行い、
+    job が渡された場合は job.stage_timings に加算します。
+    別プロセスで計測した時間を親プロセスで記録する場合にも使います。
+    """
+    if job is None:
+        with _collect_lock:
+            if _collected_stages is not None:
+                _collected_stages.append((stage, seconds, outcome, fields))
+                return
+    STAGE_DURATION.observe(seconds, stage=stage)
+    if job is not None:
+        job.stage_timings[stage] = round(job.stage_timings.get(stage, 0.0) + seconds, 3)
+    logger.info(
+        f"stage {stage} finished in {seconds:.3f}s",
+        extra={
+            "event": "stage",
+            "stage": stage,
+            "outcome": outcome,
+            "duration_seconds": round(seconds, 3),
+            "job_id": getattr(job, "id", None),
+            **fields,
+        },
+    )
+
+
+@contextmanager
+def time_stage(stage: str, job=None, **fields) -> Iterator[Dict]:
+    """
+    with ブロックの所要時間を処理段階 stage の時間として記録します（record_stage を参照）。
+    ブロック内で yield された辞書に項目を追加すると、ログに含まれます。
+    """
+    extra: Dict = dict(fields)
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield extra
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start, job, outcome=outcome, **extra)
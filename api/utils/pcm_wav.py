@@ -0,0 +1,237 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# WAVE_FORMAT_EXTENSIBLE のサブフォーマットGUIDのうち、先頭2バイト（フォーマット番号）以降の共通部分
+_SUBFORMAT_GUID_TAIL = bytes.fromhex("000000001000800000aa00389b71")
+
+# (フォーマット番号, 1サンプルのバイト数) → (ffmpegの入力形式, NumPyのdtype, フルスケールの値)
+# 24bitはNumPyに対応するdtypeがないため、読み出す範囲だけ32bitに変換する
+SAMPLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 1): ("u8", np.dtype("u1"), 128.0),
+    (WAVE_FORMAT_PCM, 2): ("s16le", np.dtype("<i2"), 32768.0),
+    (WAVE_FORMAT_PCM, 3): ("s24le", None, 8388608.0),
+    (WAVE_FORMAT_PCM, 4): ("s32le", np.dtype("<i4"), 2147483648.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 4): ("f32le", np.dtype("<f4"), 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 8): ("f64le", np.dtype("<f8"), 1.0),
+}
+
+# RIFF / data チャンクのサイズに書ける最大値（4GBを超える場合はこの値を書き、読み出し時はファイルサイズで補う）
+MAX_CHUNK_SIZE = 0xFFFFFFFF
+
+
+class WavFormat:
+    """
+    非圧縮（PCM・浮動小数点）のWAVのヘッダから読み取った、サンプルの形式と data チャンクの位置です。
+    frame_count は data チャンクのうち実際にファイルにある分から求めるため、途中で切れたファイルでも正確です。
+    """
+    def __init__(self, format_tag: int, channels: int, sample_rate: int, sample_width: int, block_align: int,
+                 data_offset: int, data_size: int, fmt_chunk: bytes):
+        self.format_tag = format_tag
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.block_align = block_align
+        self.data_offset = data_offset
+        self.frame_count = data_size // block_align
+        # 書き出し時にそのまま使う fmt チャンクの内容
+        self.fmt_chunk = fmt_chunk
+        self.ffmpeg_format, self.dtype, self.full_scale = SAMPLE_FORMATS[(format_tag, sample_width)]
+
+    @property
+    def duration(self) -> float:
+        return self.frame_count / self.sample_rate
+
+    @property
+    def codec(self) -> str:
+        return f"pcm_{self.ffmpeg_format}"
+
+    def ffmpeg_input_arguments(self) -> list[str]:
+        """
+        このWAVのサンプル列を標準入力から渡す場合の、ffmpegの入力オプションです。
+        """
+        return ["-f", self.ffmpeg_format, "-ar", str(self.sample_rate), "-ac", str(self.channels)]
+
+
+def read_wav_format(file_path: Path) -> Optional[WavFormat]:
+    """
+    RIFFヘッダを直接読み、非圧縮のWAVであればその形式を返します。
+    WAVでない・圧縮されている（ADPCMなど）・ヘッダが壊れている場合は None を返します（ffmpegで扱います）。
+    """
+    try:
+        file_size = os.path.getsize(file_path)
+        with open(file_path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+                return None
+            fmt_chunk = None
+            # 通常は fmt・data の前にあるチャンクは数個のため、読むチャンク数に上限を設けて壊れたファイルでも止まらないようにする
+            for _ in range(64):
+                chunk_header = f.read(8)
+                if len(chunk_header) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+                if chunk_id == b"fmt ":
+                    fmt_chunk = f.read(chunk_size)
+                    if chunk_size % 2:
+                        f.seek(1, os.SEEK_CUR)
+                elif chunk_id == b"data":
+                    if fmt_chunk is None:
+                        return None
+                    data_offset = f.tell()
+                    data_size = min(chunk_size, file_size - data_offset)
+                    return _parse_fmt_chunk(fmt_chunk, data_offset, data_size)
+                else:
+                    f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def _parse_fmt_chunk(fmt_chunk: bytes, data_offset: int, data_size: int) -> Optional[WavFormat]:
+    if len(fmt_chunk) < 16:
+        return None
+    format_tag, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack("<HHIIHH", fmt_chunk[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt_chunk) < 40 or fmt_chunk[26:40] != _SUBFORMAT_GUID_TAIL:
+            return None
+        format_tag = struct.unpack("<H", fmt_chunk[24:26])[0]
+    sample_width = (bits_per_sample + 7) // 8
+    if channels == 0 or sample_rate == 0 or block_align != channels * sample_width:
+        return None
+    if (format_tag, sample_width) not in SAMPLE_FORMATS:
+        return None
+    return WavFormat(format_tag, channels, sample_rate, sample_width, block_align, data_offset, data_size, fmt_chunk)
+
+
+class PcmWav:
+    """
+    非圧縮のWAVをメモリマップし、フレーム（全チャンネル分のサンプル）の範囲を複製せずに読み出します。
+    ファイルの内容はアクセスした分だけOSが読み込み、release した範囲はプロセスのメモリから外れるため、
+    先頭から順に処理すればメモリ使用量はファイルの大きさに依存しません。
+    with 文で使うか、使い終わったら close() してください。
+    """
+    def __init__(self, file_path: Path, wav_format: WavFormat):
+        self.file_path = Path(file_path)
+        self.format = wav_format
+        self._file = open(self.file_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def sample_rate(self) -> int:
+        return self.format.sample_rate
+
+    @property
+    def channels(self) -> int:
+        return self.format.channels
+
+    @property
+    def frame_count(self) -> int:
+        return self.format.frame_count
+
+    @property
+    def duration(self) -> float:
+        return self.format.duration
+
+    def _byte_range(self, start: int, end: int) -> Tuple[int, int]:
+        start = min(max(start, 0), self.frame_count)
+        end = min(max(end, start), self.frame_count)
+        offset = self.format.data_offset
+        return offset + start * self.format.block_align, offset + end * self.format.block_align
+
+    def frames(self, start: int, end: int) -> memoryview:
+        """
+        フレーム番号 start から end まで（end は含まない）のバイト列を、複製せずに返します。
+        """
+        begin, finish = self._byte_range(start, end)
+        return memoryview(self._mmap)[begin:finish]
+
+    def samples(self, start: int, end: int) -> np.ndarray:
+        """
+        フレーム番号 start から end までのサンプルを (フレーム数, チャンネル数) の配列で返します。
+        24bit以外は複製せずにファイルの内容を直接参照します。値の大きさは format.full_scale を基準とします。
+        """
+        begin, finish = self._byte_range(start, end)
+        count = (finish - begin) // self.format.block_align
+        if self.format.dtype is None:
+            raw = np.frombuffer(self._mmap, dtype=np.uint8, count=finish - begin, offset=begin).reshape(-1, 3)
+            # 下位3バイトを32bitの上位に詰めてから8bit右シフトし、符号を保ったまま24bitの値にする
+            values = (raw[:, 0].astype(np.int32) << 8 | raw[:, 1].astype(np.int32) << 16 | raw[:, 2].astype(np.int32) << 24) >> 8
+            return values.reshape(count, self.channels)
+        values = np.frombuffer(self._mmap, dtype=self.format.dtype, count=count * self.channels, offset=begin)
+        if self.format.ffmpeg_format == "u8":
+            values = values.astype(np.int16) - 128
+        return values.reshape(count, self.channels)
+
+    def iter_frames(self, start: int, end: int, block_frames: int = 1 << 16) -> Iterator[memoryview]:
+        """
+        フレーム番号 start から end までを block_frames フレームずつ複製せずに返し、
+        次のブロックへ進むときに返し終えたブロックを release します。
+        """
+        for position in range(start, end, block_frames):
+            block_end = min(end, position + block_frames)
+            yield self.frames(position, block_end)
+            self.release(position, block_end)
+
+    def release(self, start: int, end: int):
+        """
+        読み終えたフレームの範囲をプロセスのメモリから外します（ファイルの内容はOSのキャッシュに残ります）。
+        """
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        begin, finish = self._byte_range(start, end)
+        # madvise の範囲はページ境界に揃える必要がある（範囲の外側のページは外さない）
+        begin = -(-begin // mmap.PAGESIZE) * mmap.PAGESIZE
+        finish = finish // mmap.PAGESIZE * mmap.PAGESIZE
+        if finish > begin:
+            self._mmap.madvise(mmap.MADV_DONTNEED, begin, finish - begin)
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 読み出した配列がまだ参照されている場合は、参照がなくなったときに解放される
+            pass
+        self._file.close()
+
+    def __enter__(self) -> "PcmWav":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_pcm_wav(file_path: Path) -> Optional[PcmWav]:
+    """
+    非圧縮のWAVであればメモリマップして返し、そうでなければ None を返します。
+    """
+    wav_format = read_wav_format(file_path)
+    if wav_format is None or wav_format.frame_count == 0:
+        return None
+    return PcmWav(file_path, wav_format)
+
+
+def write_pcm_wav(output_path: Path, source: PcmWav, regions: Iterable[Tuple[int, int]], block_frames: int = 1 << 18) -> Path:
+    """
+    source のフレームの範囲 (開始, 終了) を順につないで、同じ形式のWAVとして書き出します。
+    各範囲はメモリマップから block_frames フレームずつ複製せずに書き込み、書き終えた範囲は release します。
+    """
+    regions = list(regions)
+    data_size = sum(end - start for start, end in regions) * source.format.block_align
+    fmt_chunk = source.format.fmt_chunk + b"\0" * (len(source.format.fmt_chunk) % 2)
+    riff_size = 4 + 8 + len(fmt_chunk) + 8 + data_size
+    with open(output_path, "wb") as f:
+        f.write(struct.pack("<4sI4s", b"RIFF", min(riff_size, MAX_CHUNK_SIZE), b"WAVE"))
+        f.write(struct.pack("<4sI", b"fmt ", len(source.format.fmt_chunk)) + fmt_chunk)
+        f.write(struct.pack("<4sI", b"data", min(data_size, MAX_CHUNK_SIZE)))
+        for start, end in regions:
+            for block in source.iter_frames(start, end, block_frames):
+                f.write(block)
+    return output_path
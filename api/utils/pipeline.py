@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from api.utils.audio_pool import AudioWorkPool
+from api.utils.audio_utils import AudioProcessor, AudioChunk
+from api.utils.encoding_planner import EncodingPlan
+from api.utils.silence import TimeRemap
+from api.utils.wisper_service import WhisperService, TranscriptionCombiner
+
+
+async def run_split_transcribe_pipeline(
+    audio_processor: AudioProcessor,
+    whisper_service: WhisperService,
+    file_path: Path,
+    user: str,
+    segment_length: int = 600,
+    language: str = "ja",
+    queue_size: int = 4,
+    on_chunk_done: Optional[Callable[[AudioChunk, Dict], None]] = None,
+    plan: Optional[EncodingPlan] = None,
+    on_chunk_encoded: Optional[Callable[[AudioChunk], None]] = None,
+    work_dir: Optional[Path] = None,
+    chunks: Optional[Iterator[AudioChunk]] = None,
+    remap: Optional[TimeRemap] = None,
+    audio_pool: Optional[AudioWorkPool] = None,
+) -> tuple[Dict, list[AudioChunk], Dict]:
+    """
+    分割（エンコード）と文字起こしをパイプラインで実行します。
+    プロデューサー（別スレッド）がチャンクをエンコードしてキューに入れ、
+    コンシューマーが取り出したチャンクから順にWhisperへ送信します。
+    結果は完了した順に TranscriptionCombiner へ渡され、逐次結合されます。
+    on_chunk_encoded(chunk) はチャンクのエンコードが終わるたびに、
+    on_chunk_done(chunk, result) はチャンクの文字起こしが終わるたびに呼び出されます。
+    planが渡された場合は、その分割長とエンコード設定でチャンクを作成します。
+    チャンクは work_dir（省略時はユーザーのサブディレクトリ）に保存されます。
+    chunks が渡された場合は、ファイルを分割する代わりにそのジェネレータが返すチャンクを使います
+    （受信中のアップロードを分割する AudioProcessor.split_audio_progressive など）。
+    file_path が無音を取り除いた音声の場合は、その対応表（remap）を渡すと結合結果の時刻が元の音声の時刻になります。
+    audio_pool が渡された場合、チャンクのエンコードはそのプロセスプールで実行されます（同時に動くffmpegの数が
+    すべてのジョブを通してプールの上限に収まります）。
+
+    戻り値: (結合結果, 分割ファイルのリスト, ステージごとの所要時間)
+    """
+    loop = asyncio.get_running_loop()
+    # キューの上限により、文字起こしが追いつかない場合はエンコードを待たせる
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    job_semaphore = asyncio.Semaphore(whisper_service.job_concurrency)
+    combiner = TranscriptionCombiner(segment_duration=segment_length, remap=remap)
+    split_files: list[AudioChunk] = []
+    timings = {}
+    pipeline_start = time.perf_counter()
+    cancelled = threading.Event()
+    pool_arguments = {}
+    if audio_pool is not None:
+        pool_arguments = {
+            "max_workers": audio_pool.max_workers,
+            "submit": functools.partial(audio_pool.submit_threadsafe, loop),
+        }
+
+    def produce():
+        encode_start = time.perf_counter()
+        try:
+            source = chunks if chunks is not None else audio_processor.split_audio_streaming(
+                file_path, user=user, segment_length=segment_length, plan=plan, work_dir=work_dir, **pool_arguments
+            )
+            try:
+                for chunk in source:
+                    if chunk.index == 0:
+                        timings["first_chunk_seconds"] = time.perf_counter() - pipeline_start
+                    if cancelled.is_set():
+                        break
+                    asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+            finally:
+                source.close()
+            timings["encode_seconds"] = time.perf_counter() - encode_start
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+        except Exception as e:
+            timings["encode_seconds"] = time.perf_counter() - encode_start
+            if not cancelled.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+
+    async def transcribe(chunk: AudioChunk):
+        result = await whisper_service.transcribe_single_file(chunk, language, job_semaphore=job_semaphore)
+        combiner.add(chunk.index, result)
+        if on_chunk_done is not None:
+            on_chunk_done(chunk, result)
+
+    producer = loop.run_in_executor(None, produce)
+    tasks = []
+    transcribe_start = None
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            chunk = item
+            split_files.append(chunk)
+            if on_chunk_encoded is not None:
+                on_chunk_encoded(chunk)
+            if transcribe_start is None:
+                transcribe_start = time.perf_counter()
+            tasks.append(asyncio.create_task(transcribe(chunk)))
+        await asyncio.gather(*tasks)
+        await producer
+    except BaseException:
+        cancelled.set()
+        for task in tasks:
+            task.cancel()
+        # プロデューサーがキュー待ちで止まらないよう、終了するまで取り出し続ける
+        asyncio.ensure_future(_drain_until_done(queue, producer))
+        raise
+
+    wall_seconds = time.perf_counter() - pipeline_start
+    timings["transcribe_seconds"] = time.perf_counter() - transcribe_start if transcribe_start else 0.0
+    timings["wall_seconds"] = wall_seconds
+    timings = {key: round(value, 2) for key, value in timings.items()}
+
+    return combiner.finalize(), split_files, timings
+
+
+async def _drain_until_done(queue: asyncio.Queue, producer: asyncio.Future):
+    while not producer.done():
+        while not queue.empty():
+            queue.get_nowait()
+        await asyncio.sleep(0.05)
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+
+class AsyncRateLimiter:
+    """
+    プロセス内のすべてのジョブで共有する、トークンバケット方式のレート制限です。
+    1分あたり requests_per_minute 回まで acquire() を通し、それを超える呼び出しは待たせます。
+    API から Retry-After 付きのレート制限応答を受けた場合は pause() で全体を一時停止し、
+    同時実行中のジョブが一斉に再試行して失敗の波が起きるのを防ぎます。
+    """
+    def __init__(self, requests_per_minute: float, burst: int = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 6)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """
+        指定秒数のあいだ、新たな acquire() を待たせます。
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def would_wait(self) -> bool:
+        """
+        いま acquire() を呼ぶと待たされる（一時停止中、またはトークンがない）かどうかを返します。
+        """
+        now = time.monotonic()
+        if now < self._paused_until or self._lock.locked():
+            return True
+        self._refill(now)
+        return self._tokens < 1
+
+
+class SqliteRateLimiter:
+    """
+    同じSQLiteのファイルを共有するすべてのプロセスで、1つのトークンバケットを使うレート制限です。
+    api ロールで複数のワーカーを起動しても、Whisper APIへのリクエストは全体で WHISPER_RPM に収まります。
+    AsyncRateLimiter と同じように使え、トークン数と一時停止の期限はファイルの rate_limits テーブルに記録します。
+    時刻は time.time() で比べるため、複数のマシンで共有する場合はマシンの時刻を同期してください。
+    """
+    def __init__(self, path: str, requests_per_minute: float, burst: int = None, name: str = "whisper",
+                 max_sleep_seconds: float = 1.0):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 6)))
+        self.name = name
+        # 待っている間に他のプロセスが一時停止した場合にも気づけるよう、1回に待つ時間には上限を設ける
+        self.max_sleep_seconds = max_sleep_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                paused_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)", (name, self.capacity, time.time())
+        )
+
+    def _state(self, now: float) -> tuple[float, float]:
+        tokens, updated_at, paused_until = self._conn.execute(
+            "SELECT tokens, updated_at, paused_until FROM rate_limits WHERE name = ?", (self.name,)
+        ).fetchone()
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate), paused_until
+
+    def try_acquire(self) -> float:
+        """
+        トークンを1つ取り出せれば 0 を、取り出せなければ次に試すまで待つべき秒数を返します。
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                tokens, paused_until = self._state(now)
+                if now < paused_until:
+                    wait = paused_until - now
+                elif tokens >= 1:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / self.rate
+                self._conn.execute("UPDATE rate_limits SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, self.name))
+                self._conn.execute("COMMIT")
+                return wait
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def acquire(self):
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, self.max_sleep_seconds))
+
+    def pause(self, seconds: float):
+        """
+        指定秒数のあいだ、すべてのプロセスの新たな acquire() を待たせます。
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rate_limits SET paused_until = MAX(paused_until, ?) WHERE name = ?", (time.time() + seconds, self.name)
+            )
+
+    def would_wait(self) -> bool:
+        now = time.time()
+        with self._lock:
+            tokens, paused_until = self._state(now)
+        return now < paused_until or tokens < 1
+
+
+def rate_limit_settings() -> tuple[float, int]:
+    """
+    Whisper APIのレート制限の設定（WHISPER_RPM, WHISPER_RPM_BURST）を返します。
+    """
+    return float(os.getenv("WHISPER_RPM", "100")), int(os.getenv("WHISPER_RPM_BURST", "20"))
@@ -0,0 +1,276 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from api.utils.log import get_logger
+from api.utils.storage import DATA_DIR
+from api.utils.transcript import STRUCTURED_SUFFIX, Transcript
+
+logger = get_logger(__name__)
+
+
+def _normalize(text: str) -> str:
+    """
+    検索用に正規化します（全角・半角の統一、英字の小文字化、記号・空白の除去）。
+    """
+    return "".join(ch for ch in unicodedata.normalize("NFKC", text).lower() if ch.isalnum())
+
+
+def _bigrams(normalized: str) -> List[str]:
+    if len(normalized) < 2:
+        return [normalized] if normalized else []
+    return [normalized[i:i + 2] for i in range(len(normalized) - 1)]
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ResultIndex:
+    """
+    保存した文字起こし結果の索引（SQLite）です。結果の一覧と、セグメント単位の全文検索に使います。
+
+    - results: 結果ごとの登録者・元ファイル名・音声長・保存日時
+    - segments: セグメントごとの開始・終了秒とテキスト
+    - segment_terms: セグメントのテキストを2文字ずつ区切った語の全文検索索引（FTS5）
+
+    日本語は単語の区切りがないため、2文字ずつ重ねて区切った語（bigram）で索引を作り、
+    検索語も同じように区切ってフレーズとして検索します。1文字の検索語のみ索引を使わずに全件を照合します。
+    """
+    def __init__(self, index_dir: str = None):
+        self.index_dir = Path(index_dir or os.getenv("OKOSHI_INDEX_DIR") or DATA_DIR / "transcription_index")
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_dir / "index.sqlite3", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                result_id TEXT PRIMARY KEY,
+                user TEXT NOT NULL,
+                original_filename TEXT NOT NULL,
+                result_file TEXT NOT NULL,
+                job_id TEXT,
+                language TEXT,
+                duration REAL NOT NULL,
+                segment_count INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS results_user_created ON results (user, created_at);
+            CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY,
+                result_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS segments_result ON segments (result_id, position);
+            CREATE VIRTUAL TABLE IF NOT EXISTS segment_terms USING fts5(terms, content='');
+            """
+        )
+        self._conn.commit()
+
+    def add(self, result_id: str, user: str, original_filename: str, result_file: str, transcript: Transcript,
+            created_at: float = None, job_id: str = None):
+        """
+        結果を索引に登録します（同じ result_id があれば置き換えます）。文字起こしに失敗した区間は索引に含めません。
+        """
+        segments = [
+            (position, start, end, text)
+            for position, (start, end, text, failed) in enumerate(transcript)
+            if not failed and text
+        ]
+        with self._lock:
+            self._delete(result_id)
+            self._conn.execute(
+                "INSERT INTO results (result_id, user, original_filename, result_file, job_id, language, duration, segment_count, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (result_id, user, original_filename, result_file, job_id, transcript.language,
+                 transcript.duration or 0.0, len(segments), created_at or time.time()),
+            )
+            for position, start, end, text in segments:
+                cursor = self._conn.execute(
+                    "INSERT INTO segments (result_id, position, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                    (result_id, position, start, end, text),
+                )
+                self._conn.execute(
+                    "INSERT INTO segment_terms (rowid, terms) VALUES (?, ?)",
+                    (cursor.lastrowid, " ".join(_bigrams(_normalize(text)))),
+                )
+            self._conn.commit()
+
+    def _delete(self, result_id: str):
+        # 中身を持たないFTS索引からの削除には、登録時と同じ語が必要
+        for segment_id, text in self._conn.execute(
+            "SELECT id, text FROM segments WHERE result_id = ?", (result_id,)
+        ).fetchall():
+            self._conn.execute(
+                "INSERT INTO segment_terms (segment_terms, rowid, terms) VALUES ('delete', ?, ?)",
+                (segment_id, " ".join(_bigrams(_normalize(text)))),
+            )
+        self._conn.execute("DELETE FROM segments WHERE result_id = ?", (result_id,))
+        self._conn.execute("DELETE FROM results WHERE result_id = ?", (result_id,))
+
+    def remove(self, result_ids: Iterable[str]) -> int:
+        """
+        結果を索引から削除し、削除した件数を返します（保持期間を過ぎて結果ファイルが削除されたときに呼ばれます）。
+        """
+        removed = 0
+        with self._lock:
+            for result_id in result_ids:
+                if self._conn.execute("SELECT 1 FROM results WHERE result_id = ?", (result_id,)).fetchone():
+                    self._delete(result_id)
+                    removed += 1
+            self._conn.commit()
+        return removed
+
+    @staticmethod
+    def _result_row(row: tuple) -> Dict:
+        result_id, user, original_filename, result_file, job_id, language, duration, segment_count, created_at = row
+        return {
+            "result_id": result_id,
+            "user": user,
+            "original_filename": original_filename,
+            "result_file": result_file,
+            "job_id": job_id,
+            "language": language,
+            "duration": duration,
+            "segment_count": segment_count,
+            "created_at": created_at,
+        }
+
+    def get(self, result_id: str) -> Optional[Dict]:
+        """
+        結果の情報と、索引に登録したセグメントを返します。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_id, user, original_filename, result_file, job_id, language, duration, segment_count, created_at"
+                " FROM results WHERE result_id = ?", (result_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            segments = self._conn.execute(
+                "SELECT position, start, end, text FROM segments WHERE result_id = ? ORDER BY position", (result_id,)
+            ).fetchall()
+        return {
+            **self._result_row(row),
+            "segments": [
+                {"position": position, "start": start, "end": end, "text": text}
+                for position, start, end, text in segments
+            ],
+        }
+
+    def list(self, user: str = None, limit: int = 50, offset: int = 0) -> tuple[int, List[Dict]]:
+        """
+        結果を新しい順に返します。user を指定した場合はその登録者の結果のみ返します。戻り値は (総件数, 結果のリスト) です。
+        """
+        where, args = ("WHERE user = ?", [user]) if user else ("", [])
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM results {where}", args).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT result_id, user, original_filename, result_file, job_id, language, duration, segment_count, created_at"
+                f" FROM results {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                args + [limit, offset],
+            ).fetchall()
+        return total, [self._result_row(row) for row in rows]
+
+    def search(self, query: str, user: str = None, limit: int = 50) -> List[Dict]:
+        """
+        すべての検索語（空白区切り）を含むセグメントを、新しく登録された結果の順・結果内では時刻順に返します。
+        索引を新しい順にたどり、limit 件見つかった時点で打ち切るため、多くの結果に現れる語でも検索時間は一定です。
+        """
+        terms = [_normalize(term) for term in query.split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            return []
+
+        indexed = [term for term in terms if len(term) >= 2]
+        conditions, args = [], []
+        if indexed:
+            # 検索語ごとの2文字の語の並びをフレーズとして、すべての検索語を含むセグメントを索引から絞り込む
+            source = "segment_terms JOIN segments ON segments.id = segment_terms.rowid"
+            order = "segment_terms.rowid DESC"
+            conditions.append("segment_terms MATCH ?")
+            args.append(" AND ".join(f'"{" ".join(_bigrams(term))}"' for term in indexed))
+        else:
+            source, order = "segments", "segments.id DESC"
+        for term in terms:
+            if len(term) < 2:
+                conditions.append("segments.text LIKE ? ESCAPE '\\'")
+                args.append(f"%{_escape_like(term)}%")
+        if user:
+            conditions.append("results.user = ?")
+            args.append(user)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT results.result_id, results.user, results.original_filename, results.result_file, results.created_at,"
+                " segments.position, segments.start, segments.end, segments.text"
+                f" FROM {source} JOIN results ON results.result_id = segments.result_id"
+                f" WHERE {' AND '.join(conditions)}"
+                f" ORDER BY {order} LIMIT ?",
+                args + [limit],
+            ).fetchall()
+        hits = [
+            {
+                "result_id": result_id,
+                "user": row_user,
+                "original_filename": original_filename,
+                "result_file": result_file,
+                "created_at": created_at,
+                "position": position,
+                "start": start,
+                "end": end,
+                "text": text,
+            }
+            for result_id, row_user, original_filename, result_file, created_at, position, start, end, text in rows
+        ]
+        hits.sort(key=lambda hit: (-hit["created_at"], hit["position"]))
+        return hits
+
+    def backfill(self, results_dir: str) -> int:
+        """
+        結果ディレクトリにある構造化データ（*.segments.json）のうち、索引にないものを登録し、登録した件数を返します。
+        索引を作る前に保存された結果や、索引を削除した場合の再構築に使います。
+        """
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT result_id FROM results")}
+        added = 0
+        for path in Path(results_dir).glob(f"*{STRUCTURED_SUFFIX}"):
+            result_id = path.name[:-len(STRUCTURED_SUFFIX)]
+            if result_id in known:
+                continue
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                created_at = data.get("created_at")
+                self.add(
+                    result_id,
+                    user=data.get("user") or "",
+                    original_filename=data.get("original_filename") or "",
+                    result_file=f"{result_id}.txt",
+                    transcript=Transcript.from_dict(data.get("transcript") or {}),
+                    created_at=datetime.fromisoformat(created_at).timestamp() if created_at else path.stat().st_mtime,
+                    job_id=data.get("job_id"),
+                )
+                added += 1
+            except (OSError, ValueError):
+                logger.warning("failed to index stored result", extra={"event": "index_backfill_failed", "path": str(path)})
+        if added:
+            logger.info("stored results indexed", extra={"event": "index_backfilled", "added": added})
+        return added
+
+    def stats(self) -> Dict:
+        with self._lock:
+            results, segments = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM results), (SELECT COUNT(*) FROM segments)"
+            ).fetchone()
+        return {"results": results, "segments": segments}
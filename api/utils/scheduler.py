@@ -0,0 +1,144 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from api.utils.storage import DATA_DIR
+
+# 処理時間の予測に含めない処理段階（アップロードの受信は回線の速さで決まり、待ち行列の順番とは関係しない）
+EXCLUDED_STAGES = {"receive"}
+
+# 長さをヘッダから読めない場合（受信中のアップロードなど）に、サイズから長さを見積もるための1秒あたりのバイト数
+TYPICAL_BYTES_PER_SECOND = {
+    "wav": 44100 * 2 * 2,  # 44.1kHz・16bit・ステレオ
+}
+DEFAULT_BYTES_PER_SECOND = 128_000 // 8  # 128kbps
+
+
+def estimate_audio_seconds(size_bytes: int, format_name: Optional[str] = None) -> float:
+    """
+    ファイルサイズと形式から、音声の長さ（秒）を大まかに見積もります。
+    """
+    return size_bytes / TYPICAL_BYTES_PER_SECOND.get(format_name or "", DEFAULT_BYTES_PER_SECOND)
+
+
+class JobTimePredictor:
+    """
+    処理段階ごとの所要時間の記録から、音声の長さに対するジョブの処理時間を予測します。
+
+    完了したジョブの音声長と処理段階ごとの所要時間（job.stage_timings）を SQLite に記録し、
+    直近 max_samples 件をメモリに保持します。予測では、音声長が近い（対数で比べて）neighbors 件の記録を選び、
+    処理段階ごとに「固定時間 + 音声1秒あたりの時間 × 音声長」の直線を当てはめて合計します。
+    短い音声は1チャンクで変換するだけ、長い音声は分割して並行に文字起こしするといった処理の違いも、
+    近い長さの記録だけを使うことで反映されます。
+
+    記録が min_samples 件に満たないうちは、OKOSHI_ETA_FIXED_SECONDS と
+    OKOSHI_ETA_SECONDS_PER_AUDIO_MINUTE から求めた既定値を使います。
+    """
+    def __init__(self, history_dir: str = None, max_samples: int = 500, neighbors: int = 8, min_samples: int = 3):
+        self.history_dir = Path(history_dir or os.getenv("OKOSHI_SCHEDULER_DIR") or DATA_DIR / "scheduler")
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self.max_samples = max_samples
+        self.neighbors = neighbors
+        self.min_samples = min_samples
+        self.fixed_seconds = float(os.getenv("OKOSHI_ETA_FIXED_SECONDS", "5"))
+        self.seconds_per_audio_minute = float(os.getenv("OKOSHI_ETA_SECONDS_PER_AUDIO_MINUTE", "6"))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.history_dir / "history.sqlite3", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_timings (
+                id INTEGER PRIMARY KEY,
+                audio_seconds REAL NOT NULL,
+                stage_timings TEXT NOT NULL,
+                finished_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT audio_seconds, stage_timings FROM job_timings ORDER BY id DESC LIMIT ?", (max_samples,)
+        ).fetchall()
+        self._samples: deque = deque(
+            ((audio_seconds, json.loads(stage_timings)) for audio_seconds, stage_timings in reversed(rows)),
+            maxlen=max_samples,
+        )
+
+    def record(self, audio_seconds: float, stage_timings: Dict[str, float]):
+        """
+        完了したジョブの音声長と、処理段階ごとの所要時間を記録します。
+        """
+        if not audio_seconds or audio_seconds <= 0:
+            return
+        stages = {stage: seconds for stage, seconds in stage_timings.items() if stage not in EXCLUDED_STAGES}
+        if not stages:
+            return
+        with self._lock:
+            self._samples.append((audio_seconds, stages))
+            self._conn.execute(
+                "INSERT INTO job_timings (audio_seconds, stage_timings, finished_at) VALUES (?, ?, ?)",
+                (audio_seconds, json.dumps(stages), time.time()),
+            )
+            # 予測に使う件数より古い記録は削除する
+            self._conn.execute(
+                "DELETE FROM job_timings WHERE id <= (SELECT MAX(id) FROM job_timings) - ?", (self.max_samples,)
+            )
+            self._conn.commit()
+
+    def typical_audio_seconds(self) -> float:
+        """
+        長さが分からないジョブに使う音声長（記録の中央値。記録がなければ10分）を返します。
+        """
+        with self._lock:
+            durations = sorted(audio_seconds for audio_seconds, _ in self._samples)
+        return durations[len(durations) // 2] if durations else 600.0
+
+    def predict(self, audio_seconds: Optional[float]) -> tuple[float, Dict[str, float]]:
+        """
+        音声長 audio_seconds（秒）のジョブの処理時間（秒）と、処理段階ごとの内訳を返します。
+        長さが分からない場合は typical_audio_seconds() の長さとして予測します。
+        """
+        if audio_seconds is None or audio_seconds <= 0:
+            audio_seconds = self.typical_audio_seconds()
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            total = self.fixed_seconds + self.seconds_per_audio_minute * audio_seconds / 60
+            return total, {}
+
+        target = math.log(max(audio_seconds, 1.0))
+        nearest = sorted(samples, key=lambda sample: abs(math.log(max(sample[0], 1.0)) - target))[:self.neighbors]
+        stages = {stage for _, timings in nearest for stage in timings}
+        per_stage = {
+            stage: self._fit(((duration, timings.get(stage, 0.0)) for duration, timings in nearest), audio_seconds)
+            for stage in sorted(stages)
+        }
+        return sum(per_stage.values()), {stage: round(seconds, 3) for stage, seconds in per_stage.items()}
+
+    @staticmethod
+    def _fit(points: Iterable[tuple[float, float]], audio_seconds: float) -> float:
+        """
+        (音声長, 所要時間) の組に直線を当てはめ、audio_seconds での所要時間を返します。
+        音声長がほぼ同じ記録しかない場合は音声長に比例するとみなし、傾きが負になる場合は音声長によらない一定の時間とみなします。
+        """
+        points = list(points)
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        variance = sum((x - mean_x) ** 2 for x, _ in points)
+        if variance <= 1e-6 * max(mean_x, 1.0) ** 2:
+            return mean_y * audio_seconds / mean_x if mean_x > 0 else mean_y
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+        if slope <= 0:
+            return mean_y
+        return max(0.0, mean_y + slope * (audio_seconds - mean_x))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            samples = len(self._samples)
+        return {"samples": samples, "using_history": samples >= self.min_samples}
@@ -0,0 +1,176 @@
+import numpy as np
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterator, Tuple
+
+# エネルギー計算のフレーム長と、無音区間を探すための平滑化幅（ミリ秒）
+FRAME_MS = 20
+SMOOTH_MS = 200
+
+
+def frame_energies(samples: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """
+    モノラルのサンプル列をフレームに分け、フレームごとのRMSエネルギーを返します。
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    frame_count = len(samples) // frame_len
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[: frame_count * frame_len], dtype=np.float32).reshape(frame_count, frame_len)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def quietest_offset_ms(samples: np.ndarray, sample_rate: int, frame_ms: int = FRAME_MS, smooth_ms: int = SMOOTH_MS) -> int:
+    """
+    サンプル列の中で最も静かな位置（先頭からのミリ秒）を返します。
+    単発の無音フレームではなく息継ぎ程度の間を選ぶため、エネルギーを移動平均で平滑化してから最小値を探します。
+    """
+    energies = frame_energies(samples, sample_rate, frame_ms)
+    if energies.size == 0:
+        return int(len(samples) * 1000 / sample_rate) if sample_rate else 0
+    width = max(1, smooth_ms // frame_ms)
+    if width > 1 and energies.size >= width:
+        energies = np.convolve(energies, np.ones(width, dtype=np.float32) / width, mode="same")
+    return int(np.argmin(energies)) * frame_ms + frame_ms // 2
+
+
+def iter_split_points(
+    total_ms: int,
+    target_ms: int,
+    search_window_ms: int,
+    read_window: Callable[[int, int], Tuple[np.ndarray, int]],
+) -> Iterator[Tuple[int, int]]:
+    """
+    分割区間 (開始ms, 終了ms) を先頭から順に返します。
+    各境界は「直前の境界 + target_ms」の手前 search_window_ms の範囲で最も静かな位置に置かれるため、
+    チャンクの長さが target_ms を超えることはありません。
+    read_window(開始ms, 長さms) は、その範囲のモノラルサンプル列とサンプルレートを返す関数です。
+    """
+    search_window_ms = min(search_window_ms, target_ms // 2)
+    start_ms = 0
+    while total_ms - start_ms > target_ms:
+        target = start_ms + target_ms
+        window_start = target - search_window_ms
+        samples, sample_rate = read_window(window_start, search_window_ms)
+        if len(samples) == 0:
+            end_ms = target
+        else:
+            end_ms = min(target, window_start + quietest_offset_ms(samples, sample_rate))
+        yield start_ms, end_ms
+        start_ms = end_ms
+    if total_ms > start_ms:
+        yield start_ms, total_ms
+
+
+def speech_regions(
+    energies: np.ndarray,
+    frame_len: int,
+    total_samples: int,
+    threshold: float,
+    min_silence_frames: int,
+    padding_frames: int,
+) -> list[Tuple[int, int]]:
+    """
+    フレームごとのRMSエネルギーから、残す区間 (開始サンプル, 終了サンプル) のリストを返します。
+    threshold 未満のフレームが min_silence_frames 以上続く区間を無音とみなし、前後に padding_frames ずつ残して取り除きます
+    （音声の先頭・末尾の無音は余白を残さずに取り除きます）。
+    取り除く区間がない場合は全体を1区間として返します。
+    """
+    silent = np.concatenate(([False], energies < threshold, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    long_enough = ends - starts >= max(min_silence_frames, 2 * padding_frames + 1)
+    starts, ends = starts[long_enough], ends[long_enough]
+    cut_starts = (starts + padding_frames) * frame_len
+    cut_ends = (ends - padding_frames) * frame_len
+    # 先頭・末尾の無音には余白を残さない（末尾はフレームに満たない端数のサンプルもまとめて取り除く）
+    cut_starts[starts == 0] = 0
+    cut_ends[ends == energies.size] = total_samples
+    keep_starts = np.concatenate(([0], cut_ends))
+    keep_ends = np.concatenate((cut_starts, [total_samples]))
+    return [(int(start), int(end)) for start, end in zip(keep_starts, keep_ends) if end > start]
+
+
+class TimeRemap:
+    """
+    無音を取り除いた音声の時刻を、元の音声の時刻に戻すための対応表です。
+    残した区間ごとに「詰めた音声での開始サンプル」と「元の音声での開始サンプル」を持ち、
+    時刻は二分探索で区間を引いてサンプル単位で変換するため、元の音声に対して誤差なく戻せます。
+    プロセス間・タスクキューで受け渡せるよう、to_dict / from_dict で整数のリストに変換できます。
+    """
+    def __init__(self, sample_rate: int, compacted_starts: list[int], original_starts: list[int],
+                 compacted_length: int, original_length: int):
+        self.sample_rate = sample_rate
+        self.compacted_starts = list(compacted_starts)
+        self.original_starts = list(original_starts)
+        self.compacted_length = compacted_length
+        self.original_length = original_length
+
+    @classmethod
+    def from_regions(cls, regions: list[Tuple[int, int]], sample_rate: int, original_length: int) -> "TimeRemap":
+        """
+        残した区間 (元の音声での開始サンプル, 終了サンプル) のリストから対応表を作ります。
+        """
+        compacted_starts, position = [], 0
+        for start, end in regions:
+            compacted_starts.append(position)
+            position += end - start
+        return cls(sample_rate, compacted_starts, [start for start, _ in regions], position, original_length)
+
+    @property
+    def compacted_seconds(self) -> float:
+        return self.compacted_length / self.sample_rate
+
+    @property
+    def original_seconds(self) -> float:
+        return self.original_length / self.sample_rate
+
+    @property
+    def saved_seconds(self) -> float:
+        return self.original_seconds - self.compacted_seconds
+
+    @property
+    def removed_regions(self) -> int:
+        """
+        取り除いた無音区間の数です（先頭・末尾の無音を含みます）。
+        """
+        if not self.original_starts:
+            return 0
+        leading = self.original_starts[0] > 0
+        trailing = self.original_starts[-1] + self.compacted_length - self.compacted_starts[-1] < self.original_length
+        return len(self.original_starts) - 1 + leading + trailing
+
+    def to_original(self, seconds: float, end: bool = False) -> float:
+        """
+        詰めた音声での時刻（秒）を、元の音声での時刻（秒）に変換します。
+        区間の継ぎ目にあたる時刻は、end が偽なら後ろの区間の開始、真なら前の区間の終了に変換します
+        （セグメントの開始・終了が取り除いた無音の中に入らないようにするため）。
+        """
+        position = min(max(seconds * self.sample_rate, 0.0), float(self.compacted_length))
+        search = bisect_left if end else bisect_right
+        index = max(search(self.compacted_starts, position) - 1, 0)
+        return (self.original_starts[index] + position - self.compacted_starts[index]) / self.sample_rate
+
+    def summary(self) -> Dict:
+        """
+        ジョブの結果に含める、無音の除去で短くなった長さの集計です。
+        """
+        return {
+            "original_seconds": round(self.original_seconds, 3),
+            "compacted_seconds": round(self.compacted_seconds, 3),
+            "saved_seconds": round(self.saved_seconds, 3),
+            "saved_minutes": round(self.saved_seconds / 60, 2),
+            "removed_regions": self.removed_regions,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "compacted_starts": self.compacted_starts,
+            "original_starts": self.original_starts,
+            "compacted_length": self.compacted_length,
+            "original_length": self.original_length,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TimeRemap":
+        return cls(**data)
@@ -0,0 +1,26 @@
+import os
+from pathlib import Path
+
+# 作業ディレクトリ・結果・キャッシュ・索引・タスクキューを置くディレクトリ
+# 複数のAPIノード・ワーカーで処理を分担する場合は、すべてのノードで同じ共有ストレージを指定する
+DATA_DIR = Path(os.getenv("OKOSHI_DATA_DIR", "."))
+
+# ジョブごとの作業ディレクトリ（アップロードされた音声・変換後のMP3・分割チャンク）
+WORK_ROOT = DATA_DIR / "processed_audio"
+# 文字起こし結果（テキストとセグメントの構造化データ）
+RESULTS_DIR = DATA_DIR / "transcription_results"
+
+
+def to_shared(path: Path) -> str:
+    """
+    DATA_DIR からの相対パスを返します。ノードごとに共有ストレージのマウント先が違っても同じファイルを指せるよう、
+    タスクキューにはこの形式で記録します。
+    """
+    return Path(os.path.relpath(Path(path).resolve(), DATA_DIR.resolve())).as_posix()
+
+
+def from_shared(path: str) -> Path:
+    """
+    to_shared で記録したパスを、このノードでのパスに戻します。
+    """
+    return DATA_DIR / path
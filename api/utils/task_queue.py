@@ -0,0 +1,276 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from api.utils.rate_limiter import SqliteRateLimiter
+from api.utils.storage import DATA_DIR
+
+# タスクの種類
+PREPARE_TASK = "prepare"  # 検証・長さ取得・エンコード計画・分割。チャンクごとの transcribe タスクを登録する
+TRANSCRIBE_TASK = "transcribe"  # 1チャンクの文字起こし
+
+# 同時に待っている場合は、処理中のジョブを先に終わらせるためチャンクの文字起こしを優先する
+TASK_PRIORITIES = {TRANSCRIBE_TASK: 1, PREPARE_TASK: 0}
+
+
+class Task:
+    """
+    タスクキューの1件のタスクです。payload・result はJSONで表せる辞書です。
+    status は pending（実行待ち）/ running（実行中）/ done（完了）/ failed（失敗）のいずれかです。
+    updated_at は最後に状態が変わった（実行中はリースを延長した）時刻（time.time()）です。
+    """
+    def __init__(self, id: int, job_id: str, kind: str, payload: Dict, status: str, attempts: int,
+                 result: Optional[Dict] = None, error: Optional[str] = None, updated_at: Optional[float] = None):
+        self.id = id
+        self.job_id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.status = status
+        self.attempts = attempts
+        self.result = result
+        self.error = error
+        self.updated_at = updated_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def __repr__(self) -> str:
+        return f"Task({self.id}, {self.kind}, job={self.job_id}, status={self.status})"
+
+
+class TaskQueue:
+    """
+    APIノードとワーカーをつなぐ永続的なタスクキューの共通インターフェースです。
+
+    - APIノードはジョブごとに put でタスクを登録し、tasks / results で進み具合と結果を確認します
+    - ワーカーは claim でタスクを1件ずつ取り出し、実行中は renew でリース（lease_seconds）を延長し、
+      complete / fail で結果を記録します
+    - リースが切れたタスク（ワーカーの異常終了など）は、max_attempts 回まで他のワーカーが取り出し直します
+    """
+    def put(self, job_id: str, kind: str, payload: Dict) -> int:
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, kinds: Iterable[str], lease_seconds: float) -> Optional[Task]:
+        raise NotImplementedError
+
+    def renew(self, task_ids: Iterable[int], worker_id: str, lease_seconds: float):
+        raise NotImplementedError
+
+    def complete(self, task_id: int, worker_id: str, result: Dict):
+        raise NotImplementedError
+
+    def fail(self, task_id: int, worker_id: str, error: str):
+        raise NotImplementedError
+
+    def tasks(self, job_id: str) -> List[Task]:
+        """
+        ジョブのタスクを登録順に返します（結果は含みません）。
+        """
+        raise NotImplementedError
+
+    def results(self, task_ids: Iterable[int]) -> Dict[int, Dict]:
+        raise NotImplementedError
+
+    def purge(self, job_id: str):
+        """
+        ジョブのタスクをすべて削除します（実行待ちのタスクは取り消されます）。
+        """
+        raise NotImplementedError
+
+    def purge_stale(self, max_age_seconds: float) -> int:
+        """
+        max_age_seconds 以上更新されていないタスク（APIノードが異常終了して取り残されたジョブなど）を削除します。
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+    def last_worker_activity(self) -> Optional[float]:
+        """
+        いずれかのワーカーが最後にタスクを取り出し・延長・完了した時刻（time.time()）を返します。記録がなければ None です。
+        """
+        raise NotImplementedError
+
+    def create_rate_limiter(self, requests_per_minute: float, burst: int = None):
+        """
+        このキューを共有するすべてのプロセスで1つの上限になるレート制限（AsyncRateLimiter と同じインターフェース）を返します。
+        """
+        raise NotImplementedError
+
+
+class SqliteTaskQueue(TaskQueue):
+    """
+    SQLiteのファイルを使うタスクキューです。追加のサーバなしで動作し、
+    同じファイルを共有するすべてのプロセス（同じマシン上、または共有ストレージ上の複数のマシン）で1つのキューになります。
+    タスクの取り出しは書き込みトランザクション（BEGIN IMMEDIATE）で行うため、同じタスクを2つのワーカーが取り出すことはありません。
+    """
+    def __init__(self, path: str = None, max_attempts: int = None):
+        self.path = Path(path or os.getenv("OKOSHI_QUEUE_PATH") or DATA_DIR / "task_queue" / "tasks.sqlite3")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts or int(os.getenv("OKOSHI_TASK_MAX_ATTEMPTS", "3"))
+        self._lock = threading.Lock()
+        # 他のプロセスが書き込み中の場合は、timeout 秒までロックの解放を待つ
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, priority, id);
+            CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id, id);
+            """
+        )
+
+    def _write(self, statement: str, args: tuple = ()) -> tuple[int, int]:
+        """
+        1文を実行し、(追加した行のID, 変更した行数) を返します。
+        """
+        with self._lock:
+            cursor = self._conn.execute(statement, args)
+            return cursor.lastrowid, cursor.rowcount
+
+    def put(self, job_id: str, kind: str, payload: Dict) -> int:
+        now = time.time()
+        task_id, _ = self._write(
+            "INSERT INTO tasks (job_id, kind, payload, priority, status, created_at, updated_at) VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), TASK_PRIORITIES.get(kind, 0), now, now),
+        )
+        return task_id
+
+    def claim(self, worker_id: str, kinds: Iterable[str], lease_seconds: float) -> Optional[Task]:
+        kinds = list(kinds)
+        if not kinds:
+            return None
+        placeholders = ", ".join("?" for _ in kinds)
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT id, job_id, kind, payload, attempts FROM tasks"
+                        f" WHERE kind IN ({placeholders})"
+                        " AND (status = 'pending' OR (status = 'running' AND lease_until < ?))"
+                        " ORDER BY priority DESC, id LIMIT 1",
+                        (*kinds, now),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    task_id, job_id, kind, payload, attempts = row
+                    if attempts >= self.max_attempts:
+                        # 取り出したワーカーが何度も応答しなくなったタスクは、それ以上再実行しない
+                        self._conn.execute(
+                            "UPDATE tasks SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                            (f"ワーカーが応答しなくなりました（{attempts}回）", now, task_id),
+                        )
+                        continue
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?"
+                        " WHERE id = ?",
+                        (worker_id, now + lease_seconds, now, task_id),
+                    )
+                    self._conn.execute("COMMIT")
+                    return Task(task_id, job_id, kind, json.loads(payload), "running", attempts + 1)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def renew(self, task_ids: Iterable[int], worker_id: str, lease_seconds: float):
+        now = time.time()
+        for task_id in task_ids:
+            self._write(
+                "UPDATE tasks SET lease_until = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (now + lease_seconds, now, task_id, worker_id),
+            )
+
+    def complete(self, task_id: int, worker_id: str, result: Dict):
+        # リースが切れて他のワーカーに渡ったタスクの結果は記録しない
+        self._write(
+            "UPDATE tasks SET status = 'done', result = ?, lease_until = NULL, updated_at = ?"
+            " WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False, default=str), time.time(), task_id, worker_id),
+        )
+
+    def fail(self, task_id: int, worker_id: str, error: str):
+        self._write(
+            "UPDATE tasks SET status = 'failed', error = ?, lease_until = NULL, updated_at = ?"
+            " WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, time.time(), task_id, worker_id),
+        )
+
+    def tasks(self, job_id: str) -> List[Task]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, job_id, kind, payload, status, attempts, error, updated_at FROM tasks WHERE job_id = ? ORDER BY id",
+                (job_id,),
+            ).fetchall()
+        return [
+            Task(task_id, row_job_id, kind, json.loads(payload), status, attempts, error=error, updated_at=updated_at)
+            for task_id, row_job_id, kind, payload, status, attempts, error, updated_at in rows
+        ]
+
+    def results(self, task_ids: Iterable[int]) -> Dict[int, Dict]:
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in task_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, result FROM tasks WHERE id IN ({placeholders}) AND result IS NOT NULL", task_ids
+            ).fetchall()
+        return {task_id: json.loads(result) for task_id, result in rows}
+
+    def purge(self, job_id: str):
+        self._write("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+
+    def purge_stale(self, max_age_seconds: float) -> int:
+        _, removed = self._write("DELETE FROM tasks WHERE updated_at < ?", (time.time() - max_age_seconds,))
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status").fetchall()
+        stats: Dict[str, Dict[str, int]] = {}
+        for kind, status, count in rows:
+            stats.setdefault(kind, {})[status] = count
+        return stats
+
+    def last_worker_activity(self) -> Optional[float]:
+        # 実行待ちのタスクの updated_at は登録した時刻のため含めない
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(updated_at) FROM tasks WHERE status != 'pending'").fetchone()
+        return row[0]
+
+    def create_rate_limiter(self, requests_per_minute: float, burst: int = None) -> SqliteRateLimiter:
+        # トークンバケットはキューと同じファイルに置く（キューを共有するプロセスは必ずこのファイルも共有している）
+        return SqliteRateLimiter(str(self.path), requests_per_minute, burst=burst)
+
+
+def create_task_queue() -> TaskQueue:
+    """
+    OKOSHI_TASK_QUEUE の設定からタスクキューを作ります（既定: sqlite）。
+    """
+    kind = os.getenv("OKOSHI_TASK_QUEUE", "sqlite").lower()
+    if kind == "sqlite":
+        return SqliteTaskQueue()
+    raise ValueError(f"OKOSHI_TASK_QUEUE の値が不正です: {kind}（sqlite）")
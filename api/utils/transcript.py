@@ -0,0 +1,158 @@
+import json
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+# 出力できる形式: 形式名 → (拡張子, MIMEタイプ)
+FORMATS = {
+    "txt": (".txt", "text/plain"),
+    "srt": (".srt", "application/x-subrip; charset=utf-8"),
+    "vtt": (".vtt", "text/vtt"),
+    "json": (".json", "application/json"),
+}
+
+# 文字起こしに失敗した区間のセグメントに入れる文字列
+FAILED_SEGMENT_TEXT = "[文字起こし失敗]"
+
+# 結果のテキストファイルと並べて保存する、セグメントの構造化データの拡張子
+STRUCTURED_SUFFIX = ".segments.json"
+
+
+def structured_path(text_path: Path) -> Path:
+    """
+    結果のテキストファイル（{名前}.txt）に対応する構造化データのパス（{名前}.segments.json）を返します。
+    """
+    return text_path.with_name(text_path.stem + STRUCTURED_SUFFIX)
+
+
+def _split_seconds(seconds: float) -> tuple[int, int, int, int]:
+    milliseconds = max(0, int(round(seconds * 1000)))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return hours, minutes, secs, milliseconds
+
+
+def format_clock(seconds: float) -> str:
+    """
+    テキスト形式の時刻（1時間未満は mm:ss、1時間以上は h:mm:ss）を返します。
+    """
+    hours, minutes, secs, _ = _split_seconds(int(seconds))
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def format_timestamp(seconds: float, separator: str) -> str:
+    """
+    字幕形式の時刻（hh:mm:ss,mmm / hh:mm:ss.mmm）を返します。
+    """
+    hours, minutes, secs, milliseconds = _split_seconds(seconds)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+class Transcript:
+    """
+    文字起こし結果のセグメント（元音声の時間軸での開始・終了秒とテキスト）を列ごとに保持します。
+    開始・終了・失敗フラグは array に詰めて持つため、セグメント数が多くても1件あたりのメモリは小さく済みます。
+    テキスト・SRT・WebVTT・JSONの各形式は、必要になった時点でこのデータから生成します。
+    """
+    __slots__ = ("starts", "ends", "failed", "texts", "language", "duration")
+
+    def __init__(self, language: Optional[str] = None, duration: float = 0.0):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.failed = array("b")
+        self.texts: list[str] = []
+        self.language = language
+        self.duration = duration
+
+    def append(self, start: float, end: float, text: str, failed: bool = False):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.failed.append(1 if failed else 0)
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[tuple[float, float, str, bool]]:
+        return zip(self.starts, self.ends, self.texts, map(bool, self.failed))
+
+    def to_dict(self) -> Dict:
+        """
+        列ごとの配列で表した辞書を返します（キャッシュ・保存用）。
+        """
+        return {
+            "language": self.language,
+            "duration": self.duration,
+            "start": [round(value, 3) for value in self.starts],
+            "end": [round(value, 3) for value in self.ends],
+            "text": self.texts,
+            "failed": [index for index, flag in enumerate(self.failed) if flag],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Transcript":
+        transcript = cls(language=data.get("language"), duration=data.get("duration") or 0.0)
+        transcript.starts.extend(data.get("start") or [])
+        transcript.ends.extend(data.get("end") or [])
+        transcript.texts.extend(data.get("text") or [])
+        transcript.failed.extend([0] * len(transcript.texts))
+        for index in data.get("failed") or []:
+            transcript.failed[index] = 1
+        return transcript
+
+    def segment_lines(self) -> Iterator[str]:
+        """
+        テキスト形式の「[開始 - 終了] テキスト」の行を返します。
+        """
+        for start, end, text, _ in self:
+            yield f"[{format_clock(start)} - {format_clock(end)}] {text}"
+
+    def to_srt(self) -> str:
+        blocks = [
+            f"{number}\n{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n{text}\n"
+            for number, (start, end, text, _) in enumerate(self, start=1)
+        ]
+        return "\n".join(blocks)
+
+    def to_vtt(self) -> str:
+        blocks = ["WEBVTT\n"]
+        blocks.extend(
+            f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n"
+            for start, end, text, _ in self
+        )
+        return "\n".join(blocks)
+
+    def to_text(self) -> str:
+        return "\n".join(self.segment_lines())
+
+    def export(self, format_name: str, metadata: Dict = None) -> str:
+        """
+        format_name（FORMATS のいずれか）の形式で出力します。metadata はJSON形式にのみ含めます。
+        """
+        if format_name == "srt":
+            return self.to_srt()
+        if format_name == "vtt":
+            return self.to_vtt()
+        if format_name == "json":
+            return self.to_json(metadata)
+        if format_name == "txt":
+            return self.to_text()
+        raise ValueError(f"対応していない形式です: {format_name}")
+
+    def to_json(self, metadata: Dict = None) -> str:
+        return json.dumps(
+            {
+                **(metadata or {}),
+                "language": self.language,
+                "duration": round(self.duration, 3),
+                "segments": [
+                    {"start": round(start, 3), "end": round(end, 3), "text": text, "failed": failed}
+                    for start, end, text, failed in self
+                ],
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
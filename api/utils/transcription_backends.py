@@ -0,0 +1,226 @@
+import asyncio
+import io
+import os
+import threading
+from typing import Dict, List, Optional
+
+import openai
+
+from api.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class BackendConfigurationError(Exception):
+    """
+    バックエンドを利用できない設定（APIキー未設定・ライブラリ未導入など）の場合に送出されます。再試行はしません。
+    """
+    pass
+
+
+class TranscriptionResponse:
+    """
+    バックエンドによらない文字起こし結果（全文・言語・音声長・タイムスタンプ付きセグメント）です。
+    """
+    def __init__(self, text: str, language: Optional[str], duration: Optional[float], segments: List[Dict]):
+        self.text = text
+        self.language = language
+        self.duration = duration
+        self.segments = segments
+
+
+class TranscriptionBackend:
+    """
+    文字起こしバックエンドの共通インターフェースです。WhisperService はこのインターフェースを通して呼び出します。
+
+    - name: メトリクス・ログに使う名前
+    - model: キャッシュキーに使うモデル名（モデルが違えば結果も違うため）
+    - rate_limited: True の場合、WhisperService のレート制限（WHISPER_RPM）を適用する
+    """
+    name = ""
+    rate_limited = False
+
+    @property
+    def model(self) -> str:
+        raise NotImplementedError
+
+    async def transcribe(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        raise NotImplementedError
+
+    def is_retryable(self, error: Exception) -> bool:
+        return False
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        """
+        エラーがレート制限（429）によるものかどうかを返します。ハイブリッド構成ではローカルへ振り替える合図になります。
+        """
+        return False
+
+    def retry_after(self, error: Exception) -> Optional[float]:
+        return None
+
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """
+    OpenAI Whisper API（audio.transcriptions）を使うバックエンドです。
+    APIキーが設定されていなくても生成はでき、呼び出した時点で BackendConfigurationError になります。
+    """
+    name = "openai"
+    rate_limited = True
+
+    def __init__(self, api_key: str = None, model: str = None):
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._model = model or os.getenv("WHISPER_MODEL", "whisper-1")
+        # 非同期クライアント（OPENAI_BASE_URLが設定されていればその接続先を使用）
+        # 再試行は WhisperService で制御するため、クライアント側の自動再試行は無効にする
+        self.client = openai.AsyncOpenAI(api_key=api_key, max_retries=0) if api_key else None
+        if self.client is None:
+            logger.warning("OPENAI_API_KEY is not set; OpenAI transcription requests will fail", extra={"event": "openai_key_missing"})
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    async def transcribe(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        if self.client is None:
+            raise BackendConfigurationError("OpenAI API キーが設定されていません")
+        response = await self.client.audio.transcriptions.create(
+            model=self._model,
+            file=(filename, audio_bytes),
+            language=language,
+            response_format="verbose_json",  # タイムスタンプ付きで取得
+            temperature=0.0  # より一貫した結果のため
+        )
+        return TranscriptionResponse(
+            text=response.text,
+            language=response.language,
+            duration=response.duration,
+            segments=[
+                {"start": segment.start, "end": segment.end, "text": segment.text}
+                for segment in (getattr(response, "segments", None) or [])
+            ],
+        )
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in (408, 409, 429) or error.status_code >= 500
+        return False
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        return isinstance(error, openai.RateLimitError)
+
+    def retry_after(self, error: Exception) -> Optional[float]:
+        """
+        APIの応答ヘッダ（retry-after-ms / retry-after）から待機秒数を取得します。
+        """
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            return None
+        return None
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    faster-whisper（CTranslate2）でCPU上で文字起こしするバックエンドです（`pip install faster-whisper` が必要）。
+
+    - モデルは最初の呼び出し時に1回だけ読み込み、同じ設定のバックエンド・すべてのジョブで共有します
+    - 既定では int8 量子化したモデルを使い、1チャンク内の音声区間をまとめて（batch_size 件ずつ）推論します
+    - CPUを使い切らないよう、同時に推論するチャンク数は max_concurrency（OKOSHI_LOCAL_CONCURRENCY）までです
+    """
+    name = "local"
+    rate_limited = False
+
+    _models: Dict[tuple, object] = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, model_size: str = None, compute_type: str = None, cpu_threads: int = None,
+                 batch_size: int = None, max_concurrency: int = None):
+        self.model_size = model_size or os.getenv("OKOSHI_LOCAL_MODEL", "small")
+        self.compute_type = compute_type or os.getenv("OKOSHI_LOCAL_COMPUTE_TYPE", "int8")
+        self.cpu_threads = cpu_threads or int(os.getenv("OKOSHI_LOCAL_CPU_THREADS", "0")) or os.cpu_count() or 1
+        self.batch_size = batch_size or int(os.getenv("OKOSHI_LOCAL_BATCH_SIZE", "8"))
+        self.max_concurrency = max_concurrency or int(os.getenv("OKOSHI_LOCAL_CONCURRENCY", "1"))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def model(self) -> str:
+        return f"faster-whisper-{self.model_size}-{self.compute_type}"
+
+    def _load_pipeline(self):
+        """
+        共有のモデル（と一括推論用のパイプライン）を返します。まだ読み込んでいなければ読み込みます。
+        """
+        key = (self.model_size, self.compute_type, self.cpu_threads)
+        with self._models_lock:
+            if key not in self._models:
+                try:
+                    import faster_whisper
+                except ImportError:
+                    raise BackendConfigurationError(
+                        "ローカルの文字起こしには faster-whisper が必要です（pip install faster-whisper）"
+                    )
+                logger.info(
+                    "loading local whisper model",
+                    extra={"event": "local_model_load", "model": self.model_size, "compute_type": self.compute_type},
+                )
+                model = faster_whisper.WhisperModel(
+                    self.model_size, device="cpu", compute_type=self.compute_type, cpu_threads=self.cpu_threads
+                )
+                # 一括推論（BatchedInferencePipeline）は faster-whisper 1.0 以降にある
+                batched = getattr(faster_whisper, "BatchedInferencePipeline", None)
+                self._models[key] = (batched(model=model), True) if batched is not None else (model, False)
+            return self._models[key]
+
+    def _transcribe_sync(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        pipeline, batched = self._load_pipeline()
+        options = {"language": language, "temperature": 0.0}
+        if batched:
+            options["batch_size"] = self.batch_size
+        # ファイルオブジェクトを渡すと、faster-whisper（PyAV）がメモリ上でデコードする
+        segments, info = pipeline.transcribe(io.BytesIO(audio_bytes), **options)
+        # segments は推論を進めるジェネレータのため、このスレッド内で最後まで読み切る
+        segments = [
+            {"start": segment.start, "end": segment.end, "text": segment.text}
+            for segment in segments
+        ]
+        return TranscriptionResponse(
+            text="".join(segment["text"] for segment in segments).strip(),
+            language=info.language,
+            duration=info.duration,
+            segments=segments,
+        )
+
+    async def transcribe(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            # 推論はCPUを長時間使うため、イベントループを止めないようスレッドで実行する
+            return await asyncio.to_thread(self._transcribe_sync, filename, audio_bytes, language)
+
+
+def create_backends(api_key: str = None) -> tuple[TranscriptionBackend, Optional[TranscriptionBackend]]:
+    """
+    OKOSHI_TRANSCRIPTION_BACKEND の設定から (主バックエンド, 振り替え先のバックエンド) を作ります。
+
+    - openai（既定）: OpenAI Whisper APIのみ
+    - local: ローカルのfaster-whisperのみ（API料金がかからず、オフラインでも動作）
+    - hybrid: OpenAI Whisper APIを使い、レート制限に達している間のチャンクはローカルで処理
+    """
+    mode = os.getenv("OKOSHI_TRANSCRIPTION_BACKEND", "openai").lower()
+    if mode == "local":
+        return LocalWhisperBackend(), None
+    if mode == "hybrid":
+        return OpenAIWhisperBackend(api_key), LocalWhisperBackend()
+    if mode != "openai":
+        raise ValueError(f"OKOSHI_TRANSCRIPTION_BACKEND の値が不正です: {mode}（openai / local / hybrid）")
+    return OpenAIWhisperBackend(api_key), None
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from api.utils.storage import DATA_DIR
+
+
+class TranscriptionCache:
+    """
+    音声データのハッシュをキーにした、文字起こし結果の永続キャッシュ（SQLite）です。
+
+    - ファイル単位: アップロード全体のハッシュ + 言語 + モデル → 結合済みの結果
+    - チャンク単位: チャンク音声のハッシュ + 言語 + モデル → チャンクの文字起こし結果
+
+    エントリは最終アクセスから max_age_days を過ぎるか、合計サイズが max_mb を超えた場合に
+    古いものから削除されます。
+    """
+    LEVELS = ("file", "chunk")
+
+    def __init__(self, cache_dir: str = None, max_mb: float = None, max_age_days: float = None):
+        self.cache_dir = Path(cache_dir or os.getenv("OKOSHI_CACHE_DIR") or DATA_DIR / "transcription_cache")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int((max_mb or float(os.getenv("OKOSHI_CACHE_MAX_MB", "512"))) * 1024 * 1024)
+        self.max_age_seconds = (max_age_days or float(os.getenv("OKOSHI_CACHE_MAX_AGE_DAYS", "30"))) * 86400
+        self.counters = {f"{level}_{kind}": 0 for level in self.LEVELS for kind in ("hits", "misses")}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.cache_dir / "cache.sqlite3", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                level TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (level, key)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(audio_hash: str, language: str, model: str) -> str:
+        """
+        音声のハッシュ・言語・モデルからキャッシュキーを作ります。
+        """
+        return hashlib.sha256(f"{audio_hash}:{language}:{model}".encode()).hexdigest()
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, level: str, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, last_access FROM entries WHERE level = ? AND key = ?", (level, key)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self.counters[f"{level}_misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE level = ? AND key = ?", (now, level, key)
+            )
+            self._conn.commit()
+            self.counters[f"{level}_hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, level: str, key: str, value: Dict):
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (level, key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (level, key, data, len(data.encode()), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        # 期限切れのエントリを削除し、合計サイズが上限を超えていれば最終アクセスの古い順に削除する
+        self._conn.execute("DELETE FROM entries WHERE last_access < ?", (now - self.max_age_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for level, key, size in self._conn.execute(
+            "SELECT level, key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            self._conn.execute("DELETE FROM entries WHERE level = ? AND key = ?", (level, key))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict:
+        """
+        ヒット/ミスの回数と、レベルごとのエントリ数・サイズを返します。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT level, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY level"
+            ).fetchall()
+        usage = {level: {"entries": 0, "bytes": 0} for level in self.LEVELS}
+        for level, count, size in rows:
+            usage[level] = {"entries": count, "bytes": size}
+        return {**self.counters, "usage": usage, "max_bytes": self.max_bytes}
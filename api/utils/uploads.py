@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from api.utils.audio_utils import SNIFF_HEADER_BYTES, FileTooLargeError, sniff_audio_format
+from api.utils.log import get_logger
+from api.utils.metrics import BYTES_PROCESSED
+
+logger = get_logger(__name__)
+
+# 先頭から順に読めば最後まで受信しなくてもデコードできる形式
+# （MP4/M4Aは再生に必要な情報がファイル末尾にあることが多く、WMAはヘッダの後にインデックスを参照するため含めない）
+STREAMABLE_FORMATS = {"wav", "mp3", "webm", "mpeg", "mpegts"}
+
+# Content-Range: bytes {開始}-{終了}/{全体}（全体は * でもよい）
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+class UploadOffsetError(ValueError):
+    """
+    PUT された範囲の開始位置が、受信済みのバイト数（offset）と一致しない場合に送出されます。
+    クライアントは offset から送り直します。
+    """
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadAbortedError(Exception):
+    """
+    受信中のアップロードが中止された（DELETE・期限切れ）場合に、読み出し側へ送出されます。
+    """
+    pass
+
+
+def parse_content_range(header: Optional[str]) -> tuple[int, Optional[int], Optional[int]]:
+    """
+    Content-Range ヘッダを (開始, 終了, 全体) に変換します。終了・全体が省略できない形式のみ受け付けます。
+    """
+    match = CONTENT_RANGE_PATTERN.match((header or "").strip())
+    if match is None:
+        raise ValueError("Content-Range ヘッダの形式が不正です（例: bytes 0-1048575/5000000）")
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == "*" else int(total)
+
+
+class UploadSession:
+    """
+    再開可能なアップロード1件の状態です。受信したバイト列はジョブの作業ディレクトリの {ファイル名}.part に
+    先頭から順に追記され、offset（受信済みのバイト数）までの内容は確定しています。
+    すべて受信して complete すると {ファイル名} に置き換えられます。
+
+    受信中のファイルは open_reader() で先頭から読み出せます。読み出し側は受信済みの範囲を読み切ると
+    続きが届くまで待つため、アップロードの完了を待たずにデコードを始められます。
+    """
+    def __init__(self, upload_id: str, user: str, filename: str, size: int, path: Path):
+        self.id = upload_id
+        self.user = user
+        self.filename = filename
+        self.size = size
+        self.path = path
+        self.partial_path = path.with_name(path.name + ".part")
+        self.offset = 0
+        self.format: Optional[str] = None
+        self.completed = False
+        self.aborted = False
+        # アップロードの完了を待たずに処理を始めたか
+        self.started = False
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.completed_at: Optional[float] = None
+        self._hasher = hashlib.sha256()
+        self._condition = threading.Condition()
+        # 同じアップロードへのPUTは1件ずつ受け付ける（再送と、切断された前回のPUTが重なる場合など）
+        self._writing = asyncio.Lock()
+        self.partial_path.parent.mkdir(parents=True, exist_ok=True)
+        self.partial_path.touch()
+
+    @property
+    def streamable(self) -> bool:
+        return self.format in STREAMABLE_FORMATS
+
+    @property
+    def sha256(self) -> Optional[str]:
+        return self._hasher.hexdigest() if self.completed else None
+
+    async def append(self, start: int, chunks: AsyncIterator[bytes]) -> int:
+        """
+        start から始まるバイト列を追記し、受信済みのバイト数を返します。
+        途中で接続が切れた場合も、それまでに書き込んだ分は確定したものとして残ります。
+        """
+        async with self._writing:
+            if self.completed or self.aborted:
+                raise ValueError("このアップロードは終了しています。")
+            if start != self.offset:
+                raise UploadOffsetError(f"受信済みのバイト数（{self.offset}）から送信してください。", self.offset)
+            # 前回のPUTが書き込み途中で中断された場合に備え、確定した位置まで切り詰めてから追記する
+            with open(self.partial_path, "r+b") as f:
+                f.truncate(self.offset)
+                f.seek(self.offset)
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if self.offset + len(chunk) > self.size:
+                        raise FileTooLargeError(f"宣言されたサイズ（{self.size}バイト）を超えるデータが送信されました。")
+                    if self.format is None:
+                        self._sniff(f, chunk)
+                    await asyncio.to_thread(self._write, f, chunk)
+                    BYTES_PROCESSED.inc(len(chunk), kind="upload")
+            return self.offset
+
+    def _sniff(self, f, chunk: bytes):
+        """
+        受信済みの先頭部分と chunk をあわせて SNIFF_HEADER_BYTES バイト（ファイルがそれより短い場合は全体）そろえば形式を判定します。
+        PUTが短く区切られていても、そろうまでは判定を先送りします（そろうまでの先頭部分は判定前に書き込まれます）。
+        """
+        header = chunk
+        if self.offset:
+            f.seek(0)
+            header = f.read(self.offset) + chunk
+            f.seek(self.offset)
+        if len(header) < min(SNIFF_HEADER_BYTES, self.size):
+            return
+        self.format = sniff_audio_format(header[:SNIFF_HEADER_BYTES])
+        if self.format is None:
+            raise ValueError("音声ファイルとして認識できない形式です。")
+
+    def _write(self, f, chunk: bytes):
+        f.write(chunk)
+        f.flush()
+        with self._condition:
+            self._hasher.update(chunk)
+            self.offset += len(chunk)
+            self.updated_at = time.time()
+            self._condition.notify_all()
+
+    def complete(self) -> Path:
+        """
+        すべて受信したアップロードを確定し、保存先のパスを返します。
+        受信中のファイルを読み出している処理は、置き換え後も同じファイルを最後まで読み続けます。
+        """
+        if self.offset != self.size:
+            raise UploadOffsetError(f"まだ受信していないデータがあります（{self.offset} / {self.size}バイト）。", self.offset)
+        with self._condition:
+            if not self.completed:
+                os.replace(self.partial_path, self.path)
+                self.completed = True
+                self.completed_at = time.time()
+                self._condition.notify_all()
+        return self.path
+
+    def abort(self):
+        """
+        アップロードを中止します。受信中のファイルを読み出している処理には UploadAbortedError が送出されます。
+        """
+        with self._condition:
+            self.aborted = True
+            self._condition.notify_all()
+
+    def wait_for_data(self, position: int, timeout: float = None) -> bool:
+        """
+        position より先のデータが届くか、アップロードが完了するまで待ちます。
+        待つ必要がなくなった場合は True、timeout 秒待っても届かなかった場合は False を返します。
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.offset > position or self.completed or self.aborted, timeout
+            )
+
+    def open_reader(self) -> "UploadReader":
+        return UploadReader(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "upload_id": self.id,
+            "user": self.user,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "format": self.format,
+            "completed": self.completed,
+            "aborted": self.aborted,
+            "started": self.started,
+        }
+
+
+class UploadReader:
+    """
+    受信中のアップロードを先頭から読み出すファイル風のオブジェクトです（別スレッドから使います）。
+    read() は受信済みの範囲を返し、読み切った場合は続きが届くまで待ちます。アップロードの完了後に
+    最後まで読むと b"" を返し、中止された場合は UploadAbortedError を送出します。
+    """
+    def __init__(self, session: UploadSession):
+        self.session = session
+        self.position = 0
+        # complete による置き換えと重ならないよう、確定前後どちらの名前で開くかを状態と同時に決める
+        with session._condition:
+            self._file = open(session.path if session.completed else session.partial_path, "rb")
+
+    def read(self, size: int = 1024 * 1024) -> bytes:
+        while True:
+            if self.session.aborted:
+                raise UploadAbortedError("アップロードが中止されました。")
+            available = self.session.offset - self.position
+            if available > 0:
+                data = self._file.read(min(size, available))
+                self.position += len(data)
+                return data
+            if self.session.completed:
+                return b""
+            self.session.wait_for_data(self.position, timeout=1.0)
+
+    def close(self):
+        self._file.close()
+
+
+class UploadManager:
+    """
+    再開可能なアップロードを管理します。
+
+    1. create でアップロードを作成（ファイル名と全体のサイズを宣言）
+    2. append で受信済みのバイト数（offset）から続きを追記（接続が切れたら offset を確認して再送）
+    3. complete で確定
+
+    expire_seconds 秒以上データが届かない未完了のアップロードは expire_idle で中止され、
+    完了したアップロードも同じ時間が経つと管理対象から外れます。
+    アップロードの状態はこのプロセスのメモリに保持するため、サーバの再起動をまたいで再開することはできません。
+    """
+    def __init__(self, max_bytes: int, expire_seconds: float = None):
+        self.max_bytes = max_bytes
+        self.expire_seconds = expire_seconds or float(os.getenv("OKOSHI_UPLOAD_EXPIRE_HOURS", "24")) * 3600
+        self.sessions: Dict[str, UploadSession] = {}
+
+    def create(self, user: str, filename: str, size: int, work_dir: Path, upload_id: str = None) -> UploadSession:
+        if size <= 0:
+            raise ValueError("アップロードするファイルのサイズを指定してください。")
+        if size > self.max_bytes:
+            raise FileTooLargeError(f"ファイルサイズが上限（{self.max_bytes // (1024 * 1024)}MB）を超えています。")
+        session = UploadSession(upload_id or str(uuid.uuid4()), user, filename, size, Path(work_dir) / filename)
+        self.sessions[session.id] = session
+        logger.info(
+            "upload created",
+            extra={"event": "upload_created", "upload_id": session.id, "user": user, "audio_filename": filename, "bytes": size},
+        )
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        return self.sessions.get(upload_id)
+
+    def remove(self, upload_id: str):
+        self.sessions.pop(upload_id, None)
+
+    def expire_idle(self) -> list[UploadSession]:
+        """
+        データが expire_seconds 秒以上届いていない未完了のアップロードを中止し、管理対象から外します。
+        中止したアップロードのリストを返します。完了から expire_seconds 秒経ったアップロードも管理対象から外します。
+        """
+        deadline = time.time() - self.expire_seconds
+        for session in [session for session in self.sessions.values() if session.completed and session.completed_at < deadline]:
+            self.remove(session.id)
+        expired = [
+            session for session in self.sessions.values()
+            if not session.completed and not session.aborted and session.updated_at < deadline
+        ]
+        for session in expired:
+            session.abort()
+            self.remove(session.id)
+            logger.info("upload expired", extra={"event": "upload_expired", "upload_id": session.id, "offset": session.offset})
+        return expired
@@ -1,6 +1,8 @@
-import openai
+import contextlib
+import json
 import os
-from typing import List, Dict
+import random
+from typing import Any, Callable, List, Dict, Optional
 from pathlib import Path
 import asyncio
 import aiofiles
@@ -8,39 +10,148 @@ import time
 from datetime import datetime
 import uuid # uuidをインポート
 
+from api.utils.audio_utils import AudioChunk
+from api.utils.silence import TimeRemap
+from api.utils.transcription_cache import TranscriptionCache
+from api.utils.result_index import ResultIndex
+from api.utils.rate_limiter import AsyncRateLimiter, rate_limit_settings
+from api.utils.transcription_backends import TranscriptionBackend, TranscriptionResponse, create_backends
+from api.utils.transcript import FAILED_SEGMENT_TEXT, Transcript, format_clock, structured_path
+from api.utils.encoding_planner import WHISPER_MAX_UPLOAD_BYTES
+from api.utils.log import get_logger
+from api.utils.metrics import AUDIO_SECONDS_PROCESSED, BYTES_PROCESSED, WHISPER_REQUEST_DURATION, WHISPER_REQUESTS
+
+logger = get_logger(__name__)
+
 class WhisperService:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, max_concurrency: int = None, job_concurrency: int = None, cache: TranscriptionCache = None,
+                 backend: TranscriptionBackend = None, overflow_backend: TranscriptionBackend = None,
+                 result_index: ResultIndex = None, rate_limiter: AsyncRateLimiter = None):
         """
-        OpenAI Whisper APIサービスの初期化
+        文字起こしサービスの初期化
+
+        max_concurrency: プロセス全体で同時に実行する文字起こし呼び出し数の上限（WHISPER_MAX_CONCURRENCY）
+        job_concurrency: 1ジョブ（1ファイル）あたりの同時呼び出し数の上限（WHISPER_JOB_CONCURRENCY）
+        cache: チャンク単位の文字起こし結果キャッシュ（同じ音声のチャンクはAPIを呼ばずに結果を返す）
+        backend: 文字起こしに使うバックエンド（省略時は OKOSHI_TRANSCRIPTION_BACKEND の設定から作成）
+        overflow_backend: 主バックエンドがレート制限に達している間のチャンクを処理するバックエンド（ハイブリッド構成）
+        result_index: 保存した結果の一覧・全文検索用の索引（save_transcription_result で登録する）
+        rate_limiter: WHISPER_RPM のレート制限（省略時はプロセス内だけで共有する AsyncRateLimiter。
+                      複数のワーカーで共有する場合は TaskQueue.create_rate_limiter の結果を渡す）
+
+        失敗したチャンクは最大 WHISPER_MAX_RETRIES 回まで指数バックオフ（ジッター付き）で再試行し、
+        API呼び出しは WHISPER_RPM（1分あたりのリクエスト数）のレート制限を rate_limiter で共有します。
+        OpenAI APIキーが設定されていなくてもサービスは生成でき、APIを呼び出した時点でそのチャンクが失敗になります。
         """
-        if api_key:
-            openai.api_key = api_key
-        else:
-            # 環境変数から取得
-            openai.api_key = os.getenv("OPENAI_API_KEY")
-            
-        if not openai.api_key:
-            raise ValueError("OpenAI API キーが設定されていません")
+        if backend is None:
+            backend, overflow_backend = create_backends(api_key)
+        self.backend = backend
+        self.overflow_backend = overflow_backend
+        self.cache = cache
+        self.result_index = result_index
+
+        self.max_concurrency = max_concurrency or int(os.getenv("WHISPER_MAX_CONCURRENCY", "16"))
+        self.job_concurrency = job_concurrency or int(os.getenv("WHISPER_JOB_CONCURRENCY", "12"))
+        # サービスはプロセスごとに1つ生成されるため、このセマフォがプロセス全体の上限になる
+        self._process_semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.max_retries = int(os.getenv("WHISPER_MAX_RETRIES", "4"))
+        self.retry_base_delay = float(os.getenv("WHISPER_RETRY_BASE_SECONDS", "1.0"))
+        self.retry_max_delay = float(os.getenv("WHISPER_RETRY_MAX_SECONDS", "60"))
+        if rate_limiter is None:
+            requests_per_minute, burst = rate_limit_settings()
+            rate_limiter = AsyncRateLimiter(requests_per_minute, burst=burst)
+        self.rate_limiter = rate_limiter
+
+    @property
+    def model(self) -> str:
+        """
+        主バックエンドのモデル名（ファイル単位のキャッシュキーに使用）
+        """
+        return self.backend.model
+
+    def _select_backend(self) -> TranscriptionBackend:
+        """
+        次の呼び出しに使うバックエンドを返します。
+        振り替え先があり、主バックエンドのレート制限で待たされる状態であれば振り替え先を返します。
+        """
+        if self.overflow_backend is not None and self.backend.rate_limited and self.rate_limiter.would_wait():
+            return self.overflow_backend
+        return self.backend
+
+    def _cache_models(self) -> List[str]:
+        backends = [self.backend] + ([self.overflow_backend] if self.overflow_backend is not None else [])
+        return [backend.model for backend in backends]
     
-    async def transcribe_single_file(self, file_path: str, language: str = "ja") -> Dict:
+    async def transcribe_single_file(self, file_path: str, language: str = "ja", job_semaphore: asyncio.Semaphore = None) -> Dict:
         """
         単一ファイルの文字起こし
+        job_semaphoreが渡された場合は、プロセス全体の上限に加えてジョブ単位の上限も適用します。
+        AudioChunkが渡された場合は、チャンク番号と元音声での開始位置を結果に含めます。
+        ハイブリッド構成では、レート制限に達している間は待たずに振り替え先のバックエンドで処理します。
         """
+        chunk = file_path if isinstance(file_path, AudioChunk) else None
+        file_path = str(file_path)
+        attempt = 0
+        audio_hash = None
+        overflow = False
         try:
-            print(f"文字起こし開始: {file_path}")
-            start_time = time.time()
-            
-            with open(file_path, "rb") as audio_file:
-                # OpenAI Whisper APIを呼び出し
-                response = openai.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language=language,
-                    response_format="verbose_json",  # タイムスタンプ付きで取得
-                    temperature=0.0  # より一貫した結果のため
+            while True:
+                attempt += 1
+                # ジョブ単位の枠を先に取り、その後でプロセス全体の枠を取る。自分のジョブの上限で待っているチャンクが
+                # プロセス全体の枠を占有して、他のジョブのリクエストを止めることがないようにする。
+                # 音声も枠を得てから読み込むため、枠を待っているチャンクはメモリを使わない
+                async with (job_semaphore or contextlib.nullcontext()):
+                    # ファイル読み込みもイベントループをブロックしないよう非同期で行う
+                    async with aiofiles.open(file_path, "rb") as f:
+                        audio_bytes = await f.read()
+
+                    if self.cache is not None and audio_hash is None:
+                        # 同じ音声のチャンクが文字起こし済みであれば（どのバックエンドの結果でも）、APIを呼ばずにキャッシュから返す
+                        audio_hash = self.cache.hash_bytes(audio_bytes)
+                        for model in self._cache_models():
+                            cached = self.cache.get("chunk", self.cache.make_key(audio_hash, language, model))
+                            if cached is not None:
+                                logger.info("chunk transcription served from cache", extra={"event": "whisper_cache_hit", "file": file_path})
+                                return {
+                                    **cached,
+                                    "file_path": file_path,
+                                    "processing_time": 0,
+                                    "cached": True,
+                                    **self._chunk_metadata(chunk)
+                                }
+
+                    backend = self.overflow_backend if overflow else self._select_backend()
+                    if backend.rate_limited:
+                        # レート制限はすべてのジョブで共有する
+                        await self.rate_limiter.acquire()
+                    try:
+                        response, processing_time = await self._request_transcription(backend, file_path, audio_bytes, language)
+                        break
+                    except Exception as e:
+                        error = e
+                    finally:
+                        del audio_bytes
+
+                overflow = False
+                delay = self._retry_delay(backend, error, attempt)
+                if delay is None:
+                    raise error
+                if backend is self.backend and self.overflow_backend is not None and backend.is_rate_limit(error):
+                    # 主バックエンドは一時停止し、このチャンクは待たずに次の試行を振り替え先で処理する
+                    # （一時停止の状態によらず振り替えるため、同じ429を繰り返し受けることはない）
+                    overflow = True
+                    logger.info(
+                        "rate limited; overflowing to fallback backend",
+                        extra={"event": "whisper_overflow", "file": file_path, "backend": self.overflow_backend.name},
+                    )
+                    continue
+                logger.warning(
+                    "retrying transcription",
+                    extra={"event": "whisper_retry", "file": file_path, "attempt": attempt, "delay_seconds": round(delay, 2), "error": str(error)},
                 )
-            
-            processing_time = time.time() - start_time
+                # 待機中は同時実行枠を解放し、音声もメモリに保持しないため、他のチャンクの処理は止まらない
+                await asyncio.sleep(delay)
             
             result = {
                 "file_path": file_path,
@@ -48,35 +159,106 @@ class WhisperService:
                 "language": response.language,
                 "duration": response.duration,
                 "processing_time": processing_time,
-                "segments": getattr(response, 'segments', []),
+                "segments": response.segments,
                 "success": True,
-                "error": None
+                "error": None,
+                "attempts": attempt,
+                "backend": backend.name,
+                **self._chunk_metadata(chunk)
             }
             
-            print(f"文字起こし完了: {file_path} ({processing_time:.2f}秒)")
+            if self.cache is not None:
+                self.cache.put("chunk", self.cache.make_key(audio_hash, language, backend.model), {
+                    key: result[key] for key in ("text", "language", "duration", "segments", "success", "error")
+                })
+            
+            AUDIO_SECONDS_PROCESSED.inc(response.duration or 0)
             return result
             
         except Exception as e:
-            print(f"文字起こしエラー: {file_path}, {e}")
+            logger.error("transcription failed", extra={"event": "whisper_failed", "file": file_path, "attempts": attempt, "error": str(e)})
             return {
                 "file_path": file_path,
                 "text": "",
                 "success": False,
                 "error": str(e),
-                "processing_time": 0
+                "processing_time": 0,
+                "attempts": attempt,
+                **self._chunk_metadata(chunk)
             }
+
+    async def _request_transcription(self, backend: TranscriptionBackend, file_path: str, audio_bytes: bytes,
+                                     language: str) -> tuple[TranscriptionResponse, float]:
+        """
+        プロセス全体の同時実行数の上限内でバックエンドを1回呼び出し、(レスポンス, 処理時間) を返します。
+        ジョブ単位の上限は呼び出し元で先に取得します。
+        """
+        async with self._process_semaphore:
+            start_time = time.time()
+            outcome = "error"
+            try:
+                response = await backend.transcribe(Path(file_path).name, audio_bytes, language)
+                outcome = "success"
+                return response, time.time() - start_time
+            except Exception as e:
+                if backend.is_retryable(e):
+                    outcome = "retryable_error"
+                raise
+            finally:
+                elapsed = time.time() - start_time
+                WHISPER_REQUEST_DURATION.observe(elapsed, backend=backend.name, outcome=outcome)
+                WHISPER_REQUESTS.inc(backend=backend.name, outcome=outcome)
+                BYTES_PROCESSED.inc(len(audio_bytes), kind=f"{backend.name}_upload")
+                logger.info(
+                    "whisper request finished",
+                    extra={"event": "whisper_request", "file": file_path, "backend": backend.name, "outcome": outcome, "bytes": len(audio_bytes), "duration_seconds": round(elapsed, 3)},
+                )
+
+    def _retry_delay(self, backend: TranscriptionBackend, error: Exception, attempt: int) -> Optional[float]:
+        """
+        再試行までの待機秒数を返します。再試行しない場合はNoneを返します。
+        """
+        if attempt > self.max_retries or not backend.is_retryable(error):
+            return None
+        # 指数バックオフ（上限あり）に、同時に失敗したリクエストが揃って再送しないようジッターを加える
+        backoff = min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempt - 1)))
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        retry_after = backend.retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if backend.is_rate_limit(error):
+            # レート制限に達した場合は、他のジョブのリクエストも含めて全体を待たせる
+            self.rate_limiter.pause(delay)
+        return delay
+
+    @staticmethod
+    def _chunk_metadata(chunk: AudioChunk = None) -> Dict:
+        if chunk is None:
+            return {}
+        return {
+            "chunk_index": chunk.index,
+            "start_offset": chunk.start,
+            "chunk_duration": chunk.duration
+        }
     
-    async def transcribe_multiple_files(self, file_paths: List[str], language: str = "ja") -> List[Dict]:
+    async def transcribe_multiple_files(self, file_paths: List[str], language: str = "ja", max_concurrency: int = None,
+                                        on_chunk_done: Optional[Callable[[Any, Dict], None]] = None) -> List[Dict]:
         """
         複数ファイルの並列文字起こし
+        同時実行数はジョブ単位（max_concurrency、未指定時はjob_concurrency）とプロセス全体の両方で制限されます。
+        on_chunk_done(file_path, result) は各ファイルの文字起こしが終わるたびに呼び出されます。
         """
-        print(f"複数ファイルの文字起こし開始: {len(file_paths)}ファイル")
+
+        job_semaphore = asyncio.Semaphore(max_concurrency or self.job_concurrency)
+
+        async def transcribe(file_path):
+            result = await self.transcribe_single_file(file_path, language, job_semaphore=job_semaphore)
+            if on_chunk_done is not None:
+                on_chunk_done(file_path, result)
+            return result
         
         # 並列処理のタスクを作成
-        tasks = [
-            self.transcribe_single_file(file_path, language) 
-            for file_path in file_paths
-        ]
+        tasks = [transcribe(file_path) for file_path in file_paths]
         
         # 並列実行
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -85,128 +267,52 @@ class WhisperService:
         processed_results = []
         for i, result in enumerate(results):
             if isinstance(result, Exception):
+                chunk = file_paths[i] if isinstance(file_paths[i], AudioChunk) else None
                 processed_results.append({
-                    "file_path": file_paths[i],
+                    "file_path": str(file_paths[i]),
                     "text": "",
                     "success": False,
                     "error": str(result),
-                    "processing_time": 0
+                    "processing_time": 0,
+                    **self._chunk_metadata(chunk)
                 })
             else:
                 processed_results.append(result)
         
         return processed_results
     
-    def combine_transcriptions(self, transcription_results: List[Dict]) -> Dict:
+    def combine_transcriptions(self, transcription_results: List[Dict], remap: Optional[TimeRemap] = None) -> Dict:
         """
         複数の文字起こし結果を結合
         各ファイルのタイムスタンプを連続した時間に調整
+        無音を取り除いた音声の結果は、remap で元の音声の時刻に戻します。
         """
         try:
-            # 成功した結果のみを抽出
-            successful_results = [r for r in transcription_results if r.get("success", False)]
-            
-            if not successful_results:
-                return {
-                    "combined_text": "",
-                    "success": False,
-                    "error": "すべての文字起こしが失敗しました",
-                    "total_duration": 0,
-                    "total_processing_time": 0,
-                    "segment_count": 0,
-                    "combined_segments": []
-                }
-            
-            # ファイル名でソート（part_000, part_001... の順序を保持）
-            successful_results.sort(key=lambda x: x["file_path"])
-            
-            # テキストを結合
-            combined_text_parts = []
-            combined_segments_with_timestamps = []
-            total_duration = 0
-            total_processing_time = 0
-            segment_global_id = 0
-            
-            # 各ファイルは10分（600秒）の想定
-            file_duration = 600  # 10分 = 600秒
-            
-            for i, result in enumerate(successful_results):
-                text = result.get("text", "").strip()
-                if text:
-                    # セグメント番号を追加（デバッグ用）
-                    segment_header = f"\n--- セグメント {i+1} ---\n" if len(successful_results) > 1 else ""
-                    combined_text_parts.append(f"{segment_header}{text}")
-
-                # 現在のファイルの開始時間オフセット（秒）
-                time_offset = i * file_duration
-                
-                # Process segments for timestamped output
-                for segment in result.get("segments", []):
-                    # セグメントの元の時間を取得
-                    start_time = segment.start
-                    end_time = segment.end
-                    segment_text = segment.text.strip()
-                    
-                    # 全体の時間軸に調整
-                    adjusted_start = start_time + time_offset
-                    adjusted_end = end_time + time_offset
-                    
-                    # Format timestamp
-                    start_min = int(adjusted_start // 60)
-                    start_sec = int(adjusted_start % 60)
-                    end_min = int(adjusted_end // 60)
-                    end_sec = int(adjusted_end % 60)
-                    timestamp_str = f"[{start_min:02d}:{start_sec:02d} - {end_min:02d}:{end_sec:02d}]"
-                    
-                    combined_segments_with_timestamps.append(f"{timestamp_str} {segment_text}")
-                    segment_global_id += 1
-                
-                total_duration += result.get("duration", 0)
-                total_processing_time += result.get("processing_time", 0)
-            
-            combined_text = "\n\n".join(combined_text_parts)
-            
-            # 失敗したファイルの情報
-            failed_results = [r for r in transcription_results if not r.get("success", False)]
-            error_summary = ""
-            if failed_results:
-                error_summary = f"\n注意: {len(failed_results)}個のセグメントで文字起こしに失敗しました。"
-            
-            return {
-                "combined_text": combined_text,
-                "success": True,
-                "error": error_summary if error_summary else None,
-                "total_duration": total_duration,
-                "total_processing_time": total_processing_time,
-                "segment_count": segment_global_id,
-                "failed_count": len(failed_results),
-                "detailed_results": transcription_results,
-                "combined_segments": combined_segments_with_timestamps
-            }
+            # チャンク番号順に結合（チャンク番号がない結果は渡された順序を使用）
+            combiner = TranscriptionCombiner(remap=remap)
+            for position, result in enumerate(transcription_results):
+                combiner.add(result.get("chunk_index", position), result)
+            return combiner.finalize()
                     
         except Exception as e:
-            return {
-                "combined_text": "",
-                "success": False,
-                "error": f"結果の結合中にエラーが発生しました: {str(e)}",
-                "total_duration": 0,
-                "total_processing_time": 0,
-                "segment_count": 0,
-                "combined_segments": []
-            }
+            return TranscriptionCombiner.error_result(f"結果の結合中にエラーが発生しました: {str(e)}")
     
-    async def save_transcription_result(self, result: Dict, output_dir: str, user: str, original_filename: str) -> str:
+    async def save_transcription_result(self, result: Dict, output_dir: str, user: str, original_filename: str, job_id: str = None) -> str:
         """
         文字起こし結果をファイルに保存
         ファイル名をユーザー名、タイムスタンプ、UUIDを組み合わせた形式に変更
+        テキストファイルと並べて、セグメントの構造化データ（{名前}.segments.json）も保存します。
+        SRT・WebVTT・JSONでのダウンロードはこの構造化データから生成されます。
+        result_index があれば、結果の一覧・検索用の索引にも登録します。
         """
         try:
             # 出力ディレクトリを作成
             output_path = Path(output_dir)
-            output_path.mkdir(exist_ok=True)
+            output_path.mkdir(parents=True, exist_ok=True)
             
             # ファイル名を生成
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            saved_at = datetime.now()
+            timestamp = saved_at.strftime("%Y%m%d_%H%M%S")
             # 最も安全なのは、UUIDをベースにしたファイル名にすることです
             unique_id = str(uuid.uuid4())
             output_filename = f"transcription_{timestamp}_{unique_id}.txt" #
@@ -238,8 +344,8 @@ class WhisperService:
                 "------------------------------------"
             ])
 
-            for segment_line in result.get("combined_segments", []):
-                content_parts.append(segment_line)
+            transcript = result.get("transcript") or Transcript()
+            content_parts.extend(transcript.segment_lines())
             
             content_parts.extend([
                 "",
@@ -251,12 +357,30 @@ class WhisperService:
             # ファイルに保存
             async with aiofiles.open(output_file_path, 'w', encoding='utf-8') as f:
                 await f.write(content)
+            structured = {
+                "user": user,
+                "original_filename": original_filename,
+                "job_id": job_id,
+                "created_at": saved_at.isoformat(timespec="seconds"),
+                "transcript": transcript.to_dict(),
+            }
+            async with aiofiles.open(structured_path(output_file_path), 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(structured, ensure_ascii=False))
+
+            if self.result_index is not None:
+                # 索引への登録に失敗しても結果ファイルは保存済みのため、保存自体は成功とする（次回起動時に再登録される）
+                try:
+                    await asyncio.to_thread(
+                        self.result_index.add, output_file_path.stem, user, original_filename, output_filename, transcript,
+                        created_at=saved_at.timestamp(), job_id=job_id
+                    )
+                except Exception:
+                    logger.exception("failed to index transcription result", extra={"event": "index_failed", "file": str(output_file_path)})
             
-            print(f"文字起こし結果を保存しました: {output_file_path}")
             return str(output_file_path)
             
-        except Exception as e:
-            print(f"結果保存エラー: {e}")
+        except Exception:
+            logger.exception("failed to save transcription result", extra={"event": "save_failed"})
             return ""
     
     def get_api_usage_info(self) -> Dict:
@@ -264,8 +388,140 @@ class WhisperService:
         API使用状況の情報を取得
         """
         return {
-            "model": "whisper-1",
+            "model": self.model,
             "pricing_per_minute": 0.006,  # $0.006 per minute (2024年時点)
-            "max_file_size": "25MB",
+            "max_file_size": f"{WHISPER_MAX_UPLOAD_BYTES // (1024 * 1024)}MB",
             "supported_formats": ["mp3", "mp4", "mpeg", "mpga", "m4a", "wav", "webm"]
-        }
\ No newline at end of file
+        }
+
+
+class TranscriptionCombiner:
+    """
+    文字起こし結果をチャンク順に逐次結合します。
+    結果は完了した順に add でき、チャンク番号が連続した分から順に結合されます。
+    remap が渡された場合（無音を取り除いた音声の結果）、セグメントと失敗区間の時刻は元の音声の時刻に戻して記録します。
+    remap は最初の結果を add する前であれば後から設定できます。
+    """
+    def __init__(self, segment_duration: float = 600, remap: Optional[TimeRemap] = None):
+        # チャンクの既定の長さ（秒）。開始位置も長さも分からないチャンクのオフセット推定にのみ使用
+        self.segment_duration = segment_duration
+        self.remap = remap
+        self._next_offset = 0.0
+        self._pending: Dict[int, Dict] = {}
+        self._next_index = 0
+        self.results: List[Dict] = []
+        self.text_parts: List[tuple] = []
+        # 元音声の時間軸でのセグメント（失敗した区間を含む）
+        self.transcript = Transcript()
+        self.segment_count = 0
+        # 文字起こしに失敗した区間（元音声の時間軸）
+        self.gaps: List[Dict] = []
+        self.total_duration = 0
+        self.total_processing_time = 0
+        self.failed_count = 0
+
+    def add(self, index: int, result: Dict) -> List[Dict]:
+        """
+        index番目のチャンクの結果を追加し、新たに結合できた結果のリストを返します。
+        """
+        self._pending[index] = result
+        ready = []
+        while self._next_index in self._pending:
+            current = self._pending.pop(self._next_index)
+            self._append(self._next_index, current)
+            ready.append(current)
+            self._next_index += 1
+        return ready
+
+    def _append(self, index: int, result: Dict):
+        self.results.append(result)
+
+        # 現在のファイルの開始時間オフセット（秒）
+        # 分割時に記録した実際の開始位置を使い、ない場合は直前までのチャンクの長さから求める
+        time_offset = result.get("start_offset")
+        if time_offset is None:
+            time_offset = self._next_offset
+        self._next_offset = time_offset + (result.get("chunk_duration") or result.get("duration") or self.segment_duration)
+
+        if not result.get("success", False):
+            # 失敗した区間は省略せず、元音声の時間軸上の位置に明示する
+            self.failed_count += 1
+            gap_start, gap_end = self._to_original(time_offset), self._to_original(self._next_offset, end=True)
+            self.gaps.append({"index": index, "start": gap_start, "end": gap_end, "error": result.get("error")})
+            self.text_parts.append((index, f"[この区間（{format_clock(gap_start)} - {format_clock(gap_end)}）は文字起こしに失敗しました]"))
+            self.transcript.append(gap_start, gap_end, FAILED_SEGMENT_TEXT, failed=True)
+            self.total_duration += self._next_offset - time_offset
+            return
+
+        text = result.get("text", "").strip()
+        if text:
+            self.text_parts.append((index, text))
+        if self.transcript.language is None:
+            self.transcript.language = result.get("language")
+        
+        # セグメントの時間を全体の時間軸に調整して記録する
+        for segment in result.get("segments", []):
+            self.transcript.append(
+                self._to_original(segment["start"] + time_offset),
+                self._to_original(segment["end"] + time_offset, end=True),
+                segment["text"].strip(),
+            )
+            self.segment_count += 1
+        
+        self.total_duration += result.get("duration", 0)
+        self.total_processing_time += result.get("processing_time", 0)
+
+    def _to_original(self, seconds: float, end: bool = False) -> float:
+        return self.remap.to_original(seconds, end=end) if self.remap is not None else seconds
+
+    @property
+    def success_count(self) -> int:
+        return len(self.results) - self.failed_count
+
+    @staticmethod
+    def error_result(error: str) -> Dict:
+        return {
+            "combined_text": "",
+            "success": False,
+            "error": error,
+            "total_duration": 0,
+            "total_processing_time": 0,
+            "segment_count": 0,
+            "transcript": Transcript()
+        }
+
+    def finalize(self) -> Dict:
+        """
+        結合結果を返します（combine_transcriptionsと同じ形式）。
+        """
+        if self.success_count == 0:
+            return self.error_result("すべての文字起こしが失敗しました")
+        # 無音を取り除いた場合も、長さは元の音声の長さとする（取り除いた長さは compaction に含める）
+        total_duration = self.remap.original_seconds if self.remap is not None else self.total_duration
+        self.transcript.duration = total_duration
+
+        # セグメント番号を追加（デバッグ用）
+        multiple = len(self.results) > 1
+        combined_text = "\n\n".join(
+            f"\n--- セグメント {index+1} ---\n{text}" if multiple else text
+            for index, text in self.text_parts
+        )
+
+        # 失敗したファイルの情報
+        error_summary = ""
+        if self.failed_count:
+            error_summary = f"\n注意: {self.failed_count}個のセグメントで文字起こしに失敗しました。"
+
+        return {
+            "combined_text": combined_text,
+            "success": True,
+            "error": error_summary if error_summary else None,
+            "total_duration": total_duration,
+            "total_processing_time": self.total_processing_time,
+            "segment_count": self.segment_count,
+            "failed_count": self.failed_count,
+            "gaps": self.gaps,
+            "compaction": self.remap.summary() if self.remap is not None else None,
+            "detailed_results": self.results,
+            "transcript": self.transcript
+        }
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from api.utils.log import get_logger
+from api.utils.metrics import RESULT_FILES_BYTES, WORKSPACE_BYTES, WORKSPACES_ACTIVE
+
+logger = get_logger(__name__)
+
+# 作業ディレクトリが使用中であることを示すファイル。所有するプロセスが定期的に更新する
+LEASE_FILENAME = ".lease"
+
+
+def _directory_size(path: Path) -> tuple[int, int]:
+    """
+    ディレクトリ以下のファイルの合計サイズ（バイト）とファイル数を返します。
+    """
+    total = files = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.stat(os.path.join(root, filename)).st_size
+                files += 1
+            except FileNotFoundError:
+                pass
+    return total, files
+
+
+class JobWorkspace:
+    """
+    1件のジョブ専用の作業ディレクトリです。アップロードされた音声・変換後のMP3・分割チャンクはすべてここに置かれます。
+    参照カウントを持ち、最後の参照が解放された時点でディレクトリごと削除されます。
+    """
+    def __init__(self, job_id: str, path: Path):
+        self.job_id = job_id
+        self.path = path
+        self.references = 0
+        self.created_at = time.time()
+
+    def touch(self):
+        """
+        使用中であることを示すリースを更新します。
+        """
+        (self.path / LEASE_FILENAME).touch(exist_ok=True)
+
+
+class WorkspaceManager:
+    """
+    ジョブごとの作業ディレクトリ（{root}/jobs/{job_id}）と、文字起こし結果の保持期間を管理します。
+
+    - acquire(job_id) で作業ディレクトリを作成（または参照を追加）し、release(job_id) で参照を解放します。
+      参照がなくなった作業ディレクトリはすぐに削除されるため、他のジョブの作業中のファイルには影響しません
+    - バックグラウンドの掃除係（janitor）は interval 秒ごとに、
+      使用中の作業ディレクトリのリースを更新し、リースが orphan_grace 秒以上更新されていない
+      作業ディレクトリ（異常終了したプロセスの残骸など）と、result_ttl を過ぎた結果ファイルを削除します
+    - 複数のプロセスで同じディレクトリを共有しても、他のプロセスが使用中の作業ディレクトリはリースにより保護されます
+    """
+    def __init__(self, root: str = "processed_audio", results_dir: str = "transcription_results",
+                 result_ttl_hours: float = None, interval: float = None, orphan_grace: float = None,
+                 on_results_expired: Callable[[List[Path]], None] = None):
+        self.root = Path(root)
+        self.jobs_dir = self.root / "jobs"
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.results_dir = Path(results_dir)
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        if result_ttl_hours is None:
+            result_ttl_hours = float(os.getenv("OKOSHI_RESULT_TTL_HOURS", "168"))
+        # 0 以下の場合、結果ファイルは削除しない
+        self.result_ttl_seconds = result_ttl_hours * 3600
+        self.interval = interval or float(os.getenv("OKOSHI_JANITOR_INTERVAL_SECONDS", "60"))
+        self.orphan_grace = orphan_grace or max(self.interval * 5, 600)
+        self.workspaces: Dict[str, JobWorkspace] = {}
+        self._lock = threading.Lock()
+        self._janitor: Optional[asyncio.Task] = None
+        self._usage: Dict = {}
+        # 保持期間を過ぎて削除した結果ファイルを受け取る（結果の索引から取り除くため）
+        self.on_results_expired = on_results_expired
+
+    def acquire(self, job_id: str) -> JobWorkspace:
+        """
+        ジョブの作業ディレクトリへの参照を追加して返します。まだなければ作成します。
+        """
+        with self._lock:
+            workspace = self.workspaces.get(job_id)
+            if workspace is None:
+                workspace = JobWorkspace(job_id, self.jobs_dir / job_id)
+                workspace.path.mkdir(parents=True, exist_ok=True)
+                workspace.touch()
+                self.workspaces[job_id] = workspace
+            workspace.references += 1
+            WORKSPACES_ACTIVE.set(len(self.workspaces))
+        return workspace
+
+    def get(self, job_id: str) -> Optional[JobWorkspace]:
+        return self.workspaces.get(job_id)
+
+    def release(self, job_id: str):
+        """
+        ジョブの作業ディレクトリへの参照を解放します。最後の参照であればディレクトリを削除します。
+        """
+        with self._lock:
+            workspace = self.workspaces.get(job_id)
+            if workspace is None:
+                return
+            workspace.references -= 1
+            if workspace.references > 0:
+                return
+            del self.workspaces[job_id]
+            WORKSPACES_ACTIVE.set(len(self.workspaces))
+        self._remove(workspace.path, reason="released")
+
+    def _remove(self, path: Path, reason: str):
+        size, files = _directory_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        logger.info(
+            "workspace removed",
+            extra={"event": "workspace_removed", "path": str(path), "reason": reason, "bytes": size, "files": files},
+        )
+
+    def sweep(self) -> Dict:
+        """
+        掃除を1回実行します。使用中の作業ディレクトリのリースを更新し、
+        放置された作業ディレクトリと保持期間を過ぎた結果ファイルを削除して、削除件数を返します。
+        """
+        now = time.time()
+        with self._lock:
+            active = dict(self.workspaces)
+        for workspace in active.values():
+            if workspace.path.is_dir():
+                workspace.touch()
+
+        orphans = 0
+        for path in self.jobs_dir.iterdir():
+            if path.name in active or not path.is_dir():
+                continue
+            lease = path / LEASE_FILENAME
+            try:
+                last_seen = lease.stat().st_mtime if lease.exists() else path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - last_seen > self.orphan_grace:
+                self._remove(path, reason="orphaned")
+                orphans += 1
+
+        expired = []
+        if self.result_ttl_seconds > 0:
+            for path in self.results_dir.iterdir():
+                try:
+                    if path.is_file() and now - path.stat().st_mtime > self.result_ttl_seconds:
+                        path.unlink()
+                        expired.append(path)
+                except FileNotFoundError:
+                    pass
+        if expired:
+            logger.info("expired results removed", extra={"event": "results_expired", "removed": len(expired)})
+            if self.on_results_expired is not None:
+                self.on_results_expired(expired)
+
+        self._usage = self._measure_usage()
+        return {"orphaned_workspaces": orphans, "expired_results": len(expired)}
+
+    def _measure_usage(self) -> Dict:
+        workspace_bytes, workspace_files = _directory_size(self.root)
+        result_bytes, result_files = _directory_size(self.results_dir)
+        disk = shutil.disk_usage(self.root)
+        WORKSPACE_BYTES.set(workspace_bytes)
+        RESULT_FILES_BYTES.set(result_bytes)
+        return {
+            "workspace_bytes": workspace_bytes,
+            "workspace_files": workspace_files,
+            "result_bytes": result_bytes,
+            "result_files": result_files,
+            "disk_total_bytes": disk.total,
+            "disk_free_bytes": disk.free,
+            "measured_at": time.time(),
+        }
+
+    def stats(self) -> Dict:
+        """
+        使用中の作業ディレクトリ数と、直近の掃除で計測したディスク使用量を返します。
+        """
+        if not self._usage:
+            self._usage = self._measure_usage()
+        return {
+            "active_workspaces": len(self.workspaces),
+            "result_ttl_hours": self.result_ttl_seconds / 3600,
+            **self._usage,
+        }
+
+    def start(self):
+        """
+        掃除係をバックグラウンドで起動します（実行中のイベントループ上で呼び出してください）。
+        """
+        if self._janitor is None:
+            self._janitor = asyncio.create_task(self._run_janitor())
+
+    async def _run_janitor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception:
+                logger.exception("workspace sweep failed", extra={"event": "janitor_error"})
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+            try:
+                await self._janitor
+            except asyncio.CancelledError:
+                pass
+            self._janitor = None
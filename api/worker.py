@@ -0,0 +1,238 @@
+"""
+文字起こしワーカーです。共有のタスクキューからタスクを取り出して実行します。
+
+    OKOSHI_ROLE=api で起動したAPIノードと、同じ共有ストレージ（OKOSHI_DATA_DIR）を使って起動してください:
+
+    python -m api.worker
+
+ワーカーはいくつでも（別のマシンでも）起動でき、1つの録音のチャンクも複数のワーカーで分担して文字起こしします。
+"""
+import asyncio
+import functools
+import os
+import signal
+import socket
+import time
+from typing import Dict
+
+from api.utils.audio_pool import AudioWorkPool
+from api.utils.audio_utils import AudioChunk, AudioProcessor, AudioValidationError
+from api.utils.log import get_logger
+from api.utils.rate_limiter import rate_limit_settings
+from api.utils.silence import TimeRemap
+from api.utils.storage import WORK_ROOT, from_shared, to_shared
+from api.utils.task_queue import PREPARE_TASK, TRANSCRIBE_TASK, Task, TaskQueue, create_task_queue
+from api.utils.transcription_cache import TranscriptionCache
+from api.utils.wisper_service import WhisperService
+from api.utils.workspace import LEASE_FILENAME
+
+# python -m api.worker で実行すると __name__ は "__main__" になるため、api 以下のロガー名を指定する
+logger = get_logger("api.worker")
+
+
+def chunk_payload(chunk: AudioChunk, total: int, work_dir: str, language: str = "ja", remap: TimeRemap = None) -> Dict:
+    """
+    チャンクの文字起こしタスクの内容です。パスは共有ストレージ上の相対パスで記録します。
+    無音を取り除いた音声のチャンクには、APIノードが元の音声の時刻に戻せるよう対応表（remap）を含めます。
+    """
+    payload = {
+        "path": to_shared(chunk.path),
+        "work_dir": work_dir,
+        "index": chunk.index,
+        "start": chunk.start,
+        "end": chunk.end,
+        "total": total,
+        "language": language,
+    }
+    if remap is not None:
+        payload["remap"] = remap.to_dict()
+    return payload
+
+
+class TranscriptionWorker:
+    """
+    タスクキューからタスクを取り出して実行するワーカーです。
+
+    - prepare: 検証・無音の除去・長さ取得・エンコード計画・分割を行い、エンコードできたチャンクから順に transcribe タスクを登録します
+      （CPU負荷が高いため、同時に実行するのは prepare_concurrency 件まで。処理はプロセスプールで行います）
+    - transcribe: 1チャンクを文字起こしします（同時に concurrency 件まで）
+    - 実行中のタスクのリースと、ジョブの作業ディレクトリのリース（.lease）を定期的に更新します
+    """
+    def __init__(self, queue: TaskQueue = None, concurrency: int = None, prepare_concurrency: int = None,
+                 lease_seconds: float = None, poll_interval: float = None):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.queue = queue or create_task_queue()
+        self.concurrency = concurrency or int(os.getenv("OKOSHI_WORKER_CONCURRENCY", "8"))
+        self.prepare_concurrency = prepare_concurrency or int(os.getenv("OKOSHI_WORKER_PREPARE_CONCURRENCY", "1"))
+        self.lease_seconds = lease_seconds or float(os.getenv("OKOSHI_TASK_LEASE_SECONDS", "60"))
+        self.poll_interval = poll_interval or float(os.getenv("OKOSHI_QUEUE_POLL_SECONDS", "0.5"))
+        # 取り残されたタスクを削除するまでの時間
+        self.retention_seconds = float(os.getenv("OKOSHI_TASK_RETENTION_HOURS", "24")) * 3600
+        self.audio_processor = AudioProcessor(output_dir=str(WORK_ROOT))
+        self.audio_pool = AudioWorkPool()
+        # WHISPER_RPM はワーカーごとではなく、キューを共有するすべてのワーカーの合計の上限にする
+        requests_per_minute, burst = rate_limit_settings()
+        self.whisper_service = WhisperService(
+            os.getenv("OPENAI_API_KEY"), cache=TranscriptionCache(),
+            rate_limiter=self.queue.create_rate_limiter(requests_per_minute, burst=burst),
+        )
+        self.running: Dict[int, Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """
+        新しいタスクの取り出しをやめます。実行中のタスクは完了まで実行します。
+        """
+        self._stopping.set()
+
+    def _claimable_kinds(self) -> list[str]:
+        preparing = sum(1 for task in self.running.values() if task.kind == PREPARE_TASK)
+        return [TRANSCRIBE_TASK] + ([PREPARE_TASK] if preparing < self.prepare_concurrency else [])
+
+    async def run(self):
+        logger.info(
+            "worker started",
+            extra={"event": "worker_started", "worker": self.worker_id, "concurrency": self.concurrency, "queue": type(self.queue).__name__},
+        )
+        heartbeat = asyncio.create_task(self._heartbeat())
+        slots = asyncio.Semaphore(self.concurrency)
+        executing = set()
+        try:
+            while not self._stopping.is_set():
+                await slots.acquire()
+                task = await asyncio.to_thread(self.queue.claim, self.worker_id, self._claimable_kinds(), self.lease_seconds)
+                if task is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.running[task.id] = task
+                execution = asyncio.create_task(self._execute(task))
+                executing.add(execution)
+                execution.add_done_callback(executing.discard)
+                execution.add_done_callback(lambda _: slots.release())
+            if executing:
+                await asyncio.gather(*executing, return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+            self.audio_pool.shutdown()
+            logger.info("worker stopped", extra={"event": "worker_stopped", "worker": self.worker_id})
+
+    async def _execute(self, task: Task):
+        start = time.perf_counter()
+        try:
+            if task.kind == PREPARE_TASK:
+                result = await self._prepare(task)
+            elif task.kind == TRANSCRIBE_TASK:
+                result = await self._transcribe(task)
+            else:
+                raise ValueError(f"不明なタスクです: {task.kind}")
+            await asyncio.to_thread(self.queue.complete, task.id, self.worker_id, result)
+            outcome = "done"
+        except Exception as e:
+            logger.exception("task failed", extra={"event": "task_failed", "task_id": task.id, "job_id": task.job_id, "kind": task.kind})
+            await asyncio.to_thread(self.queue.fail, task.id, self.worker_id, str(e))
+            outcome = "failed"
+        finally:
+            self.running.pop(task.id, None)
+        logger.info(
+            "task finished",
+            extra={
+                "event": "task_finished", "task_id": task.id, "job_id": task.job_id, "kind": task.kind,
+                "outcome": outcome, "attempt": task.attempts, "duration_seconds": round(time.perf_counter() - start, 3),
+            },
+        )
+
+    async def _prepare(self, task: Task) -> Dict:
+        payload = task.payload
+        file_path, work_dir, user = from_shared(payload["file"]), from_shared(payload["work_dir"]), payload["user"]
+        language = payload.get("language", "ja")
+        stage_start = time.perf_counter()
+        try:
+            prepared = await self.audio_pool.run(
+                self.audio_processor.prepare_audio, file_path, user, stream_split=True, work_dir=work_dir
+            )
+        except AudioValidationError as e:
+            # 入力の誤りは再試行しても変わらないため、APIノードが400として返せるよう結果として記録する
+            return {"status_code": 400, "error": str(e)}
+        stage_seconds = dict(prepared.stage_seconds)
+        plan = prepared.plan
+
+        if prepared.chunks is None:
+            # エンコードできたチャンクから順に登録し、他のワーカーがすぐに文字起こしを始められるようにする
+            split_start = time.perf_counter()
+
+            # チャンクのエンコードはプロセスプールで実行し、同時に動くffmpegの数をプールの上限に収める
+            submit = functools.partial(self.audio_pool.submit_threadsafe, asyncio.get_running_loop())
+
+            def split_and_enqueue() -> int:
+                count = 0
+                for chunk in self.audio_processor.split_audio_streaming(
+                    prepared.source, user=user, plan=plan, duration=prepared.duration, work_dir=work_dir,
+                    max_workers=self.audio_pool.max_workers, submit=submit,
+                ):
+                    self.queue.put(
+                        task.job_id, TRANSCRIBE_TASK,
+                        chunk_payload(chunk, plan.chunk_count, payload["work_dir"], language, prepared.remap),
+                    )
+                    count += 1
+                return count
+
+            chunk_count = await asyncio.to_thread(split_and_enqueue)
+            stage_seconds["split"] = time.perf_counter() - split_start
+        else:
+            for chunk in prepared.chunks:
+                await asyncio.to_thread(
+                    self.queue.put, task.job_id, TRANSCRIBE_TASK,
+                    chunk_payload(chunk, len(prepared.chunks), payload["work_dir"], language, prepared.remap),
+                )
+            chunk_count = len(prepared.chunks)
+
+        return {
+            "duration": prepared.duration,
+            "encoding_plan": plan.to_dict(),
+            "chunk_count": chunk_count,
+            "stage_seconds": stage_seconds,
+            "encode_seconds": time.perf_counter() - stage_start,
+        }
+
+    async def _transcribe(self, task: Task) -> Dict:
+        payload = task.payload
+        chunk = AudioChunk(from_shared(payload["path"]), payload["index"], payload["start"], payload["end"])
+        result = await self.whisper_service.transcribe_single_file(chunk, payload.get("language", "ja"))
+        return {**result, "file_path": payload["path"], "worker": self.worker_id}
+
+    async def _heartbeat(self):
+        interval = self.lease_seconds / 3
+        last_purge = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                tasks = list(self.running.values())
+                await asyncio.to_thread(self.queue.renew, [task.id for task in tasks], self.worker_id, self.lease_seconds)
+                # 作業中のジョブの作業ディレクトリが、どのノードの掃除係にも削除されないようにする
+                for task in tasks:
+                    lease = from_shared(task.payload["work_dir"]) / LEASE_FILENAME
+                    if lease.parent.is_dir():
+                        lease.touch(exist_ok=True)
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    removed = await asyncio.to_thread(self.queue.purge_stale, self.retention_seconds)
+                    if removed:
+                        logger.info("stale tasks removed", extra={"event": "tasks_purged", "removed": removed})
+            except Exception:
+                logger.exception("worker heartbeat failed", extra={"event": "heartbeat_error", "worker": self.worker_id})
+
+
+async def main():
+    worker = TranscriptionWorker()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
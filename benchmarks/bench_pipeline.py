@@ -0,0 +1,307 @@
+"""
+文字起こしパイプライン全体のオフラインベンチマーク。
+
+合成音声（benchmarks/synthetic_audio.py）をAPIサーバへ POST /jobs で投入し、
+Whisper APIの代わりにローカルの代替サーバ（benchmarks/fake_whisper_server.py）を使って
+受信から結果保存までを実際のコードで実行します。ネットワークやOpenAIのAPIキーは不要です。
+
+ケースごとに次を表示します。
+  - スループット（音声時間 / 壁時計時間。1時間あたりに処理できる音声の時間）
+  - サーバプロセス（ffmpegの子プロセスを含む）のピークRSS
+  - 失敗したチャンク数
+すべてのケースを通した処理段階ごとの所要時間のパーセンタイル（p50 / p90 / p99 / 最大）は、
+サーバの構造化ログ（stage / whisper_request イベント）から集計します。
+
+--output で結果をJSONに保存し、次回 --baseline に渡すと、スループットが
+--max-regression（既定: 20%）を超えて低下したケースがある場合に終了コード1で終了します。
+
+使い方:
+    python -m benchmarks.bench_pipeline --cases wav:1,mp3:10,m4a:60 --latency 2.0
+    python -m benchmarks.bench_pipeline --cases m4a:180 --failure-rate 0.1 --output bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_whisper_concurrency import _free_port, start_fake_server
+from benchmarks.synthetic_audio import FORMATS, corpus_file
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CORPUS_DIR = REPO_ROOT / "benchmarks" / ".corpus"
+
+
+def parse_cases(text: str) -> list[tuple[str, float]]:
+    """
+    "wav:1,mp3:10" 形式のケース指定を [(形式, 分), ...] に変換します。
+    """
+    cases = []
+    for item in text.split(","):
+        fmt, minutes = item.strip().split(":")
+        if fmt not in FORMATS:
+            raise argparse.ArgumentTypeError(f"対応していない形式です: {fmt}")
+        cases.append((fmt, float(minutes)))
+    return cases
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def _tree_rss_mb(pid: int) -> float:
+    """
+    プロセスとその子孫（ffmpeg など）のRSSの合計を返します。
+    """
+    total, stack = 0.0, [pid]
+    while stack:
+        current = stack.pop()
+        total += _rss_mb(current)
+        stack.extend(_children(current))
+    return total
+
+
+class RssSampler:
+    """
+    別スレッドでプロセスツリーのRSSを定期的に測り、ピークを記録します。
+    """
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, _tree_rss_mb(self.pid))
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_api_server(work_dir: Path, whisper_base: str, log_path: Path, extra_env: dict = None) -> tuple[subprocess.Popen, str]:
+    """
+    作業ディレクトリ上でAPIサーバを起動します。キャッシュは作業ディレクトリ内に作られるため、
+    毎回キャッシュなしの状態で計測されます。extra_env の環境変数は既定値より優先されます。
+    """
+    port = _free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(REPO_ROOT),
+        "OPENAI_API_KEY": "dummy",
+        "OPENAI_BASE_URL": f"{whisper_base}/v1",
+        "OKOSHI_CACHE_DIR": str(work_dir / "transcription_cache"),
+        "OKOSHI_LOG_FORMAT": "json",
+        "OKOSHI_LOG_LEVEL": "INFO",
+        **(extra_env or {}),
+    }
+    log_file = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=work_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    log_file.close()
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(f"{base}/metrics", timeout=0.5)
+            return server, base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("APIサーバの起動に失敗しました")
+
+
+def run_case(base: str, source: Path, poll_interval: float = 0.5) -> dict:
+    """
+    1ファイルをジョブとして投入し、完了までの時間と結果を返します。
+    """
+    start = time.perf_counter()
+    with open(source, "rb") as f:
+        response = httpx.post(
+            f"{base}/jobs",
+            data={"user": "bench"},
+            files={"audio_file": (source.name, f, "application/octet-stream")},
+            timeout=3600,
+        )
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        status = httpx.get(f"{base}/jobs/{job_id}", timeout=30).json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(poll_interval)
+    wall = time.perf_counter() - start
+    if status["status"] == "failed":
+        return {"status": "failed", "error": status["error"], "wall_seconds": wall}
+    result = httpx.get(f"{base}/result/{job_id}", timeout=30).json()
+    return {
+        "status": "done",
+        "wall_seconds": wall,
+        "audio_seconds": result["processing_info"]["duration_minutes"] * 60,
+        "segments": result["processing_info"]["segment_count"],
+        "stage_seconds": result["processing_info"].get("stage_seconds", {}),
+    }
+
+
+def collect_stage_durations(log_path: Path) -> dict[str, list[float]]:
+    """
+    サーバの構造化ログから、処理段階ごと・Whisper呼び出しごとの所要時間を集めます。
+    """
+    durations = defaultdict(list)
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("event") == "stage":
+                durations[entry["stage"]].append(entry["duration_seconds"])
+            elif entry.get("event") == "whisper_request":
+                durations[f"whisper_request ({entry['outcome']})"].append(entry["duration_seconds"])
+            elif entry.get("event") == "job_started":
+                durations["queue_wait"].append(entry["queue_wait_seconds"])
+            elif entry.get("event") == "transcribed":
+                failed = entry.get("failed_chunks", 0)
+                durations["_failed_chunks"].append(failed)
+    return durations
+
+
+def percentiles(values: list[float]) -> dict:
+    data = np.asarray(values, dtype=float)
+    return {
+        "count": int(data.size),
+        "p50": round(float(np.percentile(data, 50)), 3),
+        "p90": round(float(np.percentile(data, 90)), 3),
+        "p99": round(float(np.percentile(data, 99)), 3),
+        "max": round(float(data.max()), 3),
+    }
+
+
+def compare_with_baseline(report: dict, baseline_path: Path, max_regression: float) -> list[str]:
+    """
+    ベースラインと比べてスループットが max_regression を超えて低下したケースを返します。
+    """
+    baseline = {case["case"]: case for case in json.loads(baseline_path.read_text())["cases"]}
+    regressions = []
+    for case in report["cases"]:
+        previous = baseline.get(case["case"])
+        if not previous or not previous.get("throughput") or not case.get("throughput"):
+            continue
+        change = case["throughput"] / previous["throughput"] - 1
+        if change < -max_regression:
+            regressions.append(f"{case['case']}: スループット {previous['throughput']} → {case['throughput']} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=parse_cases, default=parse_cases("wav:1,mp3:10,m4a:60"),
+                        help="形式:分 のカンマ区切り（形式: wav / mp3 / m4a、1〜180分程度）")
+    parser.add_argument("--latency", type=float, default=2.0, help="代替サーバの1リクエストあたりの遅延（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="代替サーバが429を返す確率")
+    parser.add_argument("--channels", type=int, default=1, help="合成音声のチャンネル数")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR, help="合成音声の保存先（再利用されます）")
+    parser.add_argument("--output", type=Path, help="結果を保存するJSONファイル")
+    parser.add_argument("--baseline", type=Path, help="比較対象の結果JSON")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="許容するスループットの低下率")
+    args = parser.parse_args()
+
+    sources = []
+    for fmt, minutes in args.cases:
+        print(f"合成音声を準備中: {fmt} {minutes:g}分", flush=True)
+        sources.append((f"{fmt}:{minutes:g}", corpus_file(args.corpus_dir, fmt, minutes, channels=args.channels)))
+
+    # 代替サーバは音声長をバイト数から推定するため、チャンクのビットレート（32kbps = 4000バイト/秒）に合わせる
+    whisper, whisper_base = start_fake_server(args.latency, args.failure_rate, bytes_per_sec=4000)
+    cases = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as tmp:
+            work_dir = Path(tmp)
+            log_path = work_dir / "server.log"
+            server, base = start_api_server(work_dir, whisper_base, log_path)
+            try:
+                for name, source in sources:
+                    with RssSampler(server.pid) as sampler:
+                        outcome = run_case(base, source)
+                    row = {"case": name, "input_mb": round(source.stat().st_size / (1024 * 1024), 1),
+                           "peak_rss_mb": round(sampler.peak_mb, 1), **outcome}
+                    if outcome["status"] == "done":
+                        row["throughput"] = round(outcome["audio_seconds"] / outcome["wall_seconds"], 1)
+                    cases.append(row)
+                    print(f"  {name}: {outcome['status']} ({outcome['wall_seconds']:.1f}秒) {outcome.get('error') or ''}", flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+            durations = collect_stage_durations(log_path)
+    finally:
+        whisper.terminate()
+        whisper.wait()
+
+    failed_chunks = durations.pop("_failed_chunks", [])
+    report = {
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "cases": cases,
+        "stages": {stage: percentiles(values) for stage, values in sorted(durations.items())},
+        "failed_chunks": int(sum(failed_chunks)),
+    }
+
+    print()
+    print(f"{'case':<12} {'input(MB)':>10} {'wall(s)':>9} {'音声h/壁時計h':>14} {'peak RSS(MB)':>13} {'status':>8}")
+    for row in cases:
+        throughput = f"{row['throughput']:.1f}" if "throughput" in row else "-"
+        print(f"{row['case']:<12} {row['input_mb']:>10} {row['wall_seconds']:>9.1f} {throughput:>14} {row['peak_rss_mb']:>13} {row['status']:>8}")
+    print(f"文字起こしに失敗したチャンク: {report['failed_chunks']}")
+    print()
+    print(f"{'stage':<32} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<32} {stats['count']:>6} {stats['p50']:>8} {stats['p90']:>8} {stats['p99']:>8} {stats['max']:>8}")
+
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.baseline:
+        regressions = compare_with_baseline(report, args.baseline, args.max_regression)
+        if regressions:
+            print("NG: スループットが低下しました")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("OK: ベースラインからの性能低下はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+再開可能なアップロード（POST /uploads）で、最初の書き起こしが届くまでの時間を計測するベンチマーク。
+
+合成音声を一定の速度（--upload-kbps）に絞って PUT /uploads/{id} で少しずつ送信し、途中で1回
+接続が切れた想定で GET /uploads/{id} の offset から送り直します。Whisper APIの代わりに
+ローカルの代替サーバ（benchmarks/fake_whisper_server.py）を使います。
+
+次の時刻（アップロード開始からの秒数）を表示します。
+  - アップロードの完了
+  - 最初のチャンクの書き起こし（chunk_transcribed イベント）
+  - ジョブの完了
+先頭から読める形式（WAV / MP3）では、最初の書き起こしがアップロードの完了より前に届きます。
+
+使い方:
+    python -m benchmarks.bench_resumable_upload --format mp3 --minutes 10 --upload-kbps 512
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_pipeline import DEFAULT_CORPUS_DIR, start_api_server
+from benchmarks.bench_whisper_concurrency import start_fake_server
+from benchmarks.synthetic_audio import corpus_file
+
+
+def watch_events(base: str, job_id: str, start: float, marks: dict):
+    """
+    ジョブのイベントを購読し、最初の書き起こしと完了の時刻を記録します。
+    """
+    with httpx.stream("GET", f"{base}/jobs/{job_id}/events", timeout=None) as response:
+        for line in response.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event["type"] == "chunk_transcribed" and "first_transcript" not in marks:
+                marks["first_transcript"] = time.perf_counter() - start
+            elif event["type"] in ("done", "failed"):
+                marks[event["type"]] = time.perf_counter() - start
+
+
+def upload(base: str, source: Path, upload_kbps: float, piece_bytes: int, interrupt_at: float) -> dict:
+    data = source.read_bytes()
+    size = len(data)
+    created = httpx.post(f"{base}/uploads", data={"user": "bench", "filename": source.name, "size": size}, timeout=30)
+    created.raise_for_status()
+    upload_id = created.json()["upload_id"]
+
+    marks = {}
+    start = time.perf_counter()
+    watcher = threading.Thread(target=watch_events, args=(base, upload_id, start, marks), daemon=True)
+    watcher.start()
+
+    bytes_per_second = upload_kbps * 1000 / 8
+    offset, interrupted = 0, False
+    while offset < size:
+        piece = data[offset:offset + piece_bytes]
+        if not interrupted and offset >= size * interrupt_at:
+            # 接続が切れた想定: 送信済みの範囲を確認し、そこから送り直す
+            interrupted = True
+            offset = httpx.get(f"{base}/uploads/{upload_id}", timeout=30).json()["offset"]
+            continue
+        response = httpx.put(
+            f"{base}/uploads/{upload_id}", content=piece,
+            headers={"Content-Range": f"bytes {offset}-{offset + len(piece) - 1}/{size}"}, timeout=60,
+        )
+        response.raise_for_status()
+        offset = response.json()["offset"]
+        # 送信速度を絞る
+        time.sleep(max(0.0, offset / bytes_per_second - (time.perf_counter() - start)))
+    httpx.post(f"{base}/uploads/{upload_id}/complete", timeout=30).raise_for_status()
+    marks["upload"] = time.perf_counter() - start
+    watcher.join(timeout=3600)
+    result = httpx.get(f"{base}/result/{upload_id}", timeout=30).json()
+    return {**marks, "stage_timings": result.get("processing_info", {}).get("stage_timings", {})}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", default="mp3", help="合成音声の形式（wav / mp3 / m4a）")
+    parser.add_argument("--minutes", type=float, default=10, help="合成音声の長さ（分）")
+    parser.add_argument("--upload-kbps", type=float, default=512, help="アップロードの速度（kbps）")
+    parser.add_argument("--piece-kb", type=int, default=256, help="1回のPUTで送るサイズ（KB）")
+    parser.add_argument("--chunk-seconds", type=int, default=120, help="受信しながら分割するチャンクの長さ（秒）")
+    parser.add_argument("--interrupt-at", type=float, default=0.5, help="接続が切れる位置（全体に対する割合）")
+    parser.add_argument("--latency", type=float, default=1.0, help="代替サーバの1リクエストあたりの遅延（秒）")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR, help="合成音声の保存先（再利用されます）")
+    args = parser.parse_args()
+
+    print(f"合成音声を準備中: {args.format} {args.minutes:g}分", flush=True)
+    source = corpus_file(args.corpus_dir, args.format, args.minutes)
+
+    whisper, whisper_base = start_fake_server(args.latency, bytes_per_sec=4000)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench_resumable_upload_") as tmp:
+            data_dir = Path(tmp)
+            server, base = start_api_server(
+                data_dir, whisper_base, data_dir / "server.log",
+                extra_env={"OKOSHI_DATA_DIR": str(data_dir), "OKOSHI_PROGRESSIVE_CHUNK_SECONDS": str(args.chunk_seconds)},
+            )
+            try:
+                marks = upload(base, source, args.upload_kbps, args.piece_kb * 1024, args.interrupt_at)
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        whisper.terminate()
+
+    print()
+    print(f"入力: {source.name}（{source.stat().st_size / (1024 * 1024):.1f}MB、{args.upload_kbps:g}kbps で送信）")
+    print(f"アップロード完了:   {marks['upload']:8.1f}秒")
+    if "first_transcript" in marks:
+        print(f"最初の書き起こし:   {marks['first_transcript']:8.1f}秒")
+    print(f"ジョブの完了:       {marks.get('done', marks.get('failed', float('nan'))):8.1f}秒（{'done' if 'done' in marks else 'failed'}）")
+    print(f"処理段階: {marks['stage_timings']}")
+
+
+if __name__ == "__main__":
+    main()
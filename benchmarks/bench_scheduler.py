@@ -0,0 +1,126 @@
+"""
+待ち行列の並べ方（予測処理時間の短い順＋エージング）と、投入時に返す完了予測の精度を計測するベンチマーク。
+
+APIサーバを同時実行ジョブ数1（OKOSHI_MAX_WORKERS=1）で起動し、処理時間の記録を作るために数件の音声を
+順に処理した後、別々の利用者が長い録音（--long-minutes）を3件、続けて短い録音（--short-minutes）を1件
+投入します。Whisper APIの代わりにローカルの代替サーバ（benchmarks/fake_whisper_server.py）を使い、
+1ジョブあたりの同時リクエスト数を1にして、処理時間が音声長に比例する状況を再現します。
+
+次の2つの設定で計測し、ジョブごとに投入時の予測（eta_seconds）と実際に完了するまでの時間を表示します。
+  - fifo: エージングを非常に大きくし、投入順に処理する（従来の順番待ちに相当）
+  - sjf:  既定のエージング（OKOSHI_SCHEDULER_AGING=1.0）で、予測処理時間の短い順に処理する
+sjf では短い録音が長い録音の後ろで待たされずに完了します。
+
+使い方:
+    python -m benchmarks.bench_scheduler --long-minutes 12 --short-minutes 1 --latency 0.5
+"""
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_pipeline import DEFAULT_CORPUS_DIR, start_api_server
+from benchmarks.bench_whisper_concurrency import start_fake_server
+from benchmarks.synthetic_audio import corpus_file
+
+POLICIES = {"fifo": "1e9", "sjf": "1.0"}
+
+
+def submit(base: str, source: Path, user: str) -> dict:
+    with open(source, "rb") as f:
+        response = httpx.post(
+            f"{base}/jobs", data={"user": user}, files={"audio_file": (source.name, f, "application/octet-stream")}, timeout=600,
+        )
+    response.raise_for_status()
+    return {**response.json(), "submitted": time.perf_counter()}
+
+
+def wait_done(base: str, job_id: str, poll_interval: float = 0.1) -> dict:
+    while True:
+        status = httpx.get(f"{base}/jobs/{job_id}", timeout=30).json()
+        if status["status"] in ("done", "failed"):
+            return {**status, "completed": time.perf_counter()}
+        time.sleep(poll_interval)
+
+
+def run_policy(aging: str, warmup: list[Path], jobs: list[tuple[str, Path]], whisper_base: str) -> list[dict]:
+    with tempfile.TemporaryDirectory(prefix="bench_scheduler_") as tmp:
+        data_dir = Path(tmp)
+        server, base = start_api_server(
+            data_dir, whisper_base, data_dir / "server.log",
+            extra_env={
+                "OKOSHI_DATA_DIR": str(data_dir),
+                "OKOSHI_MAX_WORKERS": "1",
+                "OKOSHI_MAX_CHUNK_SECONDS": "60",
+                "WHISPER_JOB_CONCURRENCY": "1",
+                "OKOSHI_SCHEDULER_AGING": aging,
+            },
+        )
+        try:
+            # 処理時間の予測に使う記録を作る
+            for source in warmup:
+                wait_done(base, submit(base, source, "warmup")["job_id"])
+            submitted = []
+            for user, source in jobs:
+                submitted.append({**submit(base, source, user), "user": user, "source": source})
+            with ThreadPoolExecutor(len(submitted)) as pool:
+                finished = list(pool.map(lambda job: wait_done(base, job["job_id"]), submitted))
+        finally:
+            server.terminate()
+            server.wait()
+    return [
+        {
+            "user": job["user"],
+            "audio_seconds": job["audio_seconds"],
+            "eta_seconds": job["eta_seconds"],
+            "actual_seconds": done["completed"] - job["submitted"],
+            "status": done["status"],
+        }
+        for job, done in zip(submitted, finished)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--long-minutes", type=float, default=12, help="長い録音の長さ（分）")
+    parser.add_argument("--short-minutes", type=float, default=1, help="短い録音の長さ（分）")
+    parser.add_argument("--format", default="mp3", help="合成音声の形式（wav / mp3 / m4a）")
+    parser.add_argument("--latency", type=float, default=0.5, help="代替サーバの1リクエストあたりの遅延（秒）")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR, help="合成音声の保存先（再利用されます）")
+    args = parser.parse_args()
+
+    # 同じ音声はキャッシュから返されるため、ジョブごとに別の seed の音声を使う
+    print("合成音声を準備中", flush=True)
+    warmup = [
+        corpus_file(args.corpus_dir, args.format, minutes, seed=100 + i)
+        for i, minutes in enumerate((args.short_minutes, args.long_minutes / 2, args.long_minutes))
+    ]
+    jobs = [(f"long{i + 1}", corpus_file(args.corpus_dir, args.format, args.long_minutes, seed=200 + i)) for i in range(3)]
+    jobs.append(("short", corpus_file(args.corpus_dir, args.format, args.short_minutes, seed=300)))
+
+    whisper, whisper_base = start_fake_server(args.latency)
+    results = {}
+    try:
+        for name, aging in POLICIES.items():
+            print(f"計測中: {name}", flush=True)
+            results[name] = run_policy(aging, warmup, jobs, whisper_base)
+    finally:
+        whisper.terminate()
+
+    print()
+    print(f"{'方式':<5} {'利用者':<7} {'音声(秒)':>8} {'予測(秒)':>8} {'実際(秒)':>8} {'誤差':>7}")
+    for name, rows in results.items():
+        for row in rows:
+            error = (row["eta_seconds"] - row["actual_seconds"]) / row["actual_seconds"] if row["eta_seconds"] else float("nan")
+            print(f"{name:<5} {row['user']:<7} {row['audio_seconds'] or 0:>8.0f} {row['eta_seconds'] or 0:>8.1f} "
+                  f"{row['actual_seconds']:>8.1f} {error:>+7.0%}{'' if row['status'] == 'done' else '  ' + row['status']}")
+    short = {name: next(row["actual_seconds"] for row in rows if row["user"] == "short") for name, rows in results.items()}
+    print()
+    print(f"短い録音が完了するまで: fifo {short['fifo']:.1f}秒 → sjf {short['sjf']:.1f}秒")
+
+
+if __name__ == "__main__":
+    main()
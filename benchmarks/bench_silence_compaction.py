@@ -0,0 +1,160 @@
+"""
+文字起こし前の無音の除去（OKOSHI_SILENCE_COMPACTION）で、Whisperへ送る音声の長さと処理時間がどれだけ減るか、
+および元の音声の時刻に正確に戻せるかを計測するベンチマーク。
+
+記者会見の録音に似せて、話し声（--speech-minutes）と小さな背景ノイズだけの待ち時間（--wait-minutes）を
+交互に --rounds 回並べたWAVを生成します。
+
+1. 無音の除去だけを実行し、所要時間・短くなった長さと、詰めた音声の各サンプルが対応表で戻した元の音声の
+   位置のサンプルと一致すること（時刻の変換に誤差がないこと）を確認します。
+2. APIサーバを無音の除去なし・ありで起動し、Whisper APIの代わりにローカルの代替サーバ
+   （benchmarks/fake_whisper_server.py）を相手に文字起こしして、Whisperへ送った音声の長さと
+   ジョブの完了までの時間を比べます。
+
+使い方:
+    python -m benchmarks.bench_silence_compaction --speech-minutes 3 --wait-minutes 4 --rounds 3
+"""
+import argparse
+import subprocess
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import httpx
+import numpy as np
+from pydub import AudioSegment
+
+from api.utils.audio_utils import AudioProcessor
+from benchmarks.bench_pipeline import start_api_server
+from benchmarks.bench_resumable_upload import watch_events
+from benchmarks.bench_whisper_concurrency import start_fake_server
+from benchmarks.synthetic_audio import iter_speech_like_pcm
+
+SAMPLE_RATE = 44100
+# 待ち時間の背景ノイズ（約 -60dBFS）
+WAIT_NOISE_STD = 30
+
+
+def write_press_conference_audio(path: Path, speech_minutes: float, wait_minutes: float, rounds: int, seed: int = 0) -> Path:
+    """
+    話し声と待ち時間を交互に並べたモノラルのWAVを書き出します（待ち時間から始まり、話し声で終わります）。
+    """
+    rng = np.random.default_rng(seed)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        for round_index in range(rounds):
+            for _ in range(int(wait_minutes * 60 / 30)):
+                f.writeframes(rng.normal(0, WAIT_NOISE_STD, 30 * SAMPLE_RATE).astype(np.int16).tobytes())
+            for pcm in iter_speech_like_pcm(speech_minutes * 60, sample_rate=SAMPLE_RATE, seed=seed + round_index):
+                f.writeframes(pcm.tobytes())
+    return path
+
+
+def decode_pcm(path: Path, sample_rate: int) -> np.ndarray:
+    command = [
+        AudioSegment.converter, "-nostdin", "-v", "error", "-i", str(path),
+        "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+    ]
+    return np.frombuffer(subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout, dtype=np.int16)
+
+
+def check_remap(source: Path, work_dir: Path) -> dict:
+    """
+    無音の除去を実行し、詰めた音声の全サンプルを、対応表で元の音声の位置に戻したサンプルと比べます。
+    """
+    processor = AudioProcessor(output_dir=str(work_dir))
+    start = time.perf_counter()
+    compacted_path, remap = processor.compact_silence(source, work_dir=work_dir)
+    seconds = time.perf_counter() - start
+
+    compacted = decode_pcm(compacted_path, remap.sample_rate)
+    original = decode_pcm(source, remap.sample_rate)
+    positions = np.arange(compacted.size)
+    # 詰めた音声のサンプル位置 → 残した区間 → 元の音声のサンプル位置（TimeRemap.to_original と同じ二分探索）
+    region = np.searchsorted(remap.compacted_starts, positions, side="right") - 1
+    mapped = np.asarray(remap.original_starts)[region] + positions - np.asarray(remap.compacted_starts)[region]
+    mismatches = int(np.count_nonzero(original[mapped] != compacted))
+    # to_original（秒）も、サンプル位置から求めた時刻と一致することを確認する
+    probes = np.linspace(0, compacted.size - 1, 1000).astype(int)
+    max_error = max(abs(remap.to_original(p / remap.sample_rate) - mapped[p] / remap.sample_rate) for p in probes)
+    return {"seconds": seconds, "summary": remap.summary(), "mismatches": mismatches, "max_error": max_error}
+
+
+def run_job(source: Path, whisper_base: str, compaction: bool) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench_silence_compaction_") as tmp:
+        data_dir = Path(tmp)
+        server, base = start_api_server(
+            data_dir, whisper_base, data_dir / "server.log",
+            extra_env={
+                "OKOSHI_DATA_DIR": str(data_dir),
+                "OKOSHI_MAX_CHUNK_SECONDS": "300",
+                "OKOSHI_SILENCE_COMPACTION": "true" if compaction else "false",
+            },
+        )
+        try:
+            start = time.perf_counter()
+            with open(source, "rb") as f:
+                response = httpx.post(
+                    f"{base}/jobs", data={"user": "bench"}, files={"audio_file": (source.name, f, "audio/wav")}, timeout=600,
+                )
+            response.raise_for_status()
+            job_id = response.json()["job_id"]
+            marks = {}
+            watch_events(base, job_id, start, marks)
+            result = httpx.get(f"{base}/result/{job_id}", timeout=30).json()
+        finally:
+            server.terminate()
+            server.wait()
+    info = result.get("processing_info", {})
+    compaction_info = info.get("silence_compaction")
+    return {
+        "wall_seconds": marks.get("done", marks.get("failed")),
+        "status": "done" if "done" in marks else "failed",
+        "sent_seconds": compaction_info["compacted_seconds"] if compaction_info else info.get("duration_minutes", 0) * 60,
+        "stage_seconds": info.get("stage_seconds", {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--speech-minutes", type=float, default=3, help="1回の話し声の長さ（分）")
+    parser.add_argument("--wait-minutes", type=float, default=4, help="1回の待ち時間の長さ（分）")
+    parser.add_argument("--rounds", type=int, default=3, help="待ち時間と話し声の組の数")
+    parser.add_argument("--latency", type=float, default=0.5, help="代替サーバの1リクエストあたりの遅延（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_silence_compaction_") as tmp:
+        work_dir = Path(tmp)
+        source = write_press_conference_audio(work_dir / "press_conference.wav", args.speech_minutes, args.wait_minutes, args.rounds)
+        total_minutes = (args.speech_minutes + args.wait_minutes) * args.rounds
+        print(f"入力: {total_minutes:g}分（話し声 {args.speech_minutes:g}分 × {args.rounds}、待ち時間 {args.wait_minutes:g}分 × {args.rounds}）", flush=True)
+
+        check = check_remap(source, work_dir)
+        summary = check["summary"]
+        print(f"無音の除去: {check['seconds']:.2f}秒で {summary['original_seconds'] / 60:.1f}分 → {summary['compacted_seconds'] / 60:.1f}分"
+              f"（{summary['saved_minutes']}分短縮、{summary['removed_regions']}区間）")
+        print(f"時刻の対応: 一致しないサンプル {check['mismatches']}個、変換の最大誤差 {check['max_error'] * 1000:.3f}ms")
+
+        # 代替サーバが返す長さ（＝Whisperの課金対象）は、送ったMP3のバイト数から求める（32kbps = 4000バイト/秒）
+        whisper, whisper_base = start_fake_server(args.latency, bytes_per_sec=4000)
+        try:
+            results = {}
+            for name, compaction in (("除去なし", False), ("除去あり", True)):
+                print(f"計測中: {name}", flush=True)
+                results[name] = run_job(source, whisper_base, compaction)
+        finally:
+            whisper.terminate()
+
+    print()
+    print(f"{'':<6} {'送った音声(分)':>12} {'完了まで(秒)':>12}  処理段階")
+    for name, row in results.items():
+        stages = {stage: round(seconds, 2) for stage, seconds in row["stage_seconds"].items()}
+        print(f"{name:<6} {row['sent_seconds'] / 60:>12.1f} {row['wall_seconds']:>12.1f}  {stages}"
+              f"{'' if row['status'] == 'done' else '  ' + row['status']}")
+
+
+if __name__ == "__main__":
+    main()
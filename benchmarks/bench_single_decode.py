@@ -0,0 +1,129 @@
+"""
+/okoshi の前処理（検証・MP3変換・長さ取得・分割）におけるデコード回数とピークRSSの比較ベンチマーク。
+
+  legacy : validate_audio_file / convert_to_mp3_if_needed / get_audio_duration / split_audio を個別に呼ぶ（従来方式）
+  single : load_audio で一度だけデコードし、ハンドルを各処理で共有する
+  probe  : prepare_audio でヘッダだけを読んで検証・長さ取得し、ffmpegで元ファイルから直接切り出す
+           （ヘッダを信用できる場合はデコードを行わない）
+
+ピークRSSを正しく測るため、各モードは別プロセスで実行します。
+
+使い方:
+    python -m benchmarks.bench_single_decode --minutes 30
+"""
+import argparse
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+MODES = ("legacy", "single", "probe")
+
+
+def _peak_rss_mb() -> float:
+    # Linuxでは ru_maxrss は KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _count_decodes() -> dict:
+    """
+    AudioSegment.from_file をラップしてデコード回数を数える。
+    """
+    counter = {"decodes": 0}
+    original = AudioSegment.from_file.__func__
+
+    def counting_from_file(cls, *args, **kwargs):
+        counter["decodes"] += 1
+        return original(cls, *args, **kwargs)
+
+    AudioSegment.from_file = classmethod(counting_from_file)
+    return counter
+
+
+def run_mode(mode: str, source: Path) -> dict:
+    from api.utils.audio_utils import AudioProcessor
+
+    counter = _count_decodes()
+    work_dir = Path(tempfile.mkdtemp(prefix=f"bench_{mode}_"))
+    try:
+        target = work_dir / source.name
+        shutil.copy(source, target)
+        processor = AudioProcessor(output_dir=str(work_dir / "processed_audio"))
+
+        start = time.perf_counter()
+        if mode == "legacy":
+            is_valid, message = processor.validate_audio_file(target)
+            assert is_valid, message
+            converted = processor.convert_to_mp3_if_needed(target)
+            duration = processor.get_audio_duration(converted)
+            split_files = processor.split_audio(converted, user="bench", segment_length=600)
+        elif mode == "probe":
+            prepared = processor.prepare_audio(target, user="bench")
+            duration, split_files = prepared.duration, prepared.chunks
+        else:
+            loaded, message = processor.load_audio(target)
+            assert loaded is not None, message
+            converted = processor.convert_to_mp3_if_needed(target, loaded=loaded)
+            duration = processor.get_audio_duration(converted, loaded=loaded)
+            split_files = processor.split_audio(converted, user="bench", segment_length=600, loaded=loaded)
+        elapsed = time.perf_counter() - start
+
+        return {
+            "mode": mode,
+            "decodes": counter["decodes"],
+            "duration_sec": duration,
+            "chunks": len(split_files),
+            "elapsed_sec": round(elapsed, 2),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def make_wav(path: Path, minutes: float):
+    """
+    ステレオ44.1kHzのWAVを生成（記者会見の録音を想定したサイズ感）
+    """
+    tone = Sine(440).to_audio_segment(duration=60 * 1000).set_frame_rate(44100).set_channels(2)
+    audio = tone * int(minutes)
+    audio.export(path, format="wav")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=30, help="生成する音声の長さ（分）")
+    parser.add_argument("--mode", choices=MODES, help="内部用: 指定モードのみ実行")
+    parser.add_argument("--source", type=Path, help="内部用: 入力ファイル")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.source)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "bench_source.wav"
+        make_wav(source, args.minutes)
+        print(f"入力: {source.stat().st_size / (1024 * 1024):.1f} MB WAV, {args.minutes:.0f}分")
+
+        rows = []
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_single_decode", "--mode", mode, "--source", str(source)],
+                check=True, capture_output=True, text=True,
+            )
+            rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<8} {'decodes':>8} {'chunks':>7} {'elapsed(s)':>11} {'peak RSS(MB)':>13}")
+    for row in rows:
+        print(f"{row['mode']:<8} {row['decodes']:>8} {row['chunks']:>7} {row['elapsed_sec']:>11} {row['peak_rss_mb']:>13}")
+
+
+if __name__ == "__main__":
+    main()
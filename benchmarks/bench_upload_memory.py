@@ -0,0 +1,129 @@
+"""
+アップロード受信時のサーバのピークメモリ（RSS）を計測するベンチマーク。
+
+APIサーバを別プロセスで起動し、大きな合成ファイルを POST /jobs へストリーミング送信しながら
+サーバプロセスのRSSを /proc から計測します。RSSの増加がチャンクサイズ程度に収まっていれば、
+アップロードがメモリに全量読み込まれていないことを確認できます。
+増加量が --max-rss-growth-mb を超えた場合は終了コード1で終了します。
+
+使い方:
+    python -m benchmarks.bench_upload_memory --size-mb 400
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def make_synthetic_upload(path: Path, size_mb: int):
+    """
+    ID3ヘッダ付きの大きなファイルを作る（受信処理の計測用で、音声としてはデコードされない）
+    """
+    block = b"\x00" * (1024 * 1024)
+    with open(path, "wb") as f:
+        f.write(b"ID3\x04\x00\x00\x00\x00\x00\x00")
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def measure_upload_rss(size_mb: int) -> tuple[float, float, int, float]:
+    """
+    APIサーバを起動し、size_mb MBの合成ファイルを POST /jobs へ送信して
+    (開始時のRSS, ピークRSS, HTTPステータス, 送信にかかった秒数) を返します（RSSはMB）。
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        upload_path = Path(tmp) / "bench_upload.mp3"
+        make_synthetic_upload(upload_path, size_mb)
+
+        port = _free_port()
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(REPO_ROOT),
+            "OKOSHI_DATA_DIR": str(Path(tmp) / "data"),
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "dummy"),
+            "OPENAI_BASE_URL": os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1"),
+        }
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=tmp, env=env, stdout=subprocess.DEVNULL,
+        )
+        base = f"http://127.0.0.1:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    httpx.get(f"{base}/docs", timeout=0.5)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+
+            baseline = _rss_mb(server.pid)
+            peak = {"rss": baseline}
+            done = threading.Event()
+
+            def sample():
+                while not done.is_set():
+                    peak["rss"] = max(peak["rss"], _rss_mb(server.pid))
+                    time.sleep(0.01)
+
+            sampler = threading.Thread(target=sample)
+            sampler.start()
+            start = time.perf_counter()
+            try:
+                with open(upload_path, "rb") as f:
+                    response = httpx.post(
+                        f"{base}/jobs",
+                        data={"user": "bench"},
+                        files={"audio_file": (upload_path.name, f, "audio/mpeg")},
+                        timeout=600,
+                    )
+            finally:
+                done.set()
+                sampler.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    return baseline, peak["rss"], response.status_code, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=400, help="送信するファイルのサイズ（MB）")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64, help="許容するRSS増加量（MB）")
+    args = parser.parse_args()
+
+    baseline, peak, status_code, elapsed = measure_upload_rss(args.size_mb)
+    growth = peak - baseline
+    print(f"送信サイズ: {args.size_mb} MB ({elapsed:.1f}秒, HTTP {status_code})")
+    print(f"サーバRSS: 開始時 {baseline:.1f} MB / ピーク {peak:.1f} MB (増加 {growth:.1f} MB)")
+    if growth > args.max_rss_growth_mb:
+        print(f"NG: RSSの増加が上限 {args.max_rss_growth_mb} MB を超えました")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
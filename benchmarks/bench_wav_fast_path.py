@@ -0,0 +1,124 @@
+"""
+非圧縮WAVの高速経路（RIFFヘッダを直接読み、メモリマップしたサンプルをffmpegへ直接渡す）と、
+従来のffmpegによる経路の、分割（エンコード）の所要時間とピークRSSの比較ベンチマーク。
+
+スタジオの録音機に似せた48kHz・16bit・ステレオの合成WAVを --minutes 分生成し、次の2つの方式で
+Whisperへ送るチャンクを作ります（無音の除去は行いません）。
+  ffmpeg : 分割位置の探索ごとにffmpegで区間を読み出し、チャンクごとにffmpegが元ファイルをシークしてエンコードする
+           （1チャンクに収まる場合はファイル全体をMP3に変換する）
+  mmap   : prepare_audio（非圧縮WAVの高速経路）。分割位置の探索はメモリマップしたサンプルを直接解析し、
+           各チャンクのフレームの範囲を複製せずにffmpegの標準入力へ渡す
+
+ピークRSSを正しく測るため、各方式は別プロセスで実行します（ffmpegのプロセスは含みません）。
+--minutes を変えて実行すると、mmap のピークRSSがファイルの大きさによらないことを確認できます。
+
+使い方:
+    python -m benchmarks.bench_wav_fast_path --minutes 60 --chunk-seconds 600
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_pipeline import DEFAULT_CORPUS_DIR
+from benchmarks.synthetic_audio import corpus_file
+
+MODES = ("ffmpeg", "mmap")
+
+
+def _peak_rss_mb() -> float:
+    # Linuxでは ru_maxrss は KB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, source: Path, chunk_seconds: int) -> dict:
+    os.environ["OKOSHI_SILENCE_COMPACTION"] = "false"
+    os.environ["OKOSHI_MAX_CHUNK_SECONDS"] = str(chunk_seconds)
+    from api.utils.audio_utils import AudioChunk, AudioProcessor
+    from api.utils.silence import iter_split_points
+
+    work_dir = Path(tempfile.mkdtemp(prefix=f"bench_wav_{mode}_"))
+    try:
+        target = work_dir / source.name
+        shutil.copy(source, target)
+        processor = AudioProcessor(output_dir=str(work_dir / "processed_audio"))
+        # アップロードのサイズ上限（500MB）を超える長さでも計測できるようにする
+        processor.max_file_size_mb = 1 << 20
+        rss_before = _peak_rss_mb()
+
+        start = time.perf_counter()
+        if mode == "ffmpeg":
+            duration = processor.probe_duration(target)
+            plan = processor.plan_encoding(duration)
+            if plan.chunk_count == 1:
+                chunks = [AudioChunk(processor.convert_to_mp3_if_needed(target, plan=plan), 0, 0.0, duration)]
+            else:
+                split_dir = work_dir / "split_files"
+                split_dir.mkdir()
+                chunks = []
+                split_points = iter_split_points(
+                    int(duration * 1000), plan.chunk_length * 1000, processor.split_search_window * 1000,
+                    lambda start_ms, length_ms: processor._read_pcm_window(target, start_ms, length_ms),
+                )
+                for index, (start_ms, end_ms) in enumerate(split_points):
+                    output_path = split_dir / f"{target.stem}_part_{index:03d}.mp3"
+                    processor._encode_segment(target, start_ms / 1000, (end_ms - start_ms) / 1000, output_path, plan)
+                    chunks.append(AudioChunk(output_path, index, start_ms / 1000, end_ms / 1000))
+        else:
+            prepared = processor.prepare_audio(target, user="bench", work_dir=work_dir)
+            chunks = prepared.chunks
+        elapsed = time.perf_counter() - start
+
+        return {
+            "mode": mode,
+            "seconds": elapsed,
+            "chunks": len(chunks),
+            "peak_rss_mb": _peak_rss_mb(),
+            "rss_increase_mb": _peak_rss_mb() - rss_before,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60, help="合成WAVの長さ（分）")
+    parser.add_argument("--chunk-seconds", type=int, default=600, help="1チャンクの長さの上限（秒、OKOSHI_MAX_CHUNK_SECONDS）")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR, help="合成音声の保存先（再利用されます）")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--source", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.source, args.chunk_seconds)))
+        return
+
+    print(f"合成WAVを準備中: 48kHz・16bit・ステレオ {args.minutes:g}分", flush=True)
+    source = corpus_file(args.corpus_dir, "wav", args.minutes, sample_rate=48000, channels=2)
+    size_mb = source.stat().st_size / (1024 * 1024)
+
+    results = []
+    for mode in MODES:
+        print(f"計測中: {mode}", flush=True)
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_wav_fast_path", "--mode", mode, "--source", str(source),
+             "--chunk-seconds", str(args.chunk_seconds)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, text=True,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print()
+    print(f"入力: {source.name}（{size_mb:.0f}MB）")
+    print(f"{'方式':<7} {'所要時間(秒)':>12} {'チャンク数':>10} {'ピークRSS(MB)':>14} {'RSS増加(MB)':>12}")
+    for row in results:
+        print(f"{row['mode']:<7} {row['seconds']:>12.2f} {row['chunks']:>10} {row['peak_rss_mb']:>14.1f} {row['rss_increase_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+WhisperService.transcribe_multiple_files の並列度と、イベントループがブロックされないことを確認するベンチマーク。
+
+ローカルの代替サーバ（benchmarks/fake_whisper_server.py）を遅延付きで起動し、
+N個のチャンクを文字起こしした壁時計時間・サーバ側の最大同時リクエスト数・
+イベントループの最大遅延（他のリクエストが処理できるかの指標）を表示します。
+
+使い方:
+    python -m benchmarks.bench_whisper_concurrency --chunks 12 --latency 2.0
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(latency: float, failure_rate: float = 0.0, bytes_per_sec: float = None) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = {**os.environ, "FAKE_WHISPER_LATENCY": str(latency), "FAKE_WHISPER_FAILURE_RATE": str(failure_rate)}
+    if bytes_per_sec:
+        env["FAKE_WHISPER_BYTES_PER_SEC"] = str(bytes_per_sec)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.fake_whisper_server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base}/stats", timeout=0.5)
+            return proc, base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("代替サーバの起動に失敗しました")
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.05) -> float:
+    """
+    一定間隔でsleepし、予定時刻からの遅れの最大値を返す。
+    """
+    max_lag = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, loop.time() - expected)
+    return max_lag
+
+
+async def run(chunks: int, chunk_kb: int, job_concurrency: int):
+    from api.utils.wisper_service import WhisperService
+
+    service = WhisperService(api_key="dummy", job_concurrency=job_concurrency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(chunks):
+            path = Path(tmp) / f"bench_part_{i:03d}.mp3"
+            path.write_bytes(os.urandom(chunk_kb * 1024))
+            paths.append(str(path))
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(stop))
+        start = time.perf_counter()
+        results = await service.transcribe_multiple_files(paths, language="ja")
+        elapsed = time.perf_counter() - start
+        stop.set()
+        max_lag = await lag_task
+
+    return elapsed, results, max_lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=2.0, help="代替サーバの1リクエストあたりの遅延（秒）")
+    parser.add_argument("--chunk-kb", type=int, default=512, help="ダミーチャンクのサイズ（KB）")
+    parser.add_argument("--job-concurrency", type=int, default=12)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="代替サーバが429を返す確率")
+    args = parser.parse_args()
+
+    proc, base = start_fake_server(args.latency, args.failure_rate)
+    try:
+        os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+        elapsed, results, max_lag = asyncio.run(run(args.chunks, args.chunk_kb, args.job_concurrency))
+        stats = httpx.get(f"{base}/stats").json()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    succeeded = sum(1 for r in results if r["success"])
+    print(f"チャンク数: {args.chunks} (成功 {succeeded})")
+    print(f"壁時計時間: {elapsed:.2f}秒 (逐次実行なら約 {args.chunks * args.latency:.1f}秒)")
+    print(f"サーバ側の最大同時リクエスト数: {stats['max_in_flight']}")
+    print(f"APIリクエスト数: {stats['requests']} (うち429: {stats['rate_limited']}, 再試行を含む)")
+    print(f"イベントループの最大遅延: {max_lag * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
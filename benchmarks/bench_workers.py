@@ -0,0 +1,145 @@
+"""
+ワーカー数に対するスケーリングのベンチマーク。
+
+APIサーバを OKOSHI_ROLE=api で起動し、同じ共有ストレージ（一時ディレクトリ）を使うワーカー
+（python -m api.worker）を 1, 2, 4 ... 台起動して、1本の長い合成音声をジョブとして投入します。
+Whisper APIの代わりにローカルの代替サーバ（benchmarks/fake_whisper_server.py）を使い、
+ワーカー1台あたりの同時リクエスト数（--worker-concurrency）を小さくすることで、
+ワーカーの台数が処理能力の上限になる状況を再現します。
+
+ワーカー数ごとに、受信から結果保存までの壁時計時間・1台のときに対する速度比・
+実際にチャンクを処理したワーカー数を表示します。台数にほぼ比例して短くなれば、
+1つの録音のチャンクが複数のワーカーで分担されていることになります。
+
+使い方:
+    python -m benchmarks.bench_workers --workers 1,2,4 --minutes 16 --latency 2.0
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_pipeline import DEFAULT_CORPUS_DIR, REPO_ROOT, start_api_server
+from benchmarks.bench_whisper_concurrency import start_fake_server
+from benchmarks.synthetic_audio import corpus_file
+
+
+def start_workers(count: int, env: dict, log_path: Path) -> list[subprocess.Popen]:
+    log_file = open(log_path, "w")
+    workers = [
+        subprocess.Popen([sys.executable, "-m", "api.worker"], env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        for _ in range(count)
+    ]
+    log_file.close()
+    # 起動（モジュールの読み込み）にかかる時間を計測に含めないよう、すべてのワーカーがキューを見始めるまで待つ
+    for _ in range(600):
+        if log_path.read_text(encoding="utf-8").count('"worker_started"') >= count:
+            return workers
+        time.sleep(0.1)
+    stop_processes(workers)
+    raise RuntimeError("ワーカーの起動に失敗しました")
+
+
+def stop_processes(processes: list[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_job(base: str, source: Path, poll_interval: float = 0.2) -> dict:
+    start = time.perf_counter()
+    with open(source, "rb") as f:
+        response = httpx.post(
+            f"{base}/jobs",
+            data={"user": "bench"},
+            files={"audio_file": (source.name, f, "application/octet-stream")},
+            timeout=3600,
+        )
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    while True:
+        status = httpx.get(f"{base}/jobs/{job_id}", timeout=30).json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(poll_interval)
+    wall = time.perf_counter() - start
+    if status["status"] == "failed":
+        return {"status": "failed", "error": status["error"], "wall_seconds": wall}
+    result = httpx.get(f"{base}/result/{job_id}", timeout=30).json()
+    timings = result["processing_info"]["stage_timings"]
+    return {
+        "status": "done",
+        "wall_seconds": wall,
+        "chunks": timings["encoding_plan"]["chunk_count"],
+        "failed_chunks": result["transcription_text"].count("文字起こしに失敗しました"),
+        "workers_used": timings.get("workers"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="ワーカー数のカンマ区切り")
+    parser.add_argument("--minutes", type=float, default=16, help="合成音声の長さ（分）")
+    parser.add_argument("--format", default="mp3", help="合成音声の形式（wav / mp3 / m4a）")
+    parser.add_argument("--chunk-seconds", type=int, default=60, help="チャンクの最大長（秒）")
+    parser.add_argument("--worker-concurrency", type=int, default=2, help="ワーカー1台あたりの同時文字起こし数")
+    parser.add_argument("--latency", type=float, default=2.0, help="代替サーバの1リクエストあたりの遅延（秒）")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR, help="合成音声の保存先（再利用されます）")
+    args = parser.parse_args()
+
+    print(f"合成音声を準備中: {args.format} {args.minutes:g}分", flush=True)
+    source = corpus_file(args.corpus_dir, args.format, args.minutes)
+
+    whisper, whisper_base = start_fake_server(args.latency, bytes_per_sec=4000)
+    rows = []
+    try:
+        for count in [int(value) for value in args.workers.split(",")]:
+            # ワーカー数ごとに新しい共有ストレージを使い、キャッシュなしの状態で計測する
+            with tempfile.TemporaryDirectory(prefix="bench_workers_") as tmp:
+                data_dir = Path(tmp)
+                env = {
+                    **os.environ,
+                    "PYTHONPATH": str(REPO_ROOT),
+                    "OPENAI_API_KEY": "dummy",
+                    "OPENAI_BASE_URL": f"{whisper_base}/v1",
+                    "OKOSHI_DATA_DIR": str(data_dir),
+                    "OKOSHI_ROLE": "api",
+                    "OKOSHI_MAX_CHUNK_SECONDS": str(args.chunk_seconds),
+                    "OKOSHI_WORKER_CONCURRENCY": str(args.worker_concurrency),
+                    "OKOSHI_QUEUE_POLL_SECONDS": "0.1",
+                    "OKOSHI_LOG_FORMAT": "json",
+                }
+                server, base = start_api_server(data_dir, whisper_base, data_dir / "server.log", extra_env=env)
+                workers = start_workers(count, env, data_dir / "workers.log")
+                try:
+                    outcome = run_job(base, source)
+                finally:
+                    stop_processes(workers + [server])
+            rows.append({"workers": count, **outcome})
+            print(f"ワーカー {count} 台: {outcome['status']} {outcome['wall_seconds']:.1f}秒", flush=True)
+    finally:
+        whisper.terminate()
+
+    baseline = next((row["wall_seconds"] for row in rows if row["status"] == "done"), None)
+    print()
+    print(f"{'ワーカー数':>8} {'壁時計(秒)':>10} {'速度比':>6} {'チャンク':>6} {'失敗':>4} {'処理したワーカー':>8}")
+    for row in rows:
+        if row["status"] != "done":
+            print(f"{row['workers']:>8} {row['wall_seconds']:>10.1f}  失敗: {row['error']}")
+            continue
+        speedup = baseline / row["wall_seconds"] if baseline else 0
+        print(f"{row['workers']:>8} {row['wall_seconds']:>10.1f} {speedup:>6.2f} {row['chunks']:>6} "
+              f"{row['failed_chunks']:>4} {row['workers_used']!s:>8}")
+
+
+if __name__ == "__main__":
+    main()
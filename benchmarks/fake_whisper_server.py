@@ -0,0 +1,84 @@
+"""
+OpenAI Whisper API（/v1/audio/transcriptions）のローカル代替サーバ。
+実際の音声認識は行わず、設定した遅延の後に verbose_json 形式のダミー結果を返します。
+
+環境変数:
+    FAKE_WHISPER_LATENCY   1リクエストあたりの遅延（秒、既定: 2.0）
+    FAKE_WHISPER_BYTES_PER_SEC  ダミーの音声長を算出するためのバイトレート（既定: 16000 = 128kbps MP3相当）
+    FAKE_WHISPER_FAILURE_RATE   レート制限エラー（429, Retry-After付き）を返す確率（既定: 0.0）
+    FAKE_WHISPER_RETRY_AFTER    429応答に付けるRetry-Afterの秒数（既定: 1）
+
+起動例:
+    uvicorn benchmarks.fake_whisper_server:app --port 9000
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=dummy uvicorn api.main:app
+"""
+import asyncio
+import os
+import random
+import time
+
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+
+LATENCY = float(os.getenv("FAKE_WHISPER_LATENCY", "2.0"))
+BYTES_PER_SEC = float(os.getenv("FAKE_WHISPER_BYTES_PER_SEC", "16000"))
+FAILURE_RATE = float(os.getenv("FAKE_WHISPER_FAILURE_RATE", "0.0"))
+RETRY_AFTER = os.getenv("FAKE_WHISPER_RETRY_AFTER", "1")
+
+# 同時に処理中のリクエスト数（並列度の確認用）
+stats = {"in_flight": 0, "max_in_flight": 0, "requests": 0, "rate_limited": 0}
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(
+    file: UploadFile = File(...),
+    model: str = Form("whisper-1"),
+    language: str = Form("ja"),
+    response_format: str = Form("json"),
+    temperature: float = Form(0.0),
+):
+    stats["requests"] += 1
+    if random.random() < FAILURE_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": RETRY_AFTER},
+            content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+        )
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        content = await file.read()
+        await asyncio.sleep(LATENCY)
+    finally:
+        stats["in_flight"] -= 1
+
+    duration = len(content) / BYTES_PER_SEC
+    text = f"{file.filename} のダミー書き起こし"
+    return {
+        "task": "transcribe",
+        "language": language,
+        "duration": duration,
+        "text": text,
+        "segments": [
+            {
+                "id": 0,
+                "seek": 0,
+                "start": 0.0,
+                "end": duration,
+                "text": text,
+                "tokens": [],
+                "temperature": temperature,
+                "avg_logprob": 0.0,
+                "compression_ratio": 1.0,
+                "no_speech_prob": 0.0,
+            }
+        ],
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "latency": LATENCY, "failure_rate": FAILURE_RATE, "time": time.time()}
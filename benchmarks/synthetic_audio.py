@@ -0,0 +1,157 @@
+"""
+ベンチマーク用の「話し声らしい」合成音声を生成します。
+
+実際の音声認識はしないため内容は無意味ですが、次の点を記者会見・取材の録音に似せています。
+  - 基本周波数100〜220Hzの倍音を持つ音節（120〜300ms）が並び、音節の間に短い間がある
+  - 4〜16音節ごとに0.3〜1.2秒の無音（息継ぎ）が入る（無音位置での分割が働く）
+  - 小さな背景ノイズ
+
+PCMはブロック単位で生成してそのまま書き出すため、3時間の音声でもメモリ使用量は一定です。
+同じ seed からは同じ音声が生成されます。
+
+使い方:
+    python -m benchmarks.synthetic_audio --minutes 60 --format m4a corpus/speech_60min.m4a
+"""
+import argparse
+import subprocess
+import wave
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+from pydub import AudioSegment
+
+FORMATS = ("wav", "mp3", "m4a")
+
+# 形式ごとのffmpegの出力オプション（wavはffmpegを使わず直接書き出す）
+FFMPEG_OUTPUT_OPTIONS = {
+    "mp3": ["-codec:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"],
+    "m4a": ["-codec:a", "aac", "-b:a", "96k", "-f", "ipod"],
+}
+
+
+def _syllable_bank(rng: np.random.Generator, sample_rate: int, size: int = 64) -> list[np.ndarray]:
+    """
+    音節の波形（-1.0〜1.0）を size 個作ります。長い音声は、これを並べ替えて組み立てます。
+    """
+    bank = []
+    for _ in range(size):
+        n = int(rng.uniform(0.12, 0.3) * sample_rate)
+        t = np.arange(n) / sample_rate
+        # 抑揚（基本周波数のゆらぎ）を付けた倍音の和
+        f0 = rng.uniform(100, 220)
+        frequency = f0 * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(1, 4) * t))
+        phase = 2 * np.pi * np.cumsum(frequency) / sample_rate
+        voiced = sum(np.sin(k * phase) * (0.6 / k) for k in range(1, 7))
+        envelope = np.sin(np.pi * np.arange(n) / n) ** 2
+        bank.append((voiced * envelope).astype(np.float32))
+    return bank
+
+
+def _phrase(rng: np.random.Generator, bank: list[np.ndarray], sample_rate: int) -> np.ndarray:
+    """
+    息継ぎまでの1フレーズ分の波形（-1.0〜1.0）を返します。
+    """
+    parts = []
+    for _ in range(int(rng.integers(4, 17))):
+        parts.append(bank[int(rng.integers(len(bank)))] * rng.uniform(0.2, 0.45))
+        parts.append(np.zeros(int(rng.uniform(0.02, 0.08) * sample_rate), dtype=np.float32))
+    parts.append(np.zeros(int(rng.uniform(0.3, 1.2) * sample_rate), dtype=np.float32))
+    phrase = np.concatenate(parts)
+    phrase += rng.normal(0, 0.003, len(phrase)).astype(np.float32)
+    return phrase
+
+
+def iter_speech_like_pcm(seconds: float, sample_rate: int = 44100, seed: int = 0,
+                         block_seconds: float = 30) -> Iterator[np.ndarray]:
+    """
+    合計 seconds 秒のモノラル16bit PCMを、block_seconds 秒ずつ返すジェネレータです。
+    """
+    rng = np.random.default_rng(seed)
+    bank = _syllable_bank(rng, sample_rate)
+    total = int(seconds * sample_rate)
+    block = int(block_seconds * sample_rate)
+    pending = np.empty(0, dtype=np.float32)
+    produced = 0
+    while produced < total:
+        parts = [pending]
+        filled = len(pending)
+        while filled < block:
+            parts.append(_phrase(rng, bank, sample_rate))
+            filled += len(parts[-1])
+        pending = np.concatenate(parts)
+        size = min(block, total - produced)
+        out, pending = pending[:size], pending[size:]
+        produced += size
+        yield (np.clip(out, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def write_speech_like_audio(path: Path, minutes: float, fmt: str = None, sample_rate: int = 44100,
+                            channels: int = 1, seed: int = 0) -> Path:
+    """
+    合成音声を path に書き出します。形式（wav / mp3 / m4a）は fmt か拡張子で決まります。
+    """
+    path = Path(path)
+    fmt = (fmt or path.suffix.lstrip(".")).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"対応していない形式です: {fmt}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    blocks = iter_speech_like_pcm(minutes * 60, sample_rate=sample_rate, seed=seed)
+
+    if fmt == "wav":
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(channels)
+            f.setsampwidth(2)
+            f.setframerate(sample_rate)
+            for pcm in blocks:
+                f.writeframes(np.repeat(pcm, channels).tobytes())
+        return path
+
+    command = [
+        AudioSegment.converter, "-nostdin", "-v", "error", "-y",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "-",
+        *FFMPEG_OUTPUT_OPTIONS[fmt], str(path),
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for pcm in blocks:
+            process.stdin.write(np.repeat(pcm, channels).tobytes())
+    finally:
+        process.stdin.close()
+        stderr = process.stderr.read()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"FFmpegのエラー: {stderr.decode(errors='ignore').strip()}")
+    return path
+
+
+def corpus_file(corpus_dir: Path, fmt: str, minutes: float, sample_rate: int = 44100,
+                channels: int = 1, seed: int = 0) -> Path:
+    """
+    コーパスディレクトリから条件に合う合成音声を返します。まだなければ生成します。
+    """
+    path = Path(corpus_dir) / f"speech_{minutes:g}min_{sample_rate}hz_{channels}ch_seed{seed}.{fmt}"
+    if not path.exists():
+        partial = path.with_name(f"{path.stem}.part.{fmt}")
+        write_speech_like_audio(partial, minutes, fmt=fmt, sample_rate=sample_rate, channels=channels, seed=seed)
+        partial.replace(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", type=Path, help="出力ファイル（拡張子で形式を判定）")
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = write_speech_like_audio(args.output, args.minutes, fmt=args.format, sample_rate=args.sample_rate,
+                                   channels=args.channels, seed=args.seed)
+    print(f"{path}: {path.stat().st_size / (1024 * 1024):.1f} MB, {args.minutes:g}分")
+
+
+if __name__ == "__main__":
+    main()
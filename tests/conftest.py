@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# テスト中にキャッシュ・索引・作業ディレクトリがリポジトリ直下に作られないよう、モジュールの読み込み前にデータの置き場所を変える
+os.environ.setdefault("OKOSHI_DATA_DIR", tempfile.mkdtemp(prefix="okoshi_test_"))
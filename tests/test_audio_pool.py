@@ -0,0 +1,77 @@
+import asyncio
+import wave
+
+import numpy as np
+import pytest
+
+from api.utils.audio_pool import AudioWorkPool
+from api.utils.audio_utils import AudioProcessor
+from api.utils.metrics import STAGE_DURATION, collect_stages, record_stage
+
+
+def stage_count(stage: str) -> int:
+    line = next((line for line in STAGE_DURATION.render() if line.startswith(f'{STAGE_DURATION.name}_count{{stage="{stage}"}}')), None)
+    return int(line.rsplit(" ", 1)[1]) if line else 0
+
+
+def test_collect_stages_defers_recording():
+    with collect_stages() as records:
+        record_stage("test_collected", 0.25, file="a.mp3")
+    assert records == [("test_collected", 0.25, "ok", {"file": "a.mp3"})]
+    assert stage_count("test_collected") == 0
+
+
+def test_child_stages_are_recorded_in_parent():
+    # 子プロセスで記録した処理段階は、親プロセスのメトリクスに記録される
+    pool = AudioWorkPool(max_workers=1)
+
+    async def run():
+        try:
+            await pool.run(record_stage, "test_child", 0.5, file="b.mp3")
+        finally:
+            pool.shutdown()
+
+    asyncio.run(run())
+    assert stage_count("test_child") == 1
+
+
+def test_progressive_split_encodes_through_the_pool(tmp_path):
+    # 受信中のアップロードの分割も、チャンクのエンコードをプールで実行する（ffmpegの数がプールの上限に収まる）
+    source = tmp_path / "growing.wav"
+    sample_rate = 16000
+    t = np.arange(25 * sample_rate) / sample_rate
+    with wave.open(str(source), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2").tobytes())
+
+    processor = AudioProcessor(output_dir=str(tmp_path))
+    processor.progressive_chunk_length = 10
+    plan = processor.plan_progressive_encoding()
+    pool = AudioWorkPool(max_workers=1)
+    submitted = []
+    encoded_before = stage_count("encode_chunk")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+
+        def submit(fn, *args):
+            submitted.append(args[2])
+            return pool.submit_threadsafe(loop, fn, *args)
+
+        try:
+            with open(source, "rb") as reader:
+                chunks = processor.split_audio_progressive(reader, "tester", plan, "growing", work_dir=tmp_path, submit=submit)
+                return await asyncio.to_thread(list, chunks)
+        finally:
+            pool.shutdown()
+
+    chunks = asyncio.run(run())
+    assert [chunk.path for chunk in chunks] == submitted
+    # 区切りは10秒の手前の最も静かな位置になるため、25秒は3つ以上のチャンクになる
+    assert len(chunks) == plan.chunk_count >= 3
+    assert all(chunk.path.stat().st_size > 0 for chunk in chunks)
+    assert chunks[-1].end == pytest.approx(25.0, abs=0.01)
+    # 子プロセスで記録したエンコードの所要時間も親プロセスのメトリクスに入る
+    assert stage_count("encode_chunk") == encoded_before + len(chunks)
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from api.routers import okoshi
+from api.utils.job_manager import Job
+from api.utils.storage import DATA_DIR
+from api.utils.task_queue import PREPARE_TASK, TRANSCRIBE_TASK, SqliteTaskQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = SqliteTaskQueue(str(tmp_path / "tasks.sqlite3"))
+    monkeypatch.setattr(okoshi, "task_queue", queue)
+    monkeypatch.setattr(okoshi, "TASK_POLL_SECONDS", 0.02)
+    return queue
+
+
+def audio_path(name: str):
+    work_dir = DATA_DIR / "dispatch_test"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    return work_dir / name
+
+
+def chunk_payload(index: int) -> dict:
+    return {"path": f"dispatch_test/chunk_{index}.mp3", "index": index, "start": index * 10.0, "end": (index + 1) * 10.0,
+            "total": 1, "language": "ja"}
+
+
+def test_dispatch_fails_when_no_worker_claims_the_task(queue, monkeypatch):
+    monkeypatch.setattr(okoshi, "TASK_STALL_TIMEOUT_SECONDS", 0.2)
+    job = Job("tester", "a.wav")
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(asyncio.wait_for(okoshi.dispatch_audio_file(job, audio_path("a.wav"), "tester"), 10))
+
+    assert raised.value.status_code == 504
+    assert "api.worker" in raised.value.detail
+    # 失敗したジョブのタスクはキューから取り除かれる
+    assert queue.tasks(job.id) == []
+
+
+def test_dispatch_keeps_waiting_while_workers_are_busy_with_other_jobs(queue, monkeypatch):
+    monkeypatch.setattr(okoshi, "TASK_STALL_TIMEOUT_SECONDS", 0.3)
+    job = Job("tester", "a.wav")
+
+    async def busy_worker():
+        # 他のジョブのタスクのリースを延長し続ける（このジョブのタスクは取り出さない）
+        queue.put("other", TRANSCRIBE_TASK, chunk_payload(0))
+        other = queue.claim("w1", [TRANSCRIBE_TASK], 60)
+        for _ in range(8):
+            await asyncio.sleep(0.1)
+            queue.renew([other.id], "w1", 60)
+        task = queue.claim("w1", [PREPARE_TASK], 60)
+        queue.complete(task.id, "w1", {"chunk_count": 0, "stage_seconds": {}, "encode_seconds": 0.0, "encoding_plan": {}})
+
+    async def run():
+        worker = asyncio.create_task(busy_worker())
+        result = await asyncio.wait_for(okoshi.dispatch_audio_file(job, audio_path("a.wav"), "tester"), 10)
+        await worker
+        return result
+
+    combined, _ = asyncio.run(run())
+    assert combined["success"] is False  # チャンクが0件のため
+    assert queue.tasks(job.id) == []
+
+
+def test_dispatch_prefers_a_done_duplicate_over_a_failed_one(queue):
+    job = Job("tester", "a.wav")
+
+    async def worker():
+        while (prepare := queue.claim("w1", [PREPARE_TASK], 60)) is None:
+            await asyncio.sleep(0.01)
+        # 準備のやり直しで、同じチャンクのタスクが2件登録された場合
+        queue.put(job.id, TRANSCRIBE_TASK, chunk_payload(0))
+        queue.put(job.id, TRANSCRIBE_TASK, chunk_payload(0))
+        queue.complete(prepare.id, "w1", {"chunk_count": 1, "stage_seconds": {}, "encode_seconds": 0.0, "encoding_plan": {}})
+        first = queue.claim("w1", [TRANSCRIBE_TASK], 60)
+        second = queue.claim("w1", [TRANSCRIBE_TASK], 60)
+        queue.fail(first.id, "w1", "一時的なエラー")
+        # 失敗したタスクが先に終わっても、もう一方の完了を待ってそちらを使う
+        await asyncio.sleep(0.2)
+        queue.complete(second.id, "w1", {"text": "こんにちは", "success": True, "processing_time": 1.0})
+
+    async def run():
+        task = asyncio.create_task(worker())
+        result = await asyncio.wait_for(okoshi.dispatch_audio_file(job, audio_path("a.wav"), "tester"), 10)
+        await task
+        return result
+
+    combined, _ = asyncio.run(run())
+    assert combined["success"] is True
+    assert combined["combined_text"] == "こんにちは"
+    assert combined["failed_count"] == 0
@@ -0,0 +1,86 @@
+import json
+import wave
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.routers import okoshi
+from api.utils.transcription_backends import TranscriptionBackend, TranscriptionResponse
+
+
+class EchoBackend(TranscriptionBackend):
+    """
+    チャンクのファイル名を本文として返すバックエンドです（APIを呼び出しません）。
+    """
+    name = "echo"
+
+    @property
+    def model(self) -> str:
+        return "echo"
+
+    async def transcribe(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        return TranscriptionResponse(f"本文 {filename}", language, 1.0, [{"start": 0.0, "end": 1.0, "text": f"本文 {filename}"}])
+
+
+def write_tone(path, seconds: float, sample_rate: int = 16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    samples = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+
+
+def parse_events(body: str) -> list[dict]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            event = json.loads(fields["data"])
+            assert int(fields["id"]) == event["id"]
+            assert fields["event"] == event["type"]
+            events.append(event)
+    return events
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(okoshi.whisper_service, "backend", EchoBackend())
+    monkeypatch.setattr(okoshi.whisper_service, "overflow_backend", None)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_events_stream_progress_chunk_transcripts_and_the_terminal_event(client, tmp_path):
+    audio = tmp_path / "events.wav"
+    write_tone(audio, seconds=3)
+
+    with open(audio, "rb") as f:
+        response = client.post("/jobs", data={"user": "events"}, files={"audio_file": ("events.wav", f, "audio/wav")})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    # ジョブが終了すると配信が終わるため、本文をすべて読めば最後のイベントまでそろう
+    events = parse_events(client.get(f"/jobs/{job_id}/events").text)
+    types = [event["type"] for event in events]
+
+    assert [event["id"] for event in events] == list(range(1, len(events) + 1))
+    assert types[-1] == "done" and types.count("done") == 1
+    assert "failed" not in types
+    assert types.index("chunk_encoded") < types.index("chunk_transcribed")
+
+    progress = [event["progress"] for event in events]
+    assert progress == sorted(progress)
+    assert events[-1]["progress"] == 1.0 and events[-1]["status"] == "done"
+
+    transcribed = [event for event in events if event["type"] == "chunk_transcribed"]
+    assert [event["index"] for event in transcribed] == list(range(len(transcribed)))
+    assert all(event["success"] and event["text"].startswith("本文") for event in transcribed)
+    assert transcribed[-1]["end"] == pytest.approx(3.0, abs=0.1)
+
+    # 途中から再接続した場合は、Last-Event-ID より後のイベントだけを受け取る
+    resumed = parse_events(client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": str(len(events) - 2)}).text)
+    assert [event["id"] for event in resumed] == [len(events) - 1, len(events)]
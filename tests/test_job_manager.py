@@ -0,0 +1,62 @@
+from api.utils import job_manager as job_manager_module
+from api.utils.job_manager import FairJobQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def names(queue: FairJobQueue) -> list[str]:
+    return [item for _, item in queue.ordered()]
+
+
+def test_shorter_jobs_come_first(monkeypatch):
+    monkeypatch.setattr(job_manager_module.time, "monotonic", Clock())
+    queue = FairJobQueue(maxsize=10, aging=1.0)
+
+    queue.put_nowait("a", "long", cost=7200)
+    queue.put_nowait("b", "short", cost=300)
+
+    assert names(queue) == ["short", "long"]
+
+
+def test_one_users_backlog_does_not_block_other_users(monkeypatch):
+    monkeypatch.setattr(job_manager_module.time, "monotonic", Clock())
+    queue = FairJobQueue(maxsize=10, aging=1.0)
+
+    for index in range(3):
+        queue.put_nowait("heavy", f"heavy{index}", cost=600)
+    queue.put_nowait("light", "light", cost=600)
+
+    # 同じ利用者の実行待ちのジョブの分だけ後ろに回るため、後から投入した別の利用者のジョブは2番目に入る
+    assert names(queue) == ["heavy0", "light", "heavy1", "heavy2"]
+    assert queue.waiting_users() == 2
+
+
+def test_aging_lets_a_long_waiting_job_overtake_new_short_jobs(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_manager_module.time, "monotonic", clock)
+    queue = FairJobQueue(maxsize=10, aging=1.0)
+
+    queue.put_nowait("a", "long", cost=3600)
+    clock.now += 1800
+    queue.put_nowait("b", "short_early", cost=600)
+    # 長いジョブは待った時間（aging × 経過秒）の分だけ先頭に近づく
+    assert names(queue) == ["short_early", "long"]
+
+    clock.now += 1800
+    queue.put_nowait("c", "short_late", cost=600)
+    assert names(queue) == ["short_early", "long", "short_late"]
+
+
+def test_capacity(monkeypatch):
+    monkeypatch.setattr(job_manager_module.time, "monotonic", Clock())
+    queue = FairJobQueue(maxsize=2, aging=1.0)
+    queue.put_nowait("a", "first")
+    assert queue.free_slots() == 1
+    queue.put_nowait("a", "second")
+    assert queue.full()
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from api.utils.pcm_wav import open_pcm_wav, read_wav_format, write_pcm_wav
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int = 16000) -> Path:
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(samples.dtype.itemsize)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def test_reads_samples_without_decoding(tmp_path):
+    samples = np.arange(-800, 800, dtype=np.int16).reshape(-1, 2)
+    path = write_wav(tmp_path / "a.wav", samples)
+
+    wav_format = read_wav_format(path)
+    assert (wav_format.channels, wav_format.sample_rate, wav_format.frame_count) == (2, 16000, 800)
+    assert wav_format.codec == "pcm_s16le"
+    with open_pcm_wav(path) as wav:
+        assert np.array_equal(wav.samples(100, 200), samples[100:200])
+        assert bytes(wav.frames(0, 1)) == samples[:1].tobytes()
+
+
+def test_truncated_data_chunk_counts_frames_present(tmp_path):
+    path = write_wav(tmp_path / "a.wav", np.zeros((1000, 1), dtype=np.int16))
+    with open(path, "r+b") as f:
+        f.truncate(44 + 600 * 2)
+    assert read_wav_format(path).frame_count == 600
+
+
+def test_24bit_extensible(tmp_path):
+    values = np.array([[-8388608, 8388607], [1, -1], [256, -256]], dtype=np.int32)
+    raw = b"".join(int(v).to_bytes(3, "little", signed=True) for v in values.ravel())
+    guid = struct.pack("<H", 1) + bytes.fromhex("000000001000800000aa00389b71")
+    fmt = struct.pack("<HHIIHH", 0xFFFE, 2, 48000, 48000 * 6, 6, 24) + struct.pack("<HHI", 22, 24, 3) + guid
+    path = tmp_path / "ext.wav"
+    path.write_bytes(
+        b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(raw)) + b"WAVE"
+        + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(raw)) + raw
+    )
+    with open_pcm_wav(path) as wav:
+        assert wav.format.ffmpeg_format == "s24le"
+        assert np.array_equal(wav.samples(0, 3), values)
+
+
+def test_rejects_compressed_and_non_wav(tmp_path):
+    path = write_wav(tmp_path / "a.wav", np.zeros((10, 1), dtype=np.int16))
+    data = bytearray(path.read_bytes())
+    data[20:22] = struct.pack("<H", 2)  # ADPCM
+    adpcm = tmp_path / "adpcm.wav"
+    adpcm.write_bytes(bytes(data))
+    other = tmp_path / "a.mp3"
+    other.write_bytes(b"ID3" + bytes(100))
+    assert read_wav_format(adpcm) is None
+    assert read_wav_format(other) is None
+
+
+def test_write_regions_keeps_format(tmp_path):
+    samples = np.arange(2000, dtype=np.int16).reshape(-1, 2)
+    source = write_wav(tmp_path / "a.wav", samples)
+    with open_pcm_wav(source) as wav:
+        output = write_pcm_wav(tmp_path / "b.wav", wav, [(0, 100), (500, 600)], block_frames=30)
+    with open_pcm_wav(output) as wav:
+        assert np.array_equal(wav.samples(0, wav.frame_count), np.concatenate([samples[0:100], samples[500:600]]))
+
+
+SPLIT_SCRIPT = """
+import json, resource, sys
+from pathlib import Path
+from api.utils.audio_utils import AudioProcessor
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+source, work_dir = Path(sys.argv[1]), Path(sys.argv[2])
+processor = AudioProcessor(output_dir=str(work_dir))
+plan = processor.plan_encoding(processor.probe_duration(source))
+before = peak_mb()
+chunks = list(processor.split_audio_streaming(source, user="test", plan=plan, max_workers=1, work_dir=work_dir))
+print(json.dumps({"chunks": len(chunks), "increase_mb": peak_mb() - before}))
+"""
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is required")
+def test_split_memory_does_not_grow_with_file_length(tmp_path):
+    # 48kHz・ステレオの4分と16分のWAVを60秒ごとに分割し、メモリ使用量の増加がファイルの長さ（約44MBと176MB）によらないことを確認する
+    from benchmarks.synthetic_audio import write_speech_like_audio
+
+    increases = {}
+    for minutes in (4, 16):
+        source = write_speech_like_audio(tmp_path / f"{minutes}min.wav", minutes, fmt="wav", sample_rate=48000, channels=2)
+        work_dir = tmp_path / f"work_{minutes}"
+        completed = subprocess.run(
+            [sys.executable, "-c", SPLIT_SCRIPT, str(source), str(work_dir)],
+            cwd=REPO_ROOT, env={**os.environ, "OKOSHI_MAX_CHUNK_SECONDS": "60", "OKOSHI_DATA_DIR": str(tmp_path)},
+            stdout=subprocess.PIPE, check=True, text=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        assert result["chunks"] >= minutes
+        increases[minutes] = result["increase_mb"]
+        source.unlink()
+    assert increases[16] - increases[4] < 8, increases
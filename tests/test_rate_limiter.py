@@ -0,0 +1,36 @@
+import asyncio
+
+from api.utils.rate_limiter import AsyncRateLimiter, SqliteRateLimiter
+
+
+def test_async_rate_limiter_burst_then_waits():
+    limiter = AsyncRateLimiter(60, burst=3)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire()
+        return limiter.would_wait()
+
+    assert asyncio.run(run())
+
+
+def test_sqlite_rate_limiter_is_shared_between_processes(tmp_path):
+    # 同じファイルを使う2つの制限（2つのワーカーに相当）で、トークンを合わせて burst 個までしか取り出せない
+    path = str(tmp_path / "tasks.sqlite3")
+    first = SqliteRateLimiter(path, 6, burst=5)
+    second = SqliteRateLimiter(path, 6, burst=5)
+
+    assert [first.try_acquire() for _ in range(3)] == [0.0] * 3
+    assert [second.try_acquire() for _ in range(2)] == [0.0] * 2
+    assert second.try_acquire() > 0
+    assert first.would_wait()
+
+
+def test_sqlite_rate_limiter_pause_applies_to_all(tmp_path):
+    path = str(tmp_path / "tasks.sqlite3")
+    first = SqliteRateLimiter(path, 600, burst=10)
+    second = SqliteRateLimiter(path, 600, burst=10)
+
+    first.pause(30)
+    assert second.would_wait()
+    assert 29 < second.try_acquire() <= 30
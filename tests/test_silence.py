@@ -0,0 +1,46 @@
+import pytest
+
+from api.utils.silence import TimeRemap
+
+
+@pytest.fixture
+def remap() -> TimeRemap:
+    # 100Hz・元の長さ10秒のうち、1-3秒と5-8秒を残した（先頭・途中・末尾の無音を取り除いた）場合
+    return TimeRemap.from_regions([(100, 300), (500, 800)], sample_rate=100, original_length=1000)
+
+
+def test_lengths_and_summary(remap):
+    assert remap.compacted_seconds == 5.0
+    assert remap.original_seconds == 10.0
+    assert remap.saved_seconds == 5.0
+    assert remap.removed_regions == 3
+    assert remap.summary()["saved_minutes"] == round(5 / 60, 2)
+
+
+def test_to_original_maps_each_kept_region(remap):
+    assert remap.to_original(0.0) == 1.0
+    assert remap.to_original(1.5) == 2.5
+    assert remap.to_original(2.5) == 5.5
+    assert remap.to_original(5.0) == 8.0
+
+
+def test_to_original_at_a_seam_depends_on_end(remap):
+    # 継ぎ目（詰めた音声の2秒）は、開始なら後ろの区間の先頭、終了なら前の区間の末尾に変換する
+    assert remap.to_original(2.0) == 5.0
+    assert remap.to_original(2.0, end=True) == 3.0
+
+
+def test_to_original_clamps_out_of_range_times(remap):
+    assert remap.to_original(-1.0) == 1.0
+    assert remap.to_original(99.0, end=True) == 8.0
+
+
+def test_round_trips_through_dict(remap):
+    restored = TimeRemap.from_dict(remap.to_dict())
+    assert [restored.to_original(t / 10) for t in range(51)] == [remap.to_original(t / 10) for t in range(51)]
+    assert restored.removed_regions == remap.removed_regions
+
+
+def test_removed_regions_without_leading_or_trailing_silence():
+    remap = TimeRemap.from_regions([(0, 300), (500, 1000)], sample_rate=100, original_length=1000)
+    assert remap.removed_regions == 1
@@ -0,0 +1,88 @@
+import pytest
+
+from api.utils import task_queue as task_queue_module
+from api.utils.task_queue import PREPARE_TASK, TRANSCRIBE_TASK, SqliteTaskQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(task_queue_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path) -> SqliteTaskQueue:
+    return SqliteTaskQueue(str(tmp_path / "tasks.sqlite3"), max_attempts=2)
+
+
+def test_claim_prefers_chunk_tasks_and_never_hands_out_a_task_twice(queue, clock):
+    prepare = queue.put("job", PREPARE_TASK, {"file": "a.wav"})
+    first = queue.put("job", TRANSCRIBE_TASK, {"index": 0})
+    second = queue.put("job", TRANSCRIBE_TASK, {"index": 1})
+
+    claimed = [queue.claim(f"w{n}", [PREPARE_TASK, TRANSCRIBE_TASK], 60) for n in range(4)]
+
+    assert [task.id for task in claimed[:3]] == [first, second, prepare]
+    assert claimed[3] is None
+    assert [task.status for task in queue.tasks("job")] == ["running"] * 3
+
+
+def test_claim_filters_by_kind(queue, clock):
+    queue.put("job", TRANSCRIBE_TASK, {"index": 0})
+    assert queue.claim("w1", [PREPARE_TASK], 60) is None
+    assert queue.claim("w1", [], 60) is None
+
+
+def test_expired_lease_is_reclaimed_and_the_old_worker_cannot_complete(queue, clock):
+    task_id = queue.put("job", TRANSCRIBE_TASK, {"index": 0})
+    assert queue.claim("w1", [TRANSCRIBE_TASK], 60).id == task_id
+
+    clock.now += 30
+    queue.renew([task_id], "w1", 60)
+    clock.now += 59
+    # 延長したリースはまだ有効
+    assert queue.claim("w2", [TRANSCRIBE_TASK], 60) is None
+
+    clock.now += 2
+    reclaimed = queue.claim("w2", [TRANSCRIBE_TASK], 60)
+    assert (reclaimed.id, reclaimed.attempts) == (task_id, 2)
+
+    # リースが切れた後の元のワーカーの結果は記録しない
+    queue.complete(task_id, "w1", {"text": "stale"})
+    queue.complete(task_id, "w2", {"text": "fresh"})
+    assert queue.results([task_id]) == {task_id: {"text": "fresh"}}
+    assert queue.tasks("job")[0].status == "done"
+
+
+def test_task_fails_after_max_attempts(queue, clock):
+    task_id = queue.put("job", TRANSCRIBE_TASK, {"index": 0})
+    for worker in ("w1", "w2"):
+        assert queue.claim(worker, [TRANSCRIBE_TASK], 60).id == task_id
+        clock.now += 61
+
+    assert queue.claim("w3", [TRANSCRIBE_TASK], 60) is None
+    task = queue.tasks("job")[0]
+    assert task.status == "failed"
+    assert "2回" in task.error
+
+
+def test_last_worker_activity_and_purge(queue, clock):
+    queue.put("job", TRANSCRIBE_TASK, {"index": 0})
+    assert queue.last_worker_activity() is None
+    clock.now += 5
+    queue.claim("w1", [TRANSCRIBE_TASK], 60)
+    assert queue.last_worker_activity() == clock.now
+
+    queue.put("stale", PREPARE_TASK, {})
+    clock.now += 100
+    assert queue.purge_stale(50) == 2
+    assert queue.tasks("job") == [] and queue.tasks("stale") == []
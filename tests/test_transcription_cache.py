@@ -0,0 +1,52 @@
+from api.utils import transcription_cache as cache_module
+from api.utils.transcription_cache import TranscriptionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def entry(index: int) -> dict:
+    return {"text": f"{index}" * 400, "success": True}
+
+
+def test_evicts_least_recently_accessed_entries_over_the_size_limit(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    # 1エントリ約420バイト、上限は2エントリ分
+    cache = TranscriptionCache(str(tmp_path), max_mb=900 / (1024 * 1024))
+
+    for index in range(2):
+        cache.put("chunk", f"k{index}", entry(index))
+        clock.now += 1
+    # k0 を読むと最終アクセスが新しくなり、次の追加では k1 が先に削除される
+    assert cache.get("chunk", "k0") == entry(0)
+    clock.now += 1
+    cache.put("chunk", "k2", entry(2))
+
+    assert cache.get("chunk", "k1") is None
+    assert cache.get("chunk", "k0") == entry(0)
+    assert cache.get("chunk", "k2") == entry(2)
+    assert cache.stats()["usage"]["chunk"]["entries"] == 2
+
+
+def test_expires_entries_not_accessed_within_max_age(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    cache = TranscriptionCache(str(tmp_path), max_age_days=1)
+
+    cache.put("file", "old", entry(0))
+    clock.now += 86400 / 2
+    cache.put("file", "new", entry(1))
+    clock.now += 86400 / 2 + 1
+
+    assert cache.get("file", "old") is None
+    assert cache.get("file", "new") == entry(1)
+    # 期限切れのエントリは次の追加で削除される
+    cache.put("file", "newer", entry(2))
+    assert cache.stats()["usage"]["file"]["entries"] == 2
+    assert cache.stats()["file_misses"] == 1
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import tracemalloc
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from api.utils.audio_utils import SNIFF_HEADER_BYTES, AudioProcessor, FileTooLargeError, sniff_audio_format
+from api.utils.uploads import UploadOffsetError, UploadSession, parse_content_range
+
+TS_PACKET = b"\x47\x40\x00\x10" + b"\xff" * 184
+
+
+class TrickleUpload:
+    """
+    read() のたびに少しずつしか返さないアップロード（UploadFile の代わり）
+    """
+    def __init__(self, filename: str, data: bytes, step: int):
+        self.filename = filename
+        self.data = data
+        self.step = step
+        self.position = 0
+
+    async def read(self, size: int) -> bytes:
+        chunk = self.data[self.position:self.position + min(size, self.step)]
+        self.position += len(chunk)
+        return chunk
+
+
+async def single(data: bytes):
+    yield data
+
+
+def test_sniff_audio_format_detects_mpeg_ts():
+    assert sniff_audio_format(TS_PACKET * 3) == "mpegts"
+    # M2TS（パケットの前に4バイトのタイムスタンプ）
+    assert sniff_audio_format((b"\x00\x00\x00\x00" + TS_PACKET) * 3) == "mpegts"
+    # 先頭が 0x47 でも、次のパケットの位置に同期バイトがなければMPEG-TSとはみなさない
+    assert sniff_audio_format(b"GIF89a" + b"\x00" * SNIFF_HEADER_BYTES) is None
+
+
+def test_save_upload_stream_sniffs_after_the_header_has_arrived(tmp_path):
+    processor = AudioProcessor(output_dir=str(tmp_path))
+    data = TS_PACKET * 50
+
+    path, _ = asyncio.run(processor.save_upload_stream(TrickleUpload("news.mpeg", data, step=16), "tester", work_dir=tmp_path))
+    assert path.read_bytes() == data
+
+    with pytest.raises(ValueError):
+        asyncio.run(processor.save_upload_stream(TrickleUpload("bad.mp3", b"\x00" * 4096, step=16), "tester", work_dir=tmp_path))
+
+
+def test_resumable_upload_sniffs_across_short_puts(tmp_path):
+    data = TS_PACKET * 4
+    upload = UploadSession("u1", "tester", "news.mpeg", len(data), tmp_path / "news.mpeg")
+
+    async def run():
+        # 最初のPUTが途中で切れ、判定に必要なバイト数がまだ届いていない場合
+        await upload.append(0, single(data[:10]))
+        assert upload.format is None
+        await upload.append(10, single(data[10:]))
+
+    asyncio.run(run())
+    assert upload.format == "mpegts"
+    assert upload.complete().read_bytes() == data
+
+
+def test_save_upload_stream_peak_memory_is_bounded_by_the_chunk_size(tmp_path):
+    processor = AudioProcessor(output_dir=str(tmp_path))
+    chunk_size = processor.upload_chunk_size
+    source = tmp_path / "source.mp3"
+    with open(source, "wb") as f:
+        f.write(b"ID3\x04\x00\x00\x00\x00\x00\x00")
+        for _ in range(8):
+            f.write(b"\x00" * chunk_size)
+
+    async def save():
+        with open(source, "rb") as f:
+            return await processor.save_upload_stream(UploadFile(file=f, filename="large.mp3"), "tester", work_dir=tmp_path / "saved")
+
+    tracemalloc.start()
+    try:
+        path, _ = asyncio.run(save())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert path.stat().st_size == source.stat().st_size
+    # ファイル全体（8チャンク分）を読み込むと上限を超える
+    assert peak < 3 * chunk_size
+
+
+async def interrupted(data: bytes):
+    # 途中で接続が切れたPUT
+    yield data
+    raise ConnectionError("client disconnected")
+
+
+def test_append_rejects_a_range_that_does_not_start_at_the_offset(tmp_path):
+    data = TS_PACKET * 4
+    upload = UploadSession("u1", "tester", "news.mpeg", len(data), tmp_path / "news.mpeg")
+
+    async def run():
+        await upload.append(0, single(data[:500]))
+        with pytest.raises(UploadOffsetError) as raised:
+            await upload.append(400, single(data[400:]))
+        return raised.value
+
+    error = asyncio.run(run())
+    assert error.offset == 500
+    assert upload.offset == 500
+
+
+def test_interrupted_put_keeps_the_received_bytes_and_can_resume(tmp_path):
+    data = TS_PACKET * 4
+    upload = UploadSession("u1", "tester", "news.mpeg", len(data), tmp_path / "news.mpeg")
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await upload.append(0, interrupted(data[:600]))
+        assert upload.offset == 600
+        with pytest.raises(UploadOffsetError):
+            upload.complete()
+        return await upload.append(600, single(data[600:]))
+
+    assert asyncio.run(run()) == len(data)
+    assert upload.complete().read_bytes() == data
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_append_rejects_bytes_beyond_the_declared_size(tmp_path):
+    data = TS_PACKET * 4
+    upload = UploadSession("u1", "tester", "news.mpeg", len(data), tmp_path / "news.mpeg")
+
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(upload.append(0, single(data + b"\x00")))
+    assert upload.offset == 0
+
+
+def test_parse_content_range():
+    assert parse_content_range("bytes 0-1023/4096") == (0, 1023, 4096)
+    assert parse_content_range("bytes 1024-2047/*") == (1024, 2047, None)
+    with pytest.raises(ValueError):
+        parse_content_range("bytes=0-1023")
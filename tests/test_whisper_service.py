@@ -0,0 +1,117 @@
+import asyncio
+from pathlib import Path
+
+from api.utils.transcription_backends import TranscriptionBackend, TranscriptionResponse
+from api.utils.wisper_service import WhisperService
+
+
+class RecordingBackend(TranscriptionBackend):
+    """
+    ファイル名の先頭1文字をジョブ名とみなし、ジョブごとの同時実行数を記録するバックエンドです。
+    """
+    name = "recording"
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.in_flight = {}
+        self.peak = {}
+        self.peak_total = 0
+        self.first_start = {}
+
+    @property
+    def model(self) -> str:
+        return "recording"
+
+    async def transcribe(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        job = filename[0]
+        self.first_start.setdefault(job, asyncio.get_running_loop().time())
+        self.in_flight[job] = self.in_flight.get(job, 0) + 1
+        self.peak[job] = max(self.peak.get(job, 0), self.in_flight[job])
+        self.peak_total = max(self.peak_total, sum(self.in_flight.values()))
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight[job] -= 1
+        return TranscriptionResponse("text", language, 1.0, [])
+
+
+def write_chunks(directory: Path, job: str, count: int) -> list[str]:
+    paths = []
+    for index in range(count):
+        path = directory / f"{job}{index:03d}.mp3"
+        path.write_bytes(f"{job}-{index}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def test_job_limit_does_not_hold_process_slots(tmp_path):
+    # ジョブAの上限で待っているチャンクがプロセス全体の枠を占有すると、ジョブBはAが終わるまで送信できない
+    backend = RecordingBackend(latency=0.2)
+    service = WhisperService(backend=backend, max_concurrency=16, job_concurrency=12)
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            service.transcribe_multiple_files(write_chunks(tmp_path, "A", 40)),
+            service.transcribe_multiple_files(write_chunks(tmp_path, "B", 40)),
+        )
+        return started
+
+    started = asyncio.run(run())
+    # どちらのジョブもジョブ単位の上限を超えず、プロセス全体の枠はすべて使われる
+    assert max(backend.peak.values()) <= 12
+    assert backend.peak_total == 16
+    # Bの最初のリクエストは、Aの最初の波が終わる前に送られる
+    assert backend.first_start["B"] - started < backend.latency
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class RateLimitedBackend(TranscriptionBackend):
+    """
+    常にレート制限（429）で失敗する主バックエンドです。
+    """
+    name = "primary"
+    rate_limited = True
+
+    def __init__(self):
+        self.calls = 0
+
+    @property
+    def model(self) -> str:
+        return "primary"
+
+    async def transcribe(self, filename: str, audio_bytes: bytes, language: str) -> TranscriptionResponse:
+        self.calls += 1
+        raise RateLimitError("429")
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, RateLimitError)
+
+    def is_rate_limit(self, error: Exception) -> bool:
+        return isinstance(error, RateLimitError)
+
+
+def test_rate_limited_chunk_overflows_to_fallback(tmp_path, monkeypatch):
+    monkeypatch.setenv("WHISPER_RETRY_BASE_SECONDS", "0.01")
+    primary, fallback = RateLimitedBackend(), RecordingBackend(latency=0)
+    service = WhisperService(backend=primary, overflow_backend=fallback)
+    [path] = write_chunks(tmp_path, "A", 1)
+
+    result = asyncio.run(service.transcribe_single_file(path))
+    assert result["success"] and result["backend"] == "recording"
+    assert primary.calls == 1
+
+
+def test_overflow_stops_after_max_retries(tmp_path, monkeypatch):
+    # 再試行の上限を超えた429では主バックエンドが一時停止されないため、振り替えずに失敗させる（同じ429を繰り返さない）
+    monkeypatch.setenv("WHISPER_MAX_RETRIES", "0")
+    primary, fallback = RateLimitedBackend(), RecordingBackend(latency=0)
+    service = WhisperService(backend=primary, overflow_backend=fallback)
+    [path] = write_chunks(tmp_path, "A", 1)
+
+    result = asyncio.run(asyncio.wait_for(service.transcribe_single_file(path), timeout=5))
+    assert not result["success"]
+    assert primary.calls == 1